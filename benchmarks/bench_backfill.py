@@ -0,0 +1,52 @@
+"""
+Measures how `backfill` scales with the number of parsing processes on a
+local directory of synthetic station-year files.
+
+Run from the repository root with::
+
+    python -m benchmarks.bench_backfill [n_files] [n_lines]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from noaastn import noaastn
+
+from tests.synthetic import make_isd_file
+
+
+def main(n_files=64, n_lines=8760):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, "source")
+        os.makedirs(os.path.join(source, "2015"))
+        compressed_data = make_isd_file(n_lines)
+        stations = ["%06d-99999" % i for i in range(n_files)]
+        for stn in stations:
+            path = os.path.join(source, "2015", stn + "-2015.gz")
+            with open(path, "wb") as gz_file:
+                gz_file.write(compressed_data)
+
+        baseline = None
+        workers = 1
+        while workers <= (os.cpu_count() or 1):
+            store = noaastn.ParquetStore(
+                os.path.join(tmp_dir, "store%d" % workers)
+            )
+            tic = time.perf_counter()
+            errors_df = noaastn.backfill(
+                stations, [2015], store, source=source, workers=workers
+            )
+            elapsed = time.perf_counter() - tic
+            assert errors_df.empty
+            baseline = baseline or elapsed
+            print(
+                f"{workers:>3} workers: {elapsed:7.3f} s, "
+                f"{n_files * n_lines / elapsed:11,.0f} records/s, "
+                f"speed-up {baseline / elapsed:5.2f}"
+            )
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,82 @@
+"""
+Compares the row-by-row ISD parser that get_weather_data used to run with
+the vectorized parser on a synthetic station-year file.
+
+Run from the repository root with::
+
+    python -m benchmarks.bench_get_weather_data [n_lines]
+"""
+import gzip
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from noaastn import noaastn
+
+from tests.synthetic import make_isd_file
+
+
+def parse_rows(compressed_data, station_number):
+    """Row-by-row parser previously used by get_weather_data."""
+    stn_year_df = pd.DataFrame(
+        columns=[
+            "stn",
+            "datetime",
+            "air_temp",
+            "atm_press",
+            "wind_spd",
+            "wind_dir",
+        ]
+    )
+    with gzip.open(io.BytesIO(compressed_data), mode="rt") as stn_data:
+        for i, line in enumerate(stn_data):
+            stn_year_df.loc[i, "datetime"] = pd.to_datetime(line[15:27])
+            stn_year_df.loc[i, "air_temp"] = float(line[87:92]) / 10
+            stn_year_df.loc[i, "atm_press"] = float(line[99:104]) / 10
+            stn_year_df.loc[i, "wind_spd"] = float(line[65:69]) / 10
+            stn_year_df.loc[i, "wind_dir"] = float(line[60:63])
+    stn_year_df = stn_year_df.replace(
+        [999, 999.9, 9999.9], [np.nan, np.nan, np.nan]
+    )
+    stn_year_df.loc[:, "stn"] = station_number
+    return stn_year_df
+
+
+def parse_vectorized(compressed_data, station_number):
+    """Parser used by get_weather_data."""
+    return noaastn._parse_isd(
+        gzip.decompress(compressed_data), station_number
+    )
+
+
+def main(n_lines=20000):
+    compressed_data = make_isd_file(n_lines)
+    station_number = "911803-99999"
+
+    results = {}
+    for parse in [parse_vectorized, parse_rows]:
+        tic = time.perf_counter()
+        results[parse.__name__] = parse(compressed_data, station_number)
+        print(
+            f"{parse.__name__:>17}: {time.perf_counter() - tic:9.3f} s "
+            f"({n_lines} lines)"
+        )
+
+    # The row parser also blanks legitimate 999 and 999.9 values, which the
+    # per-column missing value codes of the vectorized parser keep, and
+    # returns float64 values.
+    vectorized_df = (
+        results["parse_vectorized"]
+        .astype({col: "float64" for col in noaastn.DEFAULT_FIELDS})
+        .round(1)
+        .replace([999, 999.9], np.nan)
+    )
+    pd.testing.assert_frame_equal(
+        vectorized_df, results["parse_rows"].astype(vectorized_df.dtypes)
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,408 @@
+"""
+Benchmark suite of the download, parse, aggregate and plot paths.
+
+Every scenario runs on synthetic ISD files and station history files of
+configurable size, served by the local FTP stand-in used by the tests, and
+reports its best time over a few repeats and its peak memory (measured with
+tracemalloc in a separate run). Results can be saved and compared with a
+previous run to catch regressions.
+
+Run from the repository root with::
+
+    python -m benchmarks.suite [--sizes 1000 100000 1000000] [-k parse]
+        [--save results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import datetime
+import functools
+import gc
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from noaastn import noaastn
+
+from tests.ftp_server import FakeFTPServer
+from tests.synthetic import make_isd_file, make_station_history
+
+STATION_NUMBER = "911803-99999"
+YEAR = 2015
+SCENARIOS = {}
+
+
+def scenario(func):
+    """
+    Registers a scenario.
+
+    A scenario is called with the FTP server and the size (number of ISD
+    records) and returns the function to measure, after doing any setup
+    that should not be measured.
+    """
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+@functools.lru_cache(maxsize=None)
+def isd_file(n_lines, compress=True):
+    """
+    Returns a synthetic station-year file of `n_lines` records, repeating
+    the records of a year for larger sizes.
+    """
+    lines = gzip.decompress(make_isd_file(min(n_lines, 8760), year=YEAR))
+    lines = lines.splitlines(keepends=True)
+    raw_data = b"".join((lines * (n_lines // len(lines) + 1))[:n_lines])
+    return gzip.compress(raw_data, compresslevel=6) if compress else raw_data
+
+
+@functools.lru_cache(maxsize=None)
+def station_history(n_stations):
+    """Returns a synthetic isd-history.txt of `n_stations` stations."""
+    rng = np.random.default_rng(0)
+    stations = [
+        (
+            "%06d" % i,
+            "99999",
+            "STATION %d" % i,
+            "US" if i % 4 else "CA",
+            "CA" if i % 8 == 1 else "",
+            "",
+            float(rng.uniform(-90, 90)),
+            float(rng.uniform(-180, 180)),
+            float(rng.uniform(0, 3000)),
+            "19730101",
+            "20210316",
+        )
+        for i in range(n_stations)
+    ]
+    return make_station_history(stations)
+
+
+def add_weather_file(ftp_server, n_lines, station_number=STATION_NUMBER):
+    ftp_server.add_file(
+        "pub/data/noaa/%d/%s-%d.gz" % (YEAR, station_number, YEAR),
+        isd_file(n_lines),
+    )
+
+
+@scenario
+def parse_isd(ftp_server, n_lines):
+    raw_data = isd_file(n_lines, compress=False)
+    return lambda: noaastn.parse_weather_data(raw_data, STATION_NUMBER)
+
+
+@scenario
+def parse_isd_gzip(ftp_server, n_lines):
+    compressed_data = isd_file(n_lines)
+    return lambda: noaastn.parse_weather_data(compressed_data, STATION_NUMBER)
+
+
+@scenario
+def get_weather_data(ftp_server, n_lines):
+    add_weather_file(ftp_server, n_lines)
+    return lambda: noaastn.get_weather_data(STATION_NUMBER, YEAR)
+
+
+@scenario
+def iter_weather_data(ftp_server, n_lines):
+    add_weather_file(ftp_server, n_lines)
+
+    def run():
+        for _ in noaastn.iter_weather_data(STATION_NUMBER, YEAR, 100000):
+            pass
+
+    return run
+
+
+@scenario
+def get_weather_data_bulk(ftp_server, n_lines):
+    # Eight station-years sharing the records
+    stations = ["%06d-99999" % i for i in range(8)]
+    for station_number in stations:
+        add_weather_file(ftp_server, n_lines // 8, station_number)
+    return lambda: noaastn.get_weather_data_bulk(stations, [YEAR])
+
+
+@scenario
+def aiter_weather_data(ftp_server, n_lines):
+    stations = ["%06d-99999" % i for i in range(8)]
+    for station_number in stations:
+        add_weather_file(ftp_server, n_lines // 8, station_number)
+
+    async def load():
+        async for _ in noaastn.aiter_weather_data(
+            stations, [YEAR], executor=executor
+        ):
+            pass
+
+    # Parsing runs in threads so that tracemalloc sees it
+    executor = ThreadPoolExecutor(4)
+    return lambda: asyncio.run(load())
+
+
+@scenario
+def backfill(ftp_server, n_lines):
+    stations = ["%06d-99999" % i for i in range(8)]
+    for station_number in stations:
+        add_weather_file(ftp_server, n_lines // 8, station_number)
+    store_dir = os.path.join(ftp_server.root, "stores")
+    os.makedirs(store_dir, exist_ok=True)
+
+    def run():
+        # Parsing runs in worker processes, so the peak memory is the one
+        # of the pipeline itself
+        store = noaastn.ParquetStore(tempfile.mkdtemp(dir=store_dir))
+        noaastn.backfill(stations, [YEAR], store, workers=2)
+
+    return run
+
+
+@scenario
+def get_weather_data_missing(ftp_server, n_lines):
+    # Station-years missing from a listed year, e.g. before a station opened
+    add_weather_file(ftp_server, n_lines)
+    ftp_server.add_file("pub/data/noaa/isd-history.txt", station_history(100))
+    noaastn.get_inventory([YEAR])
+    stations = ["%06d-99999" % i for i in range(100)]
+    return lambda: noaastn.get_weather_data_bulk(stations, [YEAR])
+
+
+@scenario
+def get_weather_range(ftp_server, n_lines):
+    add_weather_file(ftp_server, n_lines)
+    start = datetime.datetime(YEAR, 3, 1)
+    return lambda: noaastn.get_weather_range(
+        STATION_NUMBER, start, start + datetime.timedelta(days=30)
+    )
+
+
+@scenario
+def get_stations_info(ftp_server, n_lines):
+    # One station per 30 records, e.g. 30,000 stations for 900,000 records
+    ftp_server.add_file(
+        "pub/data/noaa/isd-history.txt", station_history(n_lines // 30)
+    )
+
+    def run():
+        # Download and parse without a snapshot
+        snapshot_dir, noaastn._SNAPSHOT_DIR = noaastn._SNAPSHOT_DIR, None
+        try:
+            noaastn.get_stations_info(refresh=True)
+        finally:
+            noaastn._SNAPSHOT_DIR = snapshot_dir
+
+    return run
+
+
+@scenario
+def load_station_snapshot(ftp_server, n_lines):
+    ftp_server.add_file(
+        "pub/data/noaa/isd-history.txt", station_history(n_lines // 30)
+    )
+    noaastn.get_stations_info(refresh=True)
+
+    def run():
+        noaastn._station_table.cache_clear()
+        noaastn.get_stations_info()
+
+    return run
+
+
+@scenario
+def find_stations(ftp_server, n_lines):
+    ftp_server.add_file(
+        "pub/data/noaa/isd-history.txt", station_history(n_lines // 30)
+    )
+    noaastn.get_stations_info(refresh=True)
+    rng = np.random.default_rng(1)
+    lat, lon = rng.uniform(-90, 90, 1000), rng.uniform(-180, 180, 1000)
+    return lambda: noaastn.find_stations(lat, lon, k=5)
+
+
+@scenario
+def aggregate_weather_data(ftp_server, n_lines):
+    weather_df = noaastn.parse_weather_data(isd_file(n_lines, False))
+    return lambda: noaastn.aggregate_weather_data(weather_df)
+
+
+@scenario
+def build_weather_panel(ftp_server, n_lines):
+    # 100 stations sharing the records
+    weather_df = noaastn.parse_weather_data(isd_file(n_lines // 100, False))
+    stations = ["%06d-99999" % i for i in range(100)]
+    codes = np.zeros(len(weather_df.index), dtype=np.int8)
+    frames = [
+        weather_df.assign(stn=pd.Categorical.from_codes(codes, [stn]))
+        for stn in stations
+    ]
+    start, end = "%d-01-01" % YEAR, "%d-01-01" % (YEAR + 1)
+    return lambda: noaastn.build_weather_panel(
+        frames, stations, "air_temp", start, end
+    )
+
+
+@scenario
+def plot_weather_data(ftp_server, n_lines):
+    weather_df = noaastn.parse_weather_data(isd_file(n_lines, False))
+
+    # Four variables at two time bases, as on a dashboard, when the records
+    # span enough months
+    time_bases = ["daily", "monthly"] if n_lines > 24 * 92 else ["daily"]
+
+    def run():
+        aggregates = noaastn.aggregate_weather_data(weather_df)
+        for col_name in noaastn.DEFAULT_FIELDS:
+            for time_basis in time_bases:
+                noaastn.plot_weather_data(
+                    aggregates, col_name, time_basis
+                ).to_dict()
+
+    return run
+
+
+@scenario
+def plot_weather_series(ftp_server, n_lines):
+    weather_df = noaastn.parse_weather_data(isd_file(n_lines, False))
+    return lambda: noaastn.plot_weather_series(weather_df).to_dict()
+
+
+def measure(func, repeat):
+    """Returns the best time in seconds and the peak memory in bytes."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        tic = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - tic)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def run(sizes, pattern=None, repeat=3):
+    """
+    Runs the scenarios matching `pattern` at every size.
+
+    Returns
+    -------
+    dict
+        Best time (`seconds`) and peak memory (`peak_bytes`) by
+        "<scenario>[<size>]".
+    """
+    results = {}
+    saved = noaastn._FTP_ADDRESS, noaastn._FTP_PORT, noaastn._SNAPSHOT_DIR
+    with tempfile.TemporaryDirectory() as root:
+        with FakeFTPServer(root) as ftp_server:
+            noaastn._FTP_ADDRESS, noaastn._FTP_PORT = "127.0.0.1", (
+                ftp_server.port
+            )
+            noaastn._SNAPSHOT_DIR = os.path.join(root, "snapshot")
+            try:
+                for name, setup in SCENARIOS.items():
+                    if pattern and not re.search(pattern, name):
+                        continue
+                    for size in sizes:
+                        key = "%s[%d]" % (name, size)
+                        noaastn._station_table.cache_clear()
+                        # Scenarios add files to the listed year directory
+                        noaastn._inventories.clear()
+                        inventory_dir = "inventory.v%d" % (
+                            noaastn._SNAPSHOT_VERSION
+                        )
+                        shutil.rmtree(
+                            os.path.join(noaastn._SNAPSHOT_DIR, inventory_dir),
+                            ignore_errors=True,
+                        )
+                        try:
+                            func = setup(ftp_server, size)
+                        except ImportError as e_mess:
+                            print(f"{key:<36} skipped: {e_mess}")
+                            continue
+                        seconds, peak = measure(func, repeat)
+                        results[key] = {
+                            "seconds": seconds,
+                            "peak_bytes": peak,
+                        }
+                        print(
+                            f"{key:<36} {seconds:10.4f} s "
+                            f"{peak / 2 ** 20:10.1f} MiB",
+                            flush=True,
+                        )
+            finally:
+                (
+                    noaastn._FTP_ADDRESS,
+                    noaastn._FTP_PORT,
+                    noaastn._SNAPSHOT_DIR,
+                ) = saved
+                noaastn._station_table.cache_clear()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the scenarios that got slower or used more memory than in the
+    baseline by more than `tolerance` (a fraction).
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in ["seconds", "peak_bytes"]:
+            ratio = result[metric] / max(baseline[key][metric], 1e-9)
+            if ratio > 1 + tolerance:
+                regressions.append((key, metric, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 100000],
+        help="numbers of ISD records (default: 1000 100000)",
+    )
+    parser.add_argument("-k", dest="pattern", help="scenario name regex")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="write the results to a JSON file")
+    parser.add_argument("--compare", help="JSON results to compare with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown or memory growth (default: 0.25)",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.pattern, args.repeat)
+    if args.save:
+        with open(args.save, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(
+                results, json.load(baseline_file), args.tolerance
+            )
+        for key, metric, ratio in regressions:
+            print(f"REGRESSION {key} {metric}: {ratio:.2f}x the baseline")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Command line tool loading the weather data of many stations and years into
+a local store.
+
+The stations are selected from the station information by country, state
+and bounding box, and only the years during which each station reported
+are loaded. Every station-year processed is recorded in a manifest, so that
+an interrupted run resumes with the missing station-years only::
+
+    noaastn --country US --state CA --years 2000 2020 --store noaa_store
+"""
+import argparse
+import json
+import os
+import sys
+
+from . import noaastn
+
+
+def select_stations(country="all", state=None, bbox=None):
+    """
+    Returns the information of the stations in a country, state and
+    bounding box.
+
+    Parameters
+    ----------
+    country, state : str, optional
+        See `get_stations_info`.
+    bbox : tuple of float, optional
+        Minimum latitude, minimum longitude, maximum latitude and maximum
+        longitude of the stations in degrees, by default all stations.
+    Returns
+    -------
+    pandas.DataFrame
+        Data frame containing the information of the selected stations.
+    """
+    stations_df = noaastn.get_stations_info(country, state)
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        stations_df = stations_df[
+            stations_df.latitude.between(min_lat, max_lat)
+            & stations_df.longitude.between(min_lon, max_lon)
+        ]
+    return stations_df
+
+
+def inactive_station_years(stations_df, years):
+    """
+    Returns the (station number, year) of the station-years outside the
+    period of the stations. Stations without a period are kept every year.
+    """
+    station_numbers = (
+        stations_df.usaf.astype(str) + "-" + stations_df.wban.astype(str)
+    )
+    first = stations_df.start.dt.year.fillna(min(years)).to_numpy()
+    last = stations_df.end.dt.year.fillna(max(years)).to_numpy()
+    return {
+        (stn, year)
+        for stn, begin, end in zip(station_numbers, first, last)
+        for year in years
+        if not begin <= year <= end
+    }
+
+
+def read_manifest(path):
+    """
+    Returns the (station number, year) of the station-years loaded by
+    previous runs, as recorded in the manifest.
+    """
+    loaded = set()
+    if not os.path.exists(path):
+        return loaded
+    with open(path) as manifest_file:
+        for line in manifest_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Last line of an interrupted run
+                continue
+            if entry["error"] is None:
+                loaded.add((entry["stn"], entry["year"]))
+    return loaded
+
+
+def format_progress(report):
+    """Formats a `BackfillProgress` with its throughput and ETA."""
+    elapsed = max(report.elapsed, 1e-9)
+    eta = elapsed / report.done * (report.total - report.done)
+    return (
+        f"{report.done}/{report.total} station-years, "
+        f"{report.errors} errors, "
+        f"{report.records / elapsed:,.0f} records/s, "
+        f"{report.bytes / elapsed / 2 ** 20:.1f} MiB/s, "
+        f"ETA {int(eta) // 3600}:{int(eta) // 60 % 60:02d}:"
+        f"{int(eta) % 60:02d}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="noaastn", description=__doc__.split("\n\n")[0].strip()
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs=2,
+        required=True,
+        metavar=("FIRST", "LAST"),
+        help="years to load, both included",
+    )
+    parser.add_argument("--store", required=True, help="store directory")
+    parser.add_argument(
+        "--country", default="all", help="two character country code"
+    )
+    parser.add_argument("--state", help="two character state code")
+    parser.add_argument(
+        "--bbox",
+        type=float,
+        nargs=4,
+        metavar=("MIN_LAT", "MIN_LON", "MAX_LAT", "MAX_LON"),
+        help="bounding box of the stations in degrees",
+    )
+    parser.add_argument(
+        "--stations",
+        nargs="+",
+        metavar="STATION",
+        help="station numbers to load instead of a selection",
+    )
+    parser.add_argument("--fields", nargs="+", help="fields to extract")
+    parser.add_argument(
+        "--manifest",
+        help="manifest of the loaded station-years "
+        "(default: STORE/manifest.jsonl)",
+    )
+    parser.add_argument("--cache", help="directory of a download cache")
+    parser.add_argument(
+        "--source", help="local directory laid out like the FTP site"
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=4,
+        help="concurrent FTP sessions (default: 4)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="parsing processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="do not report the progress"
+    )
+    args = parser.parse_args(argv)
+
+    years = list(range(args.years[0], args.years[1] + 1))
+    if not years:
+        parser.error("the first year must not be after the last year")
+    skip = set()
+    if args.stations:
+        stations = args.stations
+    else:
+        stations_df = select_stations(args.country, args.state, args.bbox)
+        stations = (
+            stations_df.usaf.astype(str) + "-" + stations_df.wban.astype(str)
+        ).tolist()
+        skip |= inactive_station_years(stations_df, years)
+    store = noaastn.ParquetStore(args.store)
+    manifest_path = args.manifest or os.path.join(
+        args.store, "manifest.jsonl"
+    )
+    skip |= read_manifest(manifest_path)
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    cache = None if args.cache is None else noaastn.DownloadCache(args.cache)
+
+    with open(manifest_path, "a+") as manifest_file:
+        # Terminate the last line of an interrupted run
+        if manifest_file.tell():
+            manifest_file.seek(manifest_file.tell() - 1)
+            if manifest_file.read(1) != "\n":
+                manifest_file.write("\n")
+
+        def progress(report):
+            manifest_file.write(
+                json.dumps(
+                    {
+                        "stn": report.stn,
+                        "year": report.year,
+                        "error": report.error,
+                    }
+                )
+                + "\n"
+            )
+            manifest_file.flush()
+            if not args.quiet:
+                print(
+                    "\r" + format_progress(report),
+                    end="",
+                    file=sys.stderr,
+                    flush=True,
+                )
+
+        errors_df = noaastn.backfill(
+            stations,
+            years,
+            store,
+            source=args.source,
+            cache=cache,
+            max_sessions=args.max_sessions,
+            workers=args.workers,
+            fields=args.fields,
+            progress=progress,
+            skip=skip,
+        )
+    if not args.quiet:
+        print(file=sys.stderr)
+        for error in errors_df.itertuples():
+            print(f"{error.stn} {error.year}: {error.error}", file=sys.stderr)
+    return 1 if len(errors_df.index) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
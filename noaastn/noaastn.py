@@ -1,192 +1,4069 @@
+import asyncio
+import calendar
+import collections
+import contextlib
+import email.utils
+import functools
 import gzip
+import hashlib
+import http.client
 import io
+import json
+import logging
+import mmap
 import os
+import posixpath
+import queue
+import random
 import re
-from ftplib import FTP, error_perm
+import tempfile
+import threading
+import time
+import urllib.parse
+import zipfile
+import zlib
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from ftplib import FTP, error_perm, error_reply, error_temp, parse227
 
-import altair as alt
 import numpy as np
 import pandas as pd
 
+# NOAA FTP server hosting the ISD files.
+_FTP_ADDRESS = "ftp.ncei.noaa.gov"
+_FTP_PORT = 21
+_FTP_DIR = "pub/data/noaa/"
 
-def get_stations_info(country="all"):
+# Directory of the local snapshot of the station information, shared by all
+# processes of the user, or None to download it once per process.
+_SNAPSHOT_DIR = os.environ.get(
+    "NOAASTN_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "noaastn"),
+)
+
+
+# Functions called with the name and data of every instrumentation event.
+_hooks = []
+_logger = logging.getLogger("noaastn")
+
+
+def add_hook(hook):
+    """
+    Registers a function called on every instrumentation event.
+
+    Events are emitted by the loading stages with a dictionary of data:
+
+    - `connect`: an FTP session was opened and logged in (`seconds`).
+    - `transfer`: a file was downloaded (`seconds`, `bytes`, `filename`).
+    - `cache`: a file was looked up in a `DownloadCache` (`hit`,
+      `filename`).
+    - `decompress`: a file was decompressed (`seconds`, `bytes`).
+    - `decode`: records were decoded (`seconds`, `bytes`, `records`).
+    - `frame`: the dataframe of decoded records was built (`seconds`,
+      `records`).
+    - `store_read`, `store_write`: a station-year was read from or written
+      to a `ParquetStore` (`seconds`, `records`).
+    - `error`: a station-year could not be loaded (`error`).
+
+    The events are also logged at the DEBUG level by the `noaastn` logger.
+    Events of work done in other processes, e.g. the parsing of
+    `backfill`, are not reported.
+
+    Parameters
+    ----------
+    hook : callable
+        Called with the event name and data, from the thread that emitted
+        the event.
+    Examples
+    --------
+    >>> add_hook(lambda event, data: print(event, data))
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Unregisters a function registered with `add_hook`."""
+    _hooks.remove(hook)
+
+
+def _instrumented():
+    """Returns whether instrumentation events are consumed."""
+    return bool(_hooks) or _logger.isEnabledFor(logging.DEBUG)
+
+
+def _emit(event, **data):
+    """Reports an instrumentation event to the hooks and the logger."""
+    if not _instrumented():
+        return
+    for hook in list(_hooks):
+        hook(event, data)
+    _logger.debug("%s %s", event, data)
+
+
+@contextlib.contextmanager
+def _timed(event, **data):
+    """
+    Reports an instrumentation event with the duration of the block,
+    yielding the event data so that the block can complete it.
+    """
+    if not _instrumented():
+        yield data
+        return
+    tic = time.perf_counter()
+    yield data
+    _emit(event, seconds=time.perf_counter() - tic, **data)
+
+
+class LoadStats:
+    """
+    Instrumentation hook aggregating the events of any number of calls, see
+    `add_hook` and `collect_stats`.
+
+    Attributes
+    ----------
+    cache_hits, cache_misses : int
+        Number of files served from and missing in a `DownloadCache`.
+    errors : int
+        Number of station-years that could not be loaded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.errors = 0
+
+    def __call__(self, event, data):
+        with self._lock:
+            if event == "cache":
+                if data["hit"]:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+                return
+            if event == "error":
+                self.errors += 1
+                return
+            totals = self._totals.setdefault(event, [0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += data.get("seconds", 0.0)
+            totals[2] += data.get("bytes", 0)
+            totals[3] += data.get("records", 0)
+
+    def summary(self):
+        """
+        Returns the number of events and the total time, bytes and records
+        of every stage.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per event name with the `count`, `seconds`, `bytes` and
+            `records` columns.
+        """
+        with self._lock:
+            totals = {event: list(row) for event, row in self._totals.items()}
+        return pd.DataFrame.from_dict(
+            totals,
+            orient="index",
+            columns=["count", "seconds", "bytes", "records"],
+        ).rename_axis("stage")
+
+
+@contextlib.contextmanager
+def collect_stats():
+    """
+    Aggregates the instrumentation events emitted while the block runs.
+
+    Yields
+    ------
+    LoadStats
+        The aggregated events.
+    Examples
+    --------
+    >>> with collect_stats() as stats:
+    ...     get_weather_data_bulk(['911650-22536'], [2019, 2020])
+    >>> stats.summary()
+    """
+    stats = LoadStats()
+    add_hook(stats)
+    try:
+        yield stats
+    finally:
+        remove_hook(stats)
+
+
+# Errors after which a transfer is attempted again. Permanent errors
+# (error_perm), e.g. missing files, are not retried.
+_TRANSIENT_ERRORS = (
+    OSError,
+    EOFError,
+    error_temp,
+    error_reply,
+    http.client.HTTPException,
+)
+
+
+def _retry_delay(backoff, attempt):
+    """
+    Returns a random delay of up to `backoff` * 2 ** `attempt` seconds, so
+    that concurrent retries after a common failure are spread out.
+    """
+    return random.uniform(0, backoff * 2 ** attempt)
+
+
+class _Connection:
+    """
+    Sessions of a transport shared by the threads of a call, grouped by the
+    directory they are in so that consecutive transfers from one directory
+    reuse a session without changing directory.
+
+    Operations failing with a transient error are attempted again on a new
+    session, and interrupted transfers resume where they stopped.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stat(self, path):
+        """
+        Returns the size and modification time of a file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file relative to the ISD directory, e.g.
+            "2020/911650-22536-2020.gz".
+        Returns
+        -------
+        tuple of int
+            Size in bytes and modification time in seconds since the epoch.
+        """
+        directory, name = posixpath.split(path)
+
+        def attempt():
+            with self._session(directory) as session:
+                return self.transport._stat(session, directory, name)
+
+        return self._retry(attempt)
+
+    def stream(self, path, write):
+        """
+        Downloads a file, calling `write` with every block received.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file relative to the ISD directory.
+        write : callable
+            Called with the blocks of the file in order, each byte once even
+            when the transfer is resumed.
+        """
+        directory, name = posixpath.split(path)
+        with _timed("transfer", filename=name) as event:
+            event["bytes"] = 0
+
+            def receive(block):
+                event["bytes"] += len(block)
+                write(block)
+
+            def attempt():
+                with self._session(directory) as session:
+                    self.transport._retrieve(
+                        session, directory, name, receive, event["bytes"]
+                    )
+
+            self._retry(attempt)
+
+    def listdir(self, directory):
+        """
+        Lists the files of a directory.
+
+        Parameters
+        ----------
+        directory : str
+            Path of the directory relative to the ISD directory, e.g. "2020".
+        Returns
+        -------
+        dict
+            Size in bytes of every file, -1 when the transport does not
+            report sizes.
+        """
+
+        def attempt():
+            with self._session(directory) as session:
+                return self.transport._list(session, directory)
+
+        return self._retry(attempt)
+
+    def retrieve(self, path):
+        """Downloads a file into memory, see `stream`."""
+        data = io.BytesIO()
+        self.stream(path, data.write)
+        return data.getvalue()
+
+    def close(self):
+        """Closes all idle sessions."""
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            try:
+                self.transport._quit(session)
+            except Exception:
+                self.transport._abort(session)
+
+    def _retry(self, operation):
+        for attempt in range(self.transport.retries + 1):
+            try:
+                return operation()
+            except _TRANSIENT_ERRORS:
+                if attempt == self.transport.retries:
+                    raise
+                time.sleep(_retry_delay(self.transport.backoff, attempt))
+
+    @contextlib.contextmanager
+    def _session(self, directory):
+        session, cwd = self._acquire(directory)
+        try:
+            if session is None:
+                session = self.transport._open(directory)
+                cwd = directory
+            elif cwd != directory:
+                self.transport._chdir(session, directory)
+                cwd = directory
+            yield session
+        except error_perm:
+            # Missing files and directories leave the session usable
+            if session is not None:
+                self._release(session, cwd)
+            raise
+        except BaseException:
+            if session is not None:
+                self.transport._abort(session)
+            raise
+        else:
+            self._release(session, cwd)
+
+    def _acquire(self, directory):
+        with self._lock:
+            for cwd in [directory] + list(self._idle):
+                if self._idle.get(cwd):
+                    return self._idle[cwd].pop(), cwd
+        return None, None
+
+    def _release(self, session, cwd):
+        with self._lock:
+            self._idle.setdefault(cwd, []).append(session)
+
+
+class _Transport:
+    """
+    Base class of the transports, which open, use and close the sessions of
+    a `_Connection`.
+    """
+
+    retries = 3
+    backoff = 1.0
+
+    def connect(self):
+        """
+        Returns a pool of sessions to transfer files with, to be closed
+        after use.
+        """
+        return _Connection(self)
+
+    def _location(self):
+        """Returns the URL of the ISD directory, which identifies a site."""
+        raise NotImplementedError
+
+    def _chdir(self, session, directory):
+        pass
+
+    def _quit(self, session):
+        self._abort(session)
+
+    def _abort(self, session):
+        pass
+
+
+class FTPTransport(_Transport):
+    """
+    Transport of the ISD files from an FTP server, by default the NOAA FTP
+    site, see `set_transport`.
+
+    Parameters
+    ----------
+    host : str, optional
+        Address of the FTP server, by default ftp.ncei.noaa.gov.
+    port : int, optional
+        Port of the FTP server, by default 21.
+    directory : str, optional
+        Directory of the ISD files on the server, by default
+        "pub/data/noaa/".
+    timeout : float, optional
+        Timeout in seconds of the network operations, by default 60.
+    retries : int, optional
+        Number of times an operation is attempted again after a network
+        error or a temporary FTP error, by default 3. Interrupted downloads
+        resume from the last byte received (REST).
+    backoff : float, optional
+        Maximum delay in seconds before the first retry, doubled after every
+        attempt, by default 1.0. The delays are random.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        port=None,
+        directory=None,
+        timeout=60,
+        retries=3,
+        backoff=1.0,
+    ):
+        self.host = host
+        self.port = port
+        self.directory = directory
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    def _address(self):
+        # The defaults are looked up on use so that they can be changed
+        return (
+            _FTP_ADDRESS if self.host is None else self.host,
+            _FTP_PORT if self.port is None else self.port,
+        )
+
+    def _path(self, directory):
+        root = _FTP_DIR if self.directory is None else self.directory
+        return posixpath.join("/", root, directory)
+
+    def _location(self):
+        return "ftp://%s:%d%s" % (*self._address(), self._path(""))
+
+    def _open(self, directory):
+        noaa_ftp = FTP(timeout=self.timeout)
+        try:
+            with _timed("connect"):
+                noaa_ftp.connect(*self._address())
+                noaa_ftp.login()  # Log in (no user name or password required)
+            noaa_ftp.cwd(self._path(directory))
+        except BaseException:
+            noaa_ftp.close()
+            raise
+        return noaa_ftp
+
+    def _chdir(self, noaa_ftp, directory):
+        noaa_ftp.cwd(self._path(directory))
+
+    def _quit(self, noaa_ftp):
+        noaa_ftp.quit()
+
+    def _abort(self, noaa_ftp):
+        noaa_ftp.close()
+
+    def _stat(self, noaa_ftp, directory, filename):
+        noaa_ftp.voidcmd("TYPE I")
+        size = noaa_ftp.size(filename)
+        modified = noaa_ftp.voidcmd("MDTM " + filename).split()[-1]
+        mtime = calendar.timegm(time.strptime(modified[:14], "%Y%m%d%H%M%S"))
+        return size, mtime
+
+    def _retrieve(self, noaa_ftp, directory, filename, write, offset):
+        noaa_ftp.retrbinary("RETR " + filename, write, rest=offset or None)
+
+    def _list(self, noaa_ftp, directory):
+        lines = []
+        noaa_ftp.retrlines("LIST", lines.append)
+        files = {}
+        for line in lines:
+            # Unix style listing: permissions, links, owner, group, size,
+            # month, day, time or year and name
+            parts = line.split(None, 8)
+            if len(parts) == 9 and parts[0].startswith("-"):
+                files[parts[8]] = int(parts[4])
+            elif not parts or parts[0] == "total" or parts[0][0] == "d":
+                continue
+            else:
+                # Symbolic links or another listing format (e.g. DOS), of
+                # which the names are listed again without their sizes
+                names = []
+                noaa_ftp.retrlines("NLST", names.append)
+                return {
+                    posixpath.basename(name): files.get(
+                        posixpath.basename(name), -1
+                    )
+                    for name in names
+                }
+        return files
+
+
+class HTTPSTransport(_Transport):
+    """
+    Transport of the ISD files from an HTTP(S) mirror, by default the NOAA
+    HTTPS site, see `set_transport`.
+
+    Connections are kept alive between downloads, and interrupted downloads
+    resume with range requests when the server supports them.
+
+    Parameters
+    ----------
+    url : str, optional
+        URL of the ISD directory, by default
+        "https://www.ncei.noaa.gov/pub/data/noaa/".
+    timeout, retries, backoff
+        Network timeout and retries of failed operations, see
+        `FTPTransport`.
+    """
+
+    def __init__(
+        self,
+        url="https://www.ncei.noaa.gov/pub/data/noaa/",
+        timeout=60,
+        retries=3,
+        backoff=1.0,
+    ):
+        self.url = url if url.endswith("/") else url + "/"
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    def _location(self):
+        return self.url
+
+    def _open(self, directory):
+        parts = urllib.parse.urlsplit(self.url)
+        if parts.scheme == "https":
+            connection_class = http.client.HTTPSConnection
+        else:
+            connection_class = http.client.HTTPConnection
+        connection = connection_class(
+            parts.hostname, parts.port, timeout=self.timeout
+        )
+        try:
+            with _timed("connect"):
+                connection.connect()
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def _abort(self, connection):
+        connection.close()
+
+    def _request(self, connection, method, directory, filename, headers):
+        path = urllib.parse.urlsplit(
+            urllib.parse.urljoin(self.url, posixpath.join(directory, filename))
+        ).path
+        connection.request(method, path, headers=headers)
+        response = connection.getresponse()
+        # Requested ranges starting at the end of the file are empty
+        if response.status >= 400 and response.status != 416:
+            response.read()
+            message = "%d %s: %s" % (response.status, response.reason, path)
+            if response.status >= 500 or response.status in [408, 429]:
+                raise error_temp(message)
+            raise error_perm(message)
+        return response
+
+    def _stat(self, connection, directory, filename):
+        response = self._request(connection, "HEAD", directory, filename, {})
+        response.read()
+        size = int(response.getheader("Content-Length"))
+        mtime = calendar.timegm(
+            email.utils.parsedate(response.getheader("Last-Modified"))
+        )
+        return size, mtime
+
+    def _retrieve(self, connection, directory, filename, write, offset):
+        headers = {"Range": "bytes=%d-" % offset} if offset else {}
+        response = self._request(
+            connection, "GET", directory, filename, headers
+        )
+        if response.status == 416:
+            response.read()
+            return
+        # Servers without range requests send the whole file again
+        skip = offset if response.status == 200 else 0
+        while True:
+            block = response.read(2 ** 16)
+            if not block:
+                break
+            if skip:
+                block, skip = block[skip:], max(skip - len(block), 0)
+            if block:
+                write(block)
+
+    def _list(self, connection, directory):
+        # Links of the directory index page, which has no exact sizes
+        response = self._request(connection, "GET", directory, "", {})
+        page = response.read().decode("utf-8", "replace")
+        return {
+            urllib.parse.unquote(name): -1
+            for name in re.findall(r'href="([^"/?#]+)"', page)
+        }
+
+
+class LocalTransport(_Transport):
+    """
+    Transport of the ISD files from a local directory laid out like the FTP
+    site (`isd-history.txt`, `<year>/<station number>-<year>.gz`), e.g. a
+    mirror or test files, see `set_transport`.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the ISD files.
+    """
+
+    retries = 0
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _location(self):
+        return "file://" + os.path.abspath(self.directory)
+
+    def _open(self, directory):
+        return None
+
+    def _local_path(self, directory, filename):
+        path = os.path.join(self.directory, directory, filename)
+        if not os.path.isfile(path):
+            raise error_perm("550 No such file: " + path)
+        return path
+
+    def _stat(self, session, directory, filename):
+        stat = os.stat(self._local_path(directory, filename))
+        return stat.st_size, int(stat.st_mtime)
+
+    def _retrieve(self, session, directory, filename, write, offset):
+        with open(self._local_path(directory, filename), "rb") as local:
+            local.seek(offset)
+            for block in iter(lambda: local.read(2 ** 16), b""):
+                write(block)
+
+    def _list(self, session, directory):
+        path = os.path.join(self.directory, directory)
+        if not os.path.isdir(path):
+            raise error_perm("550 No such directory: " + path)
+        return {
+            entry.name: entry.stat().st_size
+            for entry in os.scandir(path)
+            if entry.is_file()
+        }
+
+
+# Transport of the loaders, see set_transport.
+_TRANSPORT = None
+
+
+def set_transport(transport=None):
+    """
+    Selects where the ISD files are downloaded from.
+
+    Parameters
+    ----------
+    transport : FTPTransport, HTTPSTransport or LocalTransport, optional
+        Transport of the station information and station-year files of all
+        loaders, by default the NOAA FTP site. The asynchronous loaders
+        only download with asyncio from FTP servers, and run the transfers
+        of other transports in threads.
+    Examples
+    --------
+    >>> set_transport(HTTPSTransport())
+    >>> set_transport(LocalTransport("mirror/pub/data/noaa"))
+    """
+    global _TRANSPORT
+    _TRANSPORT = transport
+
+
+def _get_transport():
+    """Returns the selected transport."""
+    return FTPTransport() if _TRANSPORT is None else _TRANSPORT
+
+
+# First bytes of gzip compressed data.
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+@contextlib.contextmanager
+def _raw_buffer(source):
+    """
+    Yields the uncompressed contents of a file given as a path, bytes or a
+    binary file object.
+
+    Gzip compressed data is decompressed in memory, while uncompressed files
+    given by path are memory-mapped instead of being read.
+
+    Parameters
+    ----------
+    source : str, os.PathLike, bytes-like or file object
+        The file, its contents or a binary file object to read it from.
+    Yields
+    ------
+    bytes-like
+        Uncompressed contents of the file.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as raw_file:
+            if raw_file.read(2) != _GZIP_MAGIC and os.fstat(
+                raw_file.fileno()
+            ).st_size:
+                mapped = mmap.mmap(
+                    raw_file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+                try:
+                    yield mapped
+                finally:
+                    try:
+                        mapped.close()
+                    except BufferError:
+                        pass  # still viewed by a traceback, closed on release
+                return
+            raw_file.seek(0)
+            data = raw_file.read()
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        data = source
+    else:
+        data = source.read()
+    if bytes(data[:2]) == _GZIP_MAGIC:
+        data = _gunzip(data)
+    yield data
+
+
+def _line_bounds(buf):
+    """
+    Returns the start and end offsets of the lines of a text buffer.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray
+        uint8 view of the text.
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Offset of the first character and of the newline of every line.
+    """
+    ends = np.flatnonzero(buf == ord("\n"))
+    if len(buf) and buf[-1] != ord("\n"):
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate(([0], ends[:-1] + 1)).astype(np.int64)
+    return starts, ends
+
+
+def _text_column(buf, starts, ends, start, end):
+    """
+    Extracts a fixed-width text column from every line of a buffer.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray
+        uint8 view of the text.
+    starts, ends : numpy.ndarray
+        Line offsets returned by `_line_bounds`.
+    start, end : int
+        Position of the column within a line.
+    Returns
+    -------
+    numpy.ndarray
+        Stripped values of the column, with blank values as empty strings.
+    """
+    positions = starts[:, None] + np.arange(start, end)
+    chars = buf[np.minimum(positions, max(len(buf) - 1, 0))]
+    chars[positions >= ends[:, None]] = ord(" ")
+    # Latin-1 bytes map one to one to code points
+    values = chars.astype("<u4").view("<U%d" % (end - start)).ravel()
+    return np.char.strip(values)
+
+
+# Columns of the station information/history file (isd-history.txt), their
+# position (start, end) in a line and the number of header lines to skip.
+_STATION_COLUMNS = {
+    "usaf": (0, 7),
+    "wban": (7, 13),
+    "station_name": (13, 43),
+    "country": (43, 48),
+    "state": (48, 51),
+    "call": (51, 57),
+    "latitude": (57, 65),
+    "longitude": (65, 74),
+    "elevation": (74, 82),
+    "start": (82, 91),
+    "end": (91, 101),
+}
+_STATION_HEADER_LINES = 22
+
+
+def _parse_station_history(raw_data):
+    """
+    Decodes the station information/history file into a typed data frame.
+
+    Parameters
+    ----------
+    raw_data : bytes-like
+        Contents of isd-history.txt.
+    Returns
+    -------
+    pandas.DataFrame
+        Data frame containing information of all stations, with categorical
+        identifiers, float32 coordinates and datetime64 dates.
+    """
+    buf = np.frombuffer(raw_data, dtype=np.uint8)
+    starts, ends = _line_bounds(buf)
+    starts = starts[_STATION_HEADER_LINES:]
+    ends = ends[_STATION_HEADER_LINES:]
+    keep = ends > starts  # skip blank lines
+    starts, ends = starts[keep], ends[keep]
+
+    data = {}
+    for col, (start, end) in _STATION_COLUMNS.items():
+        values = _text_column(buf, starts, ends, start, end)
+        if col in ["latitude", "longitude", "elevation"]:
+            data[col] = pd.to_numeric(values, errors="coerce").astype(
+                np.float32
+            )
+        elif col in ["start", "end"]:
+            data[col] = pd.to_datetime(
+                values, format="%Y%m%d", errors="coerce"
+            )
+        elif col == "station_name":
+            data[col] = np.where(values == "", None, values.astype(object))
+        else:
+            data[col] = pd.Categorical(values).remove_categories(
+                [""] if (values == "").any() else []
+            )
+    return pd.DataFrame(data)
+
+
+class _StationTable:
+    """
+    Station information with prebuilt indexes of the row positions of every
+    country, state and station number ('<USAF ID>-<WBAN ID>').
+    """
+
+    def __init__(self, stations_df):
+        self.stations_df = stations_df
+        self.by_country = stations_df.groupby(
+            "country", observed=True
+        ).indices
+        self.by_state = stations_df.groupby("state", observed=True).indices
+        station_numbers = (
+            stations_df.usaf.astype(str) + "-" + stations_df.wban.astype(str)
+        )
+        self.by_station = dict(
+            zip(station_numbers, range(len(stations_df.index)))
+        )
+
+    @functools.cached_property
+    def spatial(self):
+        """Spatial index of the station coordinates."""
+        return _SpatialIndex(
+            self.stations_df.latitude.to_numpy(np.float64),
+            self.stations_df.longitude.to_numpy(np.float64),
+        )
+
+    def active_in(self, year):
+        """Returns a mask of the stations reporting during `year`."""
+        return (self.stations_df.start.dt.year.to_numpy() <= year) & (
+            self.stations_df.end.dt.year.to_numpy() >= year
+        )
+
+    def select(self, country="all", state=None):
+        """Returns the stations of a country and/or state."""
+        rows = None
+        if country != "all":
+            rows = self.by_country.get(country, np.array([], dtype=np.intp))
+        if state is not None:
+            state_rows = self.by_state.get(state, np.array([], dtype=np.intp))
+            if rows is not None:
+                state_rows = np.intersect1d(rows, state_rows)
+            rows = state_rows
+        if rows is None:
+            return self.stations_df.copy()
+        return self.stations_df.take(rows)
+
+
+def _download_station_history():
+    """Downloads the station information/history file into memory."""
+    with _get_transport().connect() as connection:
+        return connection.retrieve("isd-history.txt")
+
+
+# Format version of the station snapshot, part of its file name so that
+# snapshots written by other versions are ignored.
+_SNAPSHOT_VERSION = 1
+# Seconds during which a snapshot is used without checking the FTP site.
+_SNAPSHOT_MAX_AGE = 24 * 3600
+
+
+def _snapshot_path(location):
+    """
+    Returns the path of the station snapshot of the site at `location`
+    (see `_Transport._location`).
+    """
+    return os.path.join(
+        _SNAPSHOT_DIR,
+        "isd-history.v%d" % _SNAPSHOT_VERSION,
+        hashlib.sha1(location.encode()).hexdigest()[:16] + ".npz",
+    )
+
+
+def _write_station_snapshot(path, stations_df, size, mtime, location):
+    """
+    Saves the station information as uncompressed numpy arrays, one or two
+    per column, with the size and modification time of the source file and
+    the location of its site.
+    """
+    arrays = {
+        "source": np.array([size, mtime], dtype=np.int64),
+        "location": np.array(location),
+    }
+    for col in stations_df.columns:
+        values = stations_df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays[col + ".codes"] = values.cat.codes.to_numpy()
+            arrays[col + ".categories"] = values.cat.categories.to_numpy(str)
+        elif col == "station_name":
+            arrays[col] = values.fillna("").to_numpy(str)
+        else:
+            arrays[col] = values.to_numpy()
+
+    _write_arrays(path, arrays)
+
+
+def _write_arrays(path, arrays):
+    """
+    Saves numpy arrays to a temporary file which then replaces `path`, so
+    that concurrent readers never see a partial file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as snapshot_file:
+            np.savez(snapshot_file, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read_station_snapshot(path, location):
+    """
+    Loads a station snapshot of the site at `location` written by
+    `_write_station_snapshot`.
+
+    Returns
+    -------
+    tuple or None
+        The station information and the size and modification time of its
+        source file, or None if there is no readable snapshot.
+    """
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            if str(arrays["location"]) != location:
+                return None
+            data = {}
+            for col in _STATION_COLUMNS:
+                if col + ".codes" in arrays:
+                    data[col] = pd.Categorical.from_codes(
+                        arrays[col + ".codes"],
+                        arrays[col + ".categories"].astype(object),
+                    )
+                elif col == "station_name":
+                    values = arrays[col]
+                    data[col] = np.where(
+                        values == "", None, values.astype(object)
+                    )
+                else:
+                    data[col] = arrays[col]
+            size, mtime = arrays["source"].tolist()
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+    return pd.DataFrame(data), size, mtime
+
+
+def _station_history(max_age=None):
+    """
+    Returns the station information from the local snapshot, which is
+    replaced when the file on the FTP site has changed.
+
+    Parameters
+    ----------
+    max_age : float, optional
+        Seconds since the last check of the FTP site during which the
+        snapshot is used as is, by default `_SNAPSHOT_MAX_AGE`. An older
+        snapshot is still used, with a warning, when the site cannot be
+        reached.
+    Returns
+    -------
+    pandas.DataFrame
+        Data frame containing information of all stations.
+    """
+    if _SNAPSHOT_DIR is None:
+        return _parse_station_history(_download_station_history())
+    if max_age is None:
+        max_age = _SNAPSHOT_MAX_AGE
+    transport = _get_transport()
+    location = transport._location()
+    path = _snapshot_path(location)
+    snapshot = _read_station_snapshot(path, location)
+    # The modification time of the snapshot is the time of the last check
+    checked = None if snapshot is None else os.path.getmtime(path)
+    if snapshot is not None and time.time() - checked < max_age:
+        return snapshot[0]
+
+    try:
+        with transport.connect() as connection:
+            size, mtime = connection.stat("isd-history.txt")
+            if snapshot is not None and snapshot[1:] == (size, mtime):
+                os.utime(path)
+                return snapshot[0]
+            raw_data = connection.retrieve("isd-history.txt")
+    except _TRANSIENT_ERRORS as error:
+        if snapshot is None:
+            raise
+        _logger.warning(
+            "Using the station information checked on %s, %s is "
+            "unreachable: %s",
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(checked)),
+            location,
+            error,
+        )
+        return snapshot[0]
+    stations_df = _parse_station_history(raw_data)
+    _write_station_snapshot(path, stations_df, size, mtime, location)
+    return stations_df
+
+
+@functools.lru_cache(maxsize=1)
+def _station_table():
+    """Returns the station table, loading it once per process."""
+    return _StationTable(_station_history())
+
+
+def get_stations_info(country="all", state=None, refresh=False):
+    """
+    Downloads and cleans the data of all stations available at
+    ftp://ftp.ncei.noaa.gov/pub/data/noaa/.
+
+    The station information is kept in a local snapshot, in the directory
+    given by the `NOAASTN_CACHE_DIR` environment variable or by default in
+    `~/.cache/noaastn`, which is shared by all processes and downloaded
+    again only when the file on the FTP site has changed. The FTP site is
+    checked at most once a day, and an older snapshot is used with a
+    warning when the site cannot be reached. The snapshot is loaded once
+    per process and indexed by country and state, so that later calls only
+    cost the size of their result.
+
+    Parameters
+    ----------
+    country : str, optional
+        Filters station information by country location that is represented by
+        two character country code("US") or "all" for every country, by default
+        "all".
+    state : str, optional
+        Filters station information by the two character state code ("CA"),
+        by default all states.
+    refresh : bool, optional
+        Whether to check the FTP site for a newer station information file
+        now rather than once a day, by default False.
+    Returns
+    -------
+    pandas.DataFrame
+        Data frame containing information of all stations.
+    Examples
+    --------
+    >>> get_stations_info(country="US")
+    """
+
+    if not isinstance(country, str):
+        raise Exception(
+            "Invalid country parameter. parameter should be a string"
+        )
+    elif country != "all" and len(country) != 2:
+        raise Exception(
+            "Invalid country parameter. parameter should be length 2"
+        )
+    if state is not None and (not isinstance(state, str) or len(state) != 2):
+        raise Exception(
+            "Invalid state parameter. parameter should be a string of length 2"
+        )
+
+    if refresh:
+        _station_table.cache_clear()
+        # Updates the snapshot which the station table is then loaded from
+        if _SNAPSHOT_DIR is not None:
+            _station_history(max_age=0)
+    return _station_table().select(country, state)
+
+
+def parse_stations_info(source):
+    """
+    Decodes a local copy of the station information/history file.
+
+    Parameters
+    ----------
+    source : str, os.PathLike, bytes or file object
+        Path of isd-history.txt (optionally gzip compressed), its contents
+        or a binary file object to read it from. Uncompressed files given
+        by path are memory-mapped rather than read.
+    Returns
+    -------
+    pandas.DataFrame
+        Data frame containing information of all stations, as returned by
+        `get_stations_info`.
+    Examples
+    --------
+    >>> parse_stations_info("mirror/pub/data/noaa/isd-history.txt")
+    """
+    with _raw_buffer(source) as raw_data:
+        return _parse_station_history(raw_data)
+
+
+# Seconds during which the inventory of a past year is used without listing
+# its directory again; the current year uses `_SNAPSHOT_MAX_AGE`.
+_INVENTORY_MAX_AGE = 30 * 24 * 3600
+# Number of files of a year that the batch loaders load before listing its
+# directory, below which the failed downloads cost less than the listing.
+_INVENTORY_MIN_FILES = 10
+# Time of the last listing and file sizes of the year directories loaded by
+# this process, by location of the transport (see `_Transport._location`)
+# and year, since mirrors may hold different files.
+_inventories = {}
+
+
+def _inventory_path(year, location):
+    """
+    Returns the path of the inventory snapshot of a year directory of the
+    site at `location`.
+    """
+    return os.path.join(
+        _SNAPSHOT_DIR,
+        "inventory.v%d" % _SNAPSHOT_VERSION,
+        hashlib.sha1(location.encode()).hexdigest()[:16],
+        "%d.npz" % year,
+    )
+
+
+def _inventory_max_age(year):
+    if year >= time.gmtime().tm_year:
+        return _SNAPSHOT_MAX_AGE
+    return _INVENTORY_MAX_AGE
+
+
+def _read_inventory(year, location):
+    """
+    Loads the inventory snapshot of a year directory of the site at
+    `location`.
+
+    Returns
+    -------
+    tuple or None
+        The time of the listing and the size of every file, or None if
+        there is no readable snapshot.
+    """
+    if _SNAPSHOT_DIR is None:
+        return None
+    path = _inventory_path(year, location)
+    try:
+        # The modification time of the snapshot is the time of the listing
+        listed = os.path.getmtime(path)
+        with np.load(path, allow_pickle=False) as arrays:
+            if str(arrays["location"]) != location:
+                return None
+            files = dict(
+                zip(arrays["names"].tolist(), arrays["sizes"].tolist())
+            )
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+    return listed, files
+
+
+def _inventory(year, connection=None, refresh=False):
+    """
+    Returns the size of every file of a year directory, listing it on the
+    FTP site when it was not listed recently.
+
+    Parameters
+    ----------
+    year : int
+        Year directory.
+    connection : optional
+        Connection of the transport to list the directory with, by default
+        a new one of the current transport is opened when needed.
+    refresh : bool, optional
+        Whether to list the directory even if it was listed recently.
+    Returns
+    -------
+    dict
+        Size in bytes by file name, -1 when the transport does not report
+        sizes.
+    """
+    transport = _get_transport() if connection is None else (
+        connection.transport
+    )
+    location = transport._location()
+    if not refresh:
+        files = _known_inventory(year, location)
+        if files is not None:
+            return files
+
+    if connection is None:
+        with transport.connect() as connection:
+            return _inventory(year, connection, refresh)
+    try:
+        files = connection.listdir(str(year))
+    except error_perm:
+        # No station reported during the year
+        files = {}
+    if _SNAPSHOT_DIR is not None:
+        _write_arrays(
+            _inventory_path(year, location),
+            {
+                "location": np.array(location),
+                "names": np.array(list(files), dtype=str),
+                "sizes": np.array(list(files.values()), dtype=np.int64),
+            },
+        )
+    _inventories[location, year] = (time.time(), files)
+    return files
+
+
+def _known_inventory(year, location=None):
+    """
+    Returns the size of every file of a year directory of the site at
+    `location`, by default the one of the current transport, if it was
+    listed recently, else None. The site is never contacted.
+    """
+    if location is None:
+        location = _get_transport()._location()
+    listed = _inventories.get((location, year))
+    if listed is None or time.time() - listed[0] >= _inventory_max_age(year):
+        listed = _read_inventory(year, location)
+        if listed is None or (
+            time.time() - listed[0] >= _inventory_max_age(year)
+        ):
+            return None
+        _inventories[location, year] = listed
+    return listed[1]
+
+
+def _check_available(year, filename):
+    """
+    Rejects a station-year file missing from the inventory of its year on
+    the site of the current transport, without contacting the site.
+
+    Raises
+    ------
+    ftplib.error_perm
+        If the year directory was listed recently and the file is missing,
+        as the FTP site would.
+    """
+    files = _known_inventory(year)
+    if files is not None and filename not in files:
+        raise error_perm(
+            "550 %s: No such file in the inventory of %d" % (filename, year)
+        )
+
+
+def _list_years(tasks, connection=None, cache=None, store=None, columns=None):
+    """
+    Lists the year directories of which at least `_INVENTORY_MIN_FILES`
+    station-years are downloaded, so that the missing ones are rejected
+    without contacting the FTP site. Station-years served by `cache` or
+    read from `store` with `columns` do not count, so that loads served
+    locally never contact the site. Transient errors leave the files to be
+    requested one by one.
+    """
+    counts = collections.Counter(
+        year
+        for station_number, year in tasks
+        if not (
+            cache is not None
+            and cache.cached(year, station_number + "-" + str(year) + ".gz")
+        )
+        and not _stored(store, station_number, year, columns)
+    )
+    for year, count in counts.items():
+        if count >= _INVENTORY_MIN_FILES:
+            try:
+                _inventory(year, connection)
+            except _TRANSIENT_ERRORS:
+                pass
+
+
+def get_inventory(years, refresh=False):
+    """
+    Lists the station-year files available on the NOAA FTP site, or the
+    site of the transport selected with `set_transport`, with their sizes.
+
+    The listing of every year directory is kept in a local snapshot next
+    to the station information, see `get_stations_info`, and listed again
+    after a month for past years or a day for the current year. Listings
+    are kept per site, since mirrors may hold different files. Once a year
+    is listed, requests for its missing station-years are rejected without
+    contacting the site, as long as the same transport is in use. The batch
+    loaders list the years of which they load many station-years
+    themselves.
+
+    Parameters
+    ----------
+    years : list of int
+        Years to list.
+    refresh : bool, optional
+        Whether to list the year directories now even if they were listed
+        recently, by default False.
+    Returns
+    -------
+    pandas.DataFrame
+        A dataframe with the station number (`stn`), `year` and `size` in
+        bytes of every station-year file, with the `start` and `end` dates
+        of the station from the station information (NaT for stations
+        missing from it). Sizes are missing (<NA>) when the transport does
+        not report them.
+    Examples
+    --------
+    >>> inventory_df = get_inventory(range(2000, 2021))
+    >>> inventory_df.groupby("year")["size"].sum()
+    """
+    for year in years:
+        assert type(year) == int, "Year must be entered as an integer"
+
+    stations, file_years, sizes = [], [], []
+    with _get_transport().connect() as connection:
+        for year in years:
+            suffix = "-%d.gz" % year
+            files = _inventory(year, connection, refresh)
+            for filename, size in files.items():
+                if filename.endswith(suffix):
+                    stations.append(filename[: -len(suffix)])
+                    file_years.append(year)
+                    sizes.append(size)
+
+    table = _station_table()
+    stations_df = table.stations_df
+    positions = np.array(
+        [table.by_station.get(stn, -1) for stn in stations], dtype=np.int64
+    )
+    known = positions >= 0
+    sizes = np.array(sizes, dtype=np.int64)
+    inventory_df = pd.DataFrame(
+        {
+            "stn": pd.Categorical(stations),
+            "year": np.array(file_years, dtype=np.int64),
+            "size": pd.arrays.IntegerArray(sizes, sizes < 0),
+        }
+    )
+    for col in ["start", "end"]:
+        dates = stations_df[col].to_numpy()[np.where(known, positions, 0)]
+        inventory_df[col] = np.where(
+            known, dates, np.datetime64("NaT")
+        ).astype("datetime64[ns]")
+    return inventory_df
+
+
+# Mean radius of the Earth.
+_EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vectors(latitude, longitude):
+    """Returns the 3D unit vectors of coordinates given in degrees."""
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    return np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+
+
+def _angles(xyz_a, xyz_b):
+    """Returns the angles (radians) between two sets of unit vectors."""
+    # Computed from the chord length, which is more precise than arccos for
+    # nearby points
+    chords = np.sqrt(np.maximum(2 - 2 * (xyz_a @ xyz_b.T), 0))
+    return 2 * np.arcsin(np.minimum(chords / 2, 1))
+
+
+class _SpatialIndex:
+    """
+    Grid index of coordinates, stored sorted by latitude/longitude cell with
+    the offsets of every cell so that the points near a location are found
+    by slicing the cells around it.
+
+    Parameters
+    ----------
+    latitude, longitude : numpy.ndarray
+        Coordinates in degrees. Points with missing coordinates are not
+        indexed.
+    cell_deg : float, optional
+        Size of the cells in degrees, by default 1.
+    """
+
+    def __init__(self, latitude, longitude, cell_deg=1.0):
+        self.cell_deg = cell_deg
+        self.n_lat = int(np.ceil(180 / cell_deg))
+        self.n_lon = int(np.ceil(360 / cell_deg))
+        valid = np.flatnonzero(np.isfinite(latitude) & np.isfinite(longitude))
+        cells = self._cells(latitude[valid], longitude[valid])
+        order = np.argsort(cells, kind="stable")
+        self.rows = valid[order]
+        self.xyz = _unit_vectors(latitude[self.rows], longitude[self.rows])
+        self.cell_starts = np.searchsorted(
+            cells[order], np.arange(self.n_lat * self.n_lon + 1)
+        )
+
+    def _lat_cells(self, latitude):
+        cells = np.floor((np.asarray(latitude) + 90) / self.cell_deg)
+        return np.clip(cells, 0, self.n_lat - 1).astype(np.int64)
+
+    def _lon_cells(self, longitude):
+        cells = np.floor((np.asarray(longitude) + 180) % 360 / self.cell_deg)
+        return np.clip(cells, 0, self.n_lon - 1).astype(np.int64)
+
+    def _cells(self, latitude, longitude):
+        return (
+            self._lat_cells(latitude) * self.n_lon
+            + self._lon_cells(longitude)
+        )
+
+    def candidates(self, latitude, longitude, angle):
+        """
+        Returns the positions (in `rows`) of the points in the cells that
+        overlap the cap of `angle` radians around a location.
+        """
+        deg = np.degrees(angle)
+        lat_range = self._lat_cells([latitude - deg, latitude + deg])
+        lon_ranges = [(0, self.n_lon - 1)]
+        if abs(latitude) + deg < 90:
+            # Half-width in longitude of a cap that does not cover a pole
+            dlon = np.degrees(
+                np.arcsin(min(np.sin(angle) / np.cos(np.radians(latitude)), 1))
+            )
+            if 2 * dlon + self.cell_deg < 360:
+                west, east = self._lon_cells(
+                    [longitude - dlon, longitude + dlon]
+                )
+                lon_ranges = (
+                    [(west, east)]
+                    if west <= east
+                    else [(west, self.n_lon - 1), (0, east)]
+                )
+
+        if lon_ranges == [(0, self.n_lon - 1)]:
+            # Whole latitude bands are contiguous in the cell order
+            return np.arange(
+                self.cell_starts[lat_range[0] * self.n_lon],
+                self.cell_starts[(lat_range[1] + 1) * self.n_lon],
+            )
+        slices = []
+        for lat_cell in range(lat_range[0], lat_range[1] + 1):
+            for west, east in lon_ranges:
+                first = self.cell_starts[lat_cell * self.n_lon + west]
+                last = self.cell_starts[lat_cell * self.n_lon + east + 1]
+                if last > first:
+                    slices.append(np.arange(first, last))
+        return np.concatenate(slices) if slices else np.array([], np.int64)
+
+    def query(
+        self, latitude, longitude, k=None, radius_km=None, mask=None,
+        group_deg=5.0,
+    ):
+        """
+        Finds the nearest `k` points and/or the points within `radius_km` of
+        every location. Nearby locations are searched together, in groups
+        of `group_deg` by `group_deg` degrees.
+
+        Parameters
+        ----------
+        latitude, longitude : numpy.ndarray
+            Locations in degrees.
+        k : int, optional
+            Number of nearest points to return per location.
+        radius_km : float, optional
+            Search radius in kilometres.
+        mask : numpy.ndarray, optional
+            Boolean mask of the original points that may be returned.
+        group_deg : float, optional
+            Size of the groups of locations searched together, by default 5.
+        Returns
+        -------
+        tuple of numpy.ndarray
+            Location number, original point position and distance (km) of
+            the points found, sorted by location and distance.
+        """
+        points = _unit_vectors(latitude, longitude)
+        cells = np.floor((latitude + 90) / group_deg) * 360 + np.floor(
+            (longitude + 180) / group_deg
+        )
+        order = np.argsort(cells, kind="stable")
+        n_allowed = len(self.rows) if mask is None else mask[self.rows].sum()
+        n_wanted = np.inf if k is None else min(k, n_allowed)
+
+        found = [(np.array([], np.int64),) * 2 + (np.array([]),)]
+        groups = np.split(order, np.flatnonzero(np.diff(cells[order])) + 1)
+        for group in groups if len(order) else []:
+            center = group[0]
+            spread = _angles(points[[center]], points[group]).max()
+            if radius_km is not None:
+                angle = radius_km / _EARTH_RADIUS_KM
+            else:
+                # Start from the cap holding k points if they were spread
+                # evenly over the sphere, so that sparse indexes need few
+                # expansions
+                angle = max(
+                    np.radians(self.cell_deg),
+                    np.arccos(max(1 - 2 * n_wanted / max(n_allowed, 1), -1)),
+                )
+            while True:
+                positions = self.candidates(
+                    latitude[center], longitude[center], angle + spread
+                )
+                if mask is not None:
+                    positions = positions[mask[self.rows[positions]]]
+                angles = _angles(points[group], self.xyz[positions])
+                angles[angles > angle] = np.inf
+                n_found = np.isfinite(angles).sum(axis=1)
+                if (
+                    radius_km is not None
+                    or (n_found >= n_wanted).all()
+                    or angle >= np.pi
+                ):
+                    break
+                angle *= 2
+
+            nearest = np.argsort(angles, axis=1, kind="stable")
+            if k is not None:
+                nearest = nearest[:, :k]
+            nearest_angles = np.take_along_axis(angles, nearest, axis=1)
+            hit = np.isfinite(nearest_angles)
+            found.append(
+                (
+                    np.repeat(group, hit.sum(axis=1)),
+                    self.rows[positions[nearest[hit]]],
+                    nearest_angles[hit] * _EARTH_RADIUS_KM,
+                )
+            )
+
+        query_nums, rows, distances = (
+            np.concatenate(arrays) for arrays in zip(*found)
+        )
+        order = np.lexsort((distances, query_nums))
+        return query_nums[order], rows[order], distances[order]
+
+
+def find_stations(lat, lon, k=None, radius_km=None, active_in=None):
+    """
+    Finds the weather stations nearest to a location or a set of locations.
+
+    The station coordinates are indexed once per process, so that a query
+    only inspects the stations around its location.
+
+    Parameters
+    ----------
+    lat, lon : float or array-like
+        Latitude and longitude of the location(s) in degrees.
+    k : int, optional
+        Number of nearest stations to return per location.
+    radius_km : float, optional
+        Return the stations within this distance (km) of the location(s).
+        When given with `k`, the `k` nearest stations within the distance are
+        returned.
+    active_in : int, optional
+        Only return stations reporting during this year, by default all
+        stations.
+    Returns
+    -------
+    pandas.DataFrame
+        Data frame containing the information of the stations found, as
+        returned by `get_stations_info`, and their great circle distance to
+        the location in a `distance_km` column, sorted by distance. When
+        several locations are given, a `query` column holds the position of
+        the location each station was found for.
+    Examples
+    --------
+    >>> find_stations(49.25, -123.1, k=5, active_in=2020)
+    >>> find_stations([49.25, 21.98], [-123.1, -159.34], radius_km=50)
+    """
+
+    assert (
+        k is not None or radius_km is not None
+    ), "Either the number of stations or a radius must be entered"
+    assert k is None or (
+        type(k) == int and k > 0
+    ), "Number of stations must be a positive integer"
+    assert radius_km is None or radius_km > 0, "Radius must be positive"
+    assert active_in is None or type(active_in) == int, (
+        "Year must be entered as an integer"
+    )
+    lats = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+    assert lats.shape == lons.shape and lats.ndim == 1, (
+        "Latitude and longitude must have the same number of values"
+    )
+    assert (np.abs(lats) <= 90).all(), "Latitude must be between -90 and 90"
+    assert (np.abs(lons) <= 180).all(), (
+        "Longitude must be between -180 and 180"
+    )
+
+    table = _station_table()
+    mask = None if active_in is None else table.active_in(active_in)
+    query_nums, rows, distances = table.spatial.query(
+        lats, lons, k, radius_km, mask
+    )
+
+    stations_df = table.stations_df.take(rows)
+    stations_df["distance_km"] = distances
+    if np.ndim(lat) > 0:
+        stations_df.insert(0, "query", query_nums)
+    return stations_df
+
+
+ISDField = collections.namedtuple(
+    "ISDField", ["tag", "start", "end", "scale", "missing", "quality"]
+)
+ISDField.__doc__ = """
+Location and encoding of a field of an ISD record.
+
+Fields of the mandatory data section have no `tag` and their positions are
+counted from the start of the record. Fields of the additional data section
+are found by their tag (e.g. "AA1") and their positions are counted from the
+start of the tag.
+
+Parameters
+----------
+tag : str or None
+    Identifier of the additional data section element holding the field.
+start, end : int
+    Position of the field.
+scale : int
+    Factor the raw value is divided by.
+missing : int
+    Raw value of missing observations.
+quality : int
+    Position of the quality code of the field.
+"""
+
+# Registry of the ISD fields that can be requested from get_weather_data.
+# The raw data file format is described here:
+# ftp://ftp.ncei.noaa.gov/pub/data/noaa/isd-format-document.pdf
+ISD_FIELDS = {
+    "air_temp": ISDField(None, 87, 92, 10, 9999, 92),
+    "atm_press": ISDField(None, 99, 104, 10, 99999, 104),
+    "wind_spd": ISDField(None, 65, 69, 10, 9999, 69),
+    "wind_dir": ISDField(None, 60, 63, 1, 999, 63),
+    "dew_point": ISDField(None, 93, 98, 10, 9999, 98),
+    "visibility": ISDField(None, 78, 84, 1, 999999, 84),
+    "ceiling_height": ISDField(None, 70, 75, 1, 99999, 75),
+    "precip_period": ISDField("AA1", 3, 5, 1, 99, 10),
+    "precip_depth": ISDField("AA1", 5, 9, 10, 9999, 10),
+    "sky_cover": ISDField("GF1", 3, 5, 1, 99, 7),
+}
+# Fields returned by get_weather_data by default.
+DEFAULT_FIELDS = ["air_temp", "atm_press", "wind_spd", "wind_dir"]
+# ISD quality codes of values that were not flagged as suspect ("2", "6") or
+# erroneous ("3", "7") by the NOAA quality control.
+GOOD_QUALITY_CODES = [
+    "0", "1", "4", "5", "9", "A", "C", "I", "M", "P", "R", "U"
+]
+# Length of the mandatory data section of an ISD record.
+_ISD_MANDATORY_LEN = 105
+
+
+def _record_bounds(buf):
+    """
+    Returns the offsets of the complete records in an ISD byte buffer.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray
+        uint8 view of the decompressed ISD file.
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Offsets of the start and end of every line long enough to hold the
+        mandatory data section.
+    """
+    starts, ends = _line_bounds(buf)
+    complete = ends - starts >= _ISD_MANDATORY_LEN
+    return starts[complete], ends[complete]
+
+
+def _decode_ints(buf, starts, start, end):
+    """
+    Decodes a fixed-width, optionally signed, integer field of every record.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray
+        uint8 view of the decompressed ISD file.
+    starts : numpy.ndarray
+        Offsets of the records in `buf`.
+    start, end : int
+        Position of the field within a record.
+    Returns
+    -------
+    numpy.ndarray
+        int64 values of the field.
+    """
+    chars = buf[starts[:, None] + np.arange(start, end)]
+    digits = chars.astype(np.int64) - ord("0")
+    signed = (chars[:, 0] == ord("+")) | (chars[:, 0] == ord("-"))
+    digits[signed, 0] = 0
+    values = digits @ (10 ** np.arange(end - start - 1, -1, -1))
+    values[chars[:, 0] == ord("-")] *= -1
+    return values
+
+
+def _decode_datetimes(buf, starts):
+    """
+    Decodes the observation date and time (YYYYMMDDHHMM) of every record.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray
+        uint8 view of the decompressed ISD file.
+    starts : numpy.ndarray
+        Offsets of the records in `buf`.
+    Returns
+    -------
+    numpy.ndarray
+        datetime64[ns] values.
+    """
+    year = _decode_ints(buf, starts, 15, 19)
+    month = _decode_ints(buf, starts, 19, 21)
+    day = _decode_ints(buf, starts, 21, 23)
+    minutes = (
+        _decode_ints(buf, starts, 23, 25) * 60
+        + _decode_ints(buf, starts, 25, 27)
+    )
+    dates = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    dates = dates.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+    times = dates.astype("datetime64[m]") + minutes.astype("timedelta64[m]")
+    return times.astype("datetime64[ns]")
+
+
+def _trim_records(raw_data, start=None, end=None):
+    """
+    Keeps the records of an ISD file observed from `start` (inclusive) to
+    `end` (exclusive) without decoding them.
+
+    The observation dates (YYYYMMDDHHMM) are compared as bytes, so only the
+    kept records need to be parsed.
+
+    Parameters
+    ----------
+    raw_data : bytes-like
+        Contents of the uncompressed ISD file.
+    start, end : str or datetime-like, optional
+        Bounds of the observation times, by default unbounded.
+    Returns
+    -------
+    bytes-like
+        The kept records, a slice of `raw_data` when they are contiguous.
+    """
+    buf = np.frombuffer(raw_data, dtype=np.uint8)
+    starts, ends = _record_bounds(buf)
+    dates = buf[starts[:, None] + np.arange(15, 27)].view("S12").ravel()
+    keep = np.ones(len(starts), dtype=bool)
+    for bound, compare in [(start, np.greater_equal), (end, np.less)]:
+        if bound is not None:
+            bound = pd.Timestamp(bound).strftime("%Y%m%d%H%M").encode()
+            keep &= compare(dates, bound)
+    kept = np.flatnonzero(keep)
+    if len(kept) == 0:
+        return b""
+    if kept[-1] - kept[0] + 1 == len(kept):
+        return raw_data[starts[kept[0]]:ends[kept[-1]] + 1]
+    return b"".join(
+        bytes(raw_data[starts[i]:ends[i]]) + b"\n" for i in kept
+    )
+
+
+def _find_tag(buf, starts, ends, tag):
+    """
+    Locates an element of the additional data section in every record.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray
+        uint8 view of the decompressed ISD file.
+    starts, ends : numpy.ndarray
+        Offsets of the start and end of the records in `buf`.
+    tag : str
+        Identifier of the element, e.g. "AA1".
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Numbers of the records holding the element and offsets of the
+        element in `buf`.
+    """
+    pattern = np.frombuffer(tag.encode(), dtype=np.uint8)
+    n = len(buf) - len(pattern) + 1
+    hits = np.ones(max(n, 0), dtype=bool)
+    for i, char in enumerate(pattern):
+        hits &= buf[i: n + i] == char
+    positions = np.flatnonzero(hits)
+
+    # Keep the first occurrence within the additional data section, which
+    # starts after the "ADD" tag and ends at the remarks ("REM")
+    records = np.searchsorted(starts, positions, side="right") - 1
+    in_record = (records >= 0) & (
+        positions >= starts[np.maximum(records, 0)] + _ISD_MANDATORY_LEN + 3
+    )
+    records, positions = records[in_record], positions[in_record]
+    in_record = positions < ends[records]
+    records, positions = records[in_record], positions[in_record]
+    if tag != "REM" and len(positions):
+        remarks, remark_positions = _find_tag(buf, starts, ends, "REM")
+        section_ends = ends.copy()
+        section_ends[remarks] = remark_positions
+        in_section = positions < section_ends[records]
+        records, positions = records[in_section], positions[in_section]
+    records, first = np.unique(records, return_index=True)
+    return records, positions[first]
+
+
+def _parse_isd(
+    raw_data, station_number, fields=None, quality=False, accepted_quality=None
+):
+    """
+    Decodes the records of an uncompressed ISD file into a data frame.
+
+    Parameters
+    ----------
+    raw_data : bytes
+        Contents of the uncompressed ISD file.
+    station_number : str
+        NOAA station number the records belong to.
+    fields : list of str, optional
+        Names of the `ISD_FIELDS` to decode, by default `DEFAULT_FIELDS`.
+    quality : bool, optional
+        Whether to add the quality code of every field in a `<field>_quality`
+        column, by default False.
+    accepted_quality : list of str, optional
+        Quality codes of the values to keep, other values are replaced by
+        NaN. By default all values are kept.
+    Returns
+    -------
+    pandas.DataFrame
+        A dataframe that contains a time series of weather station
+        observations, with a categorical `stn` column and float32
+        measurements.
+    """
+    with _timed("decode", bytes=len(raw_data)) as event:
+        buf = np.frombuffer(raw_data, dtype=np.uint8)
+        starts, ends = _record_bounds(buf)
+        n_records = len(starts)
+
+        data = {
+            "stn": pd.Categorical.from_codes(
+                np.zeros(n_records, dtype=np.int8), categories=[station_number]
+            ),
+            "datetime": _decode_datetimes(buf, starts),
+        }
+        tags, quality_codes = {}, {}
+        for col in DEFAULT_FIELDS if fields is None else fields:
+            field = ISD_FIELDS[col]
+            if field.tag is None:
+                records, offsets = slice(None), starts
+            else:
+                if field.tag not in tags:
+                    tags[field.tag] = _find_tag(buf, starts, ends, field.tag)
+                records, offsets = tags[field.tag]
+                complete = offsets + field.quality < ends[records]
+                records, offsets = records[complete], offsets[complete]
+
+            # Each field has its own missing value code, which is masked
+            # before scaling so that valid values equal to another field's
+            # missing value (e.g. a 999.9 hPa pressure) are kept
+            values = np.full(n_records, np.nan, dtype=np.float32)
+            raw_values = _decode_ints(buf, offsets, field.start, field.end)
+            invalid = raw_values == field.missing
+            if accepted_quality is not None:
+                invalid |= ~np.isin(
+                    buf[offsets + field.quality],
+                    np.frombuffer(
+                        "".join(accepted_quality).encode(), np.uint8
+                    ),
+                )
+            values[records] = np.where(
+                invalid, np.nan, raw_values / field.scale
+            )
+            data[col] = values
+
+            if quality:
+                codes = np.full(n_records, -1, dtype=np.int16)
+                chars, codes[records] = np.unique(
+                    buf[offsets + field.quality], return_inverse=True
+                )
+                quality_codes[col + "_quality"] = pd.Categorical.from_codes(
+                    codes, categories=[chr(char) for char in chars]
+                )
+        event["records"] = n_records
+
+    with _timed("frame", records=n_records):
+        return pd.DataFrame({**data, **quality_codes})
+
+
+def _to_scaled(observations_df):
+    """
+    Converts the measurements of an observations data frame to nullable
+    int16 values in the units of the ISD format (e.g. tenths of degrees
+    Celsius), which take half the memory of float32 values.
+
+    Parameters
+    ----------
+    observations_df : pandas.DataFrame
+        Observations as returned by `_parse_isd`.
+    Returns
+    -------
+    pandas.DataFrame
+        The observations with scaled measurements.
+    """
+    observations_df = observations_df.copy()
+    for col, field in ISD_FIELDS.items():
+        if col not in observations_df.columns:
+            continue
+        # Valid values of the fields of up to five digits fit in an int16
+        dtype = np.int16 if field.missing <= 99999 else np.int32
+        values = observations_df[col].to_numpy(np.float64) * field.scale
+        observations_df[col] = pd.arrays.IntegerArray(
+            np.nan_to_num(np.round(values)).astype(dtype), np.isnan(values)
+        )
+    return observations_df
+
+
+class DownloadCache:
+    """
+    Local cache of the station-year files downloaded from the NOAA FTP site.
+
+    Files of past years never change once published and are served from the
+    cache without contacting the server. Files of the current year are
+    revalidated against the size and modification time reported by the
+    server (`SIZE` and `MDTM`) and downloaded again when they changed. The
+    least recently used files are evicted once the cache grows beyond
+    `max_bytes`, down to 90% of it so that the cache directory is scanned
+    only once per tenth of `max_bytes` downloaded. The total size is
+    tracked from the first scan on, so files added by other processes are
+    only accounted for at the next scan.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Cache directory, by default the `NOAASTN_CACHE_DIR` environment
+        variable or `~/.cache/noaastn`.
+    max_bytes : int, optional
+        Maximum total size of the cached files, by default 2 GiB.
+    Examples
+    --------
+    >>> cache = DownloadCache("noaa_cache", max_bytes=500 * 1024 ** 2)
+    >>> get_weather_data('911650-22536', 2020, cache=cache)
+    """
+
+    def __init__(self, directory=None, max_bytes=2 * 1024 ** 3):
+        if directory is None:
+            directory = os.environ.get(
+                "NOAASTN_CACHE_DIR",
+                os.path.join(os.path.expanduser("~"), ".cache", "noaastn"),
+            )
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Total size of the cached files, unknown until the first scan
+        self._total = None
+        self._lock = threading.Lock()
+
+    def path(self, year, filename):
+        """Returns the location of a station-year file in the cache."""
+        return os.path.join(self.directory, str(year), filename)
+
+    def fetch(self, year, filename, connection=None, stat=None):
+        """
+        Returns the contents of a station-year file, downloading it from
+        the NOAA FTP site only when the cached copy is missing or stale.
+
+        Parameters
+        ----------
+        year : int
+            Year directory of the file on the FTP site.
+        filename : str
+            Name of the station-year file.
+        connection : optional
+            Connection of the transport to download with, see
+            `set_transport`, by default a new one is opened when needed.
+        stat : tuple of int, optional
+            Size and modification time of the remote file when they are
+            already known, so they are not requested again.
+        Returns
+        -------
+        bytes
+            Contents of the compressed file.
+        """
+        path = self.path(year, filename)
+        if self.cached(year, filename):
+            _emit("cache", filename=filename, hit=True)
+            return self._read(path)
+        _check_available(year, filename)
+        if connection is None:
+            with _get_transport().connect() as connection:
+                return self.fetch(year, filename, connection, stat)
+
+        mtime = None
+        if year >= time.gmtime().tm_year:
+            if stat is None:
+                stat = connection.stat(str(year) + "/" + filename)
+            size, mtime = stat
+            if self._is_current(path, size, mtime):
+                _emit("cache", filename=filename, hit=True)
+                return self._read(path)
+        _emit("cache", filename=filename, hit=False)
+        compressed_data = connection.retrieve(str(year) + "/" + filename)
+
+        self._write(path, compressed_data, mtime)
+        self._evict_if_full()
+        return compressed_data
+
+    def cached(self, year, filename):
+        """
+        Returns whether a station-year file can be served without contacting
+        the FTP site, i.e. it is cached and from a past year.
+        """
+        return year < time.gmtime().tm_year and os.path.exists(
+            self.path(year, filename)
+        )
+
+    def evict(self, max_bytes=None):
+        """
+        Removes the least recently used files until the cached files take at
+        most `max_bytes`, by default the `max_bytes` of the cache.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".gz"):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append(
+                        (stat.st_atime, stat.st_size, os.path.join(root, name))
+                    )
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # evicted concurrently
+            total -= size
+        with self._lock:
+            self._total = total
+
+    def _evict_if_full(self):
+        # Scans the cache directory on the first write and then only when
+        # the tracked total exceeds the limit
+        with self._lock:
+            if self._total is not None and self._total <= self.max_bytes:
+                return
+        self.evict(int(self.max_bytes * 0.9))
+
+    def _is_current(self, path, size, mtime):
+        # Cached files carry the size and MDTM of the remote file
+        if not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        return (stat.st_size, int(stat.st_mtime)) == (size, mtime)
+
+    def _read(self, path):
+        # Access times are tracked explicitly since file systems are often
+        # mounted with noatime; the mtime holds the remote MDTM.
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+        with open(path, "rb") as cached:
+            return cached.read()
+
+    def _write(self, path, data, mtime=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            now = time.time()
+            os.utime(tmp_path, (now, now if mtime is None else mtime))
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        with self._lock:
+            if self._total is not None:
+                self._total += len(data) - replaced
+
+
+def _gunzip(compressed_data):
+    """Decompresses a gzip compressed file."""
+    with _timed("decompress", bytes=len(compressed_data)):
+        return gzip.decompress(compressed_data)
+
+
+def _fetch_weather_file(
+    year, filename, cache=None, connection=None, stat=None
+):
+    """
+    Returns a station-year file from the cache or the NOAA FTP site.
+
+    Parameters
+    ----------
+    year : int
+        Year directory of the file on the FTP site.
+    filename : str
+        Name of the station-year file.
+    cache : DownloadCache, optional
+        Local cache to serve the file from.
+    connection : optional
+        Connection of the transport to download with, see `set_transport`,
+        by default a new one is opened.
+    stat : tuple of int, optional
+        Size and modification time of the remote file, if already known.
+    Returns
+    -------
+    bytes
+        Contents of the compressed file.
+    """
+    if cache is not None:
+        return cache.fetch(year, filename, connection, stat)
+    _check_available(year, filename)
+    if connection is not None:
+        return connection.retrieve(str(year) + "/" + filename)
+
+    with _get_transport().connect() as connection:
+        return connection.retrieve(str(year) + "/" + filename)
+
+
+def _check_station_year(station_number, year):
+    """Validates the station number and year arguments of the loaders."""
+    assert type(year) == int, "Year must be entered as an integer"
+    assert (
+        type(station_number) == str
+    ), "Station number must be entered as a string"
+    assert re.match(
+        "^[A-z|0-9][0-9]{5}[-][0-9]{5}$", station_number
+    ), 'Station number must be entered in form "911650-22536".'
+
+
+def _check_max_sessions(max_sessions):
+    """Validates the `max_sessions` argument of the concurrent loaders."""
+    assert type(max_sessions) == int and max_sessions > 0, (
+        "Maximum number of sessions must be a positive integer"
+    )
+
+
+def _station_year_tasks(stations, years, max_sessions):
+    """
+    Validates the arguments of the loaders of many stations and years, and
+    returns the station number and year of every station-year to load.
+    Files from the same year are kept together so sessions rarely change
+    directory.
+    """
+    _check_max_sessions(max_sessions)
+    tasks = [(stn, year) for year in years for stn in stations]
+    for station_number, year in tasks:
+        _check_station_year(station_number, year)
+    return tasks
+
+
+class _Gunzip:
+    """Incremental decompressor of (possibly multi-member) gzip data."""
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data):
+        """Returns the decompressed bytes available after `data`."""
+        out = []
+        while data:
+            out.append(self._decompressor.decompress(data))
+            data = b""
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+                if data:
+                    self._decompressor = zlib.decompressobj(
+                        16 + zlib.MAX_WBITS
+                    )
+        return b"".join(out)
+
+    def flush(self):
+        """Returns the remaining bytes, checking the stream is complete."""
+        if not self._decompressor.eof:
+            raise EOFError(
+                "Compressed file ended before the end-of-stream marker was "
+                "reached"
+            )
+        return self._decompressor.flush()
+
+
+class _Cancelled(Exception):
+    """Raised in a download thread whose consumer stopped reading."""
+
+
+# End of stream marker of _iter_decompressed.
+_END = object()
+
+
+def _iter_decompressed(year, filename, cache=None, blocksize=2 ** 16):
+    """
+    Yields the decompressed contents of a station-year file block by block.
+
+    Without a cache, the file is downloaded and decompressed by a
+    background thread which buffers at most 16 blocks ahead of the
+    consumer.
+
+    Parameters
+    ----------
+    year : int
+        Year directory of the file on the FTP site.
+    filename : str
+        Name of the station-year file.
+    cache : DownloadCache, optional
+        Local cache to serve the file from.
+    blocksize : int, optional
+        Size of the compressed blocks read from a cached file.
+    Yields
+    ------
+    bytes
+        Decompressed blocks.
+    """
+    gunzip = _Gunzip()
+    if cache is not None:
+        compressed_data = cache.fetch(year, filename)
+        for i in range(0, len(compressed_data), blocksize):
+            yield gunzip.decompress(compressed_data[i: i + blocksize])
+        yield gunzip.flush()
+        return
+
+    _check_available(year, filename)
+    blocks = queue.Queue(maxsize=16)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise _Cancelled()
+
+    def download():
+        try:
+            # The transfer time includes the decompression and the waits for
+            # the consumer
+            with _get_transport().connect() as connection:
+                connection.stream(
+                    str(year) + "/" + filename,
+                    lambda block: put(gunzip.decompress(block)),
+                )
+            put(gunzip.flush())
+            put(_END)
+        except _Cancelled:
+            pass
+        except BaseException as e_mess:
+            try:
+                put(e_mess)
+            except _Cancelled:
+                pass
+
+    thread = threading.Thread(target=download, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = blocks.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _import_parquet():
+    """Imports pyarrow.parquet, which is an optional dependency."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "ParquetStore requires pyarrow, install it with "
+            "`pip install noaastn[store]`"
+        ) from None
+    return pyarrow, pyarrow.parquet
+
+
+class ParquetStore:
+    """
+    Local columnar store of parsed weather observations with one Parquet
+    file per station-year.
+
+    Every month of observations is written as a separate row group with
+    column statistics, so that reads restricted to a date range and a few
+    variables only decode the row groups and columns they need.
+
+    Parameters
+    ----------
+    directory : str
+        Store directory.
+    Examples
+    --------
+    >>> store = ParquetStore("noaa_store")
+    >>> get_weather_data('911650-22536', 2020, store=store)
+    >>> store.read('911650-22536', 2020, columns=["air_temp"],
+    ...            start="2020-03-01", end="2020-04-01")
+    """
+
+    # Schema metadata key of the refresh state of a station-year.
+    _STATE_KEY = b"noaastn.state"
+
+    def __init__(self, directory):
+        _import_parquet()
+        self.directory = directory
+
+    def path(self, station_number, year):
+        """Returns the location of a station-year file in the store."""
+        return os.path.join(
+            self.directory,
+            str(year),
+            station_number + "-" + str(year) + ".parquet",
+        )
+
+    def has(self, station_number, year, columns=None):
+        """
+        Returns whether a station-year is in the store, with all of
+        `columns` if given.
+        """
+        if not os.path.exists(self.path(station_number, year)):
+            return False
+        return columns is None or set(columns) <= set(
+            self.columns(station_number, year)
+        )
+
+    def columns(self, station_number, year):
+        """
+        Returns the columns stored for a station-year, or an empty list if
+        the station-year is not in the store.
+        """
+        path = self.path(station_number, year)
+        if not os.path.exists(path):
+            return []
+        _, pq = _import_parquet()
+        return pq.read_schema(path).names
+
+    def state(self, station_number, year):
+        """
+        Returns the refresh state stored with a station-year, or None if the
+        station-year is not in the store or was stored without a state.
+        """
+        path = self.path(station_number, year)
+        if not os.path.exists(path):
+            return None
+        _, pq = _import_parquet()
+        state = (pq.read_schema(path).metadata or {}).get(self._STATE_KEY)
+        return None if state is None else json.loads(state)
+
+    def write(self, station_number, year, observations_df, state=None):
+        """
+        Stores the observations of a station-year, replacing any previous
+        version.
+
+        Parameters
+        ----------
+        station_number : str
+            NOAA station number.
+        year : int
+            Year of the observations.
+        observations_df : pandas.DataFrame
+            Observations as returned by `get_weather_data`.
+        state : dict, optional
+            JSON serializable refresh state of the station-year, returned by
+            `state`.
+        """
+        pa, pq = _import_parquet()
+        path = self.path(station_number, year)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        observations_df = observations_df.sort_values(
+            "datetime", kind="stable", ignore_index=True
+        )
+        table = pa.Table.from_pandas(observations_df, preserve_index=False)
+        if state is not None:
+            table = table.replace_schema_metadata(
+                {
+                    **(table.schema.metadata or {}),
+                    self._STATE_KEY: json.dumps(state).encode(),
+                }
+            )
+        months = observations_df.datetime.dt.month.to_numpy()
+        bounds = np.flatnonzero(np.diff(months)) + 1
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            with _timed("store_write", records=len(months)):
+                with pq.ParquetWriter(tmp_path, table.schema) as writer:
+                    for first, last in zip(
+                        np.r_[0, bounds], np.r_[bounds, len(months)]
+                    ):
+                        writer.write_table(table.slice(first, last - first))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def read(
+        self, station_number, year, columns=None, start=None, end=None
+    ):
+        """
+        Reads the observations of a station-year from the store.
+
+        Parameters
+        ----------
+        station_number : str
+            NOAA station number.
+        year : int
+            Year of the observations.
+        columns : list of str, optional
+            Variables to read, by default all. The `stn` and `datetime`
+            columns are always read.
+        start, end : str or datetime-like, optional
+            Only read observations from `start` (inclusive) to `end`
+            (exclusive).
+        Returns
+        -------
+        observations_df : pandas.DataFrame
+            A dataframe that contains a time series of weather station
+            observations.
+        """
+        _, pq = _import_parquet()
+        if columns is not None:
+            columns = ["stn", "datetime"] + [
+                col for col in columns if col not in ["stn", "datetime"]
+            ]
+        filters = []
+        if start is not None:
+            filters.append(("datetime", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("datetime", "<", pd.Timestamp(end)))
+        with _timed("store_read") as event:
+            table = pq.read_table(
+                self.path(station_number, year),
+                columns=columns,
+                filters=filters or None,
+            )
+            event["records"] = table.num_rows
+            return table.to_pandas()
+
+
+def parse_weather_data(
+    source,
+    station_number=None,
+    scaled=False,
+    fields=None,
+    quality=False,
+    accepted_quality=None,
+):
+    """
+    Decodes a local copy of a station-year file.
+
+    Parameters
+    ----------
+    source : str, os.PathLike, bytes or file object
+        Path of the ISD file (gzip compressed or not), its contents or a
+        binary file object to read it from. Uncompressed files given by
+        path are memory-mapped rather than read.
+    station_number : str, optional
+        The NOAA station number, by default read from the first record.
+    scaled, fields, quality, accepted_quality
+        Selection of the returned columns and values, see
+        `get_weather_data`.
+    Returns
+    -------
+    pandas.DataFrame
+        A dataframe that contains a time series of weather station
+        observations, as returned by `get_weather_data`.
+    Examples
+    --------
+    >>> parse_weather_data("mirror/pub/data/noaa/2020/911650-22536-2020.gz")
+    """
+    with _raw_buffer(source) as raw_data:
+        if station_number is None:
+            # The USAF and WBAN numbers start every record
+            usaf_wban = bytes(raw_data[4:15]).decode("latin-1")
+            station_number = (
+                usaf_wban[:6] + "-" + usaf_wban[6:] if usaf_wban else ""
+            )
+        observations_df = _parse_isd(
+            raw_data, station_number, fields, quality, accepted_quality
+        )
+    return _to_scaled(observations_df) if scaled else observations_df
+
+
+def get_weather_data(
+    station_number,
+    year,
+    cache=None,
+    store=None,
+    scaled=False,
+    fields=None,
+    quality=False,
+    accepted_quality=None,
+):
+    """
+    Loads and cleans weather data for a given NOAA station ID and year.
+    Returns a dataframe containing a time series of air temperature (degrees
+    Celsius), atmospheric pressure (hectopascals), wind speed (m/s), and wind
+    direction (angular degrees), or of the fields requested in `fields`. The
+    raw data file is downloaded from the NOAA FTP server at
+    ftp://ftp.ncei.noaa.gov/pub/data/noaa/.
+
+    Parameters
+    ----------
+    station_number : str
+        NOAA station number.
+    year : int
+        Year for which weather data should be returned
+    cache : DownloadCache, optional
+        Local cache to serve the station-year file from, by default the file
+        is always downloaded.
+    store : ParquetStore, optional
+        Local store of parsed observations. Past years found in the store
+        are read from it, and downloaded station-years are written to it
+        with the fields stored before.
+    scaled : bool, optional
+        Whether to return the measurements as nullable int16 values in the
+        units of the raw data file (tenths of degrees Celsius, tenths of
+        hectopascals, tenths of m/s and angular degrees), by default False.
+    fields : list of str, optional
+        Fields to extract, among the names of `ISD_FIELDS`: 'air_temp',
+        'atm_press', 'wind_spd', 'wind_dir', 'dew_point' (degrees Celsius),
+        'visibility' (m), 'ceiling_height' (m), 'precip_period' (hours),
+        'precip_depth' (mm) and 'sky_cover' (total coverage code), by default
+        `DEFAULT_FIELDS`. Only the requested fields are decoded.
+    quality : bool, optional
+        Whether to add the ISD quality code of every field in a
+        `<field>_quality` column, by default False.
+    accepted_quality : list of str, optional
+        ISD quality codes of the values to keep, e.g. `GOOD_QUALITY_CODES`.
+        Values with other quality codes are replaced by NaN. By default all
+        values are kept.
+    Notes
+    -----
+        `station_number` is a combination of the USAF station ID and the NCDC
+        WBAN number in the form '<USAF ID>-<WBAN ID>'.  If a WBAN ID does not
+        exist, a value of '99999' should be used in its place.
+        Example with WBAN ID - '911650-22536'
+        Example without WBAN ID - '010015-99999'
+        Station numbers can be found in the dataframe returned by
+        `get_stations_info()` or through the NOAA's graphical tool at
+        https://gis.ncdc.noaa.gov/maps/ncei/cdo/hourly
+    Returns
+    -------
+    observations_df : pandas.DataFrame
+        A dataframe that contains a time series of weather station
+        observations. The station number is stored as a categorical and the
+        measurements as float32 (or int16 if `scaled`) to save memory.
+    Examples
+    --------
+    >>> get_weather_data('911650-22536', 2020)
+    """
+
+    _check_station_year(station_number, year)
+    columns = _field_columns(fields, quality or accepted_quality is not None)
+    if _stored(store, station_number, year, columns):
+        observations_df = _mask_quality(
+            store.read(station_number, year, columns),
+            fields,
+            quality,
+            accepted_quality,
+        )
+        return _to_scaled(observations_df) if scaled else observations_df
+
+    # Stored frames keep every value and quality code, and the fields stored
+    # before, so that they can serve any later selection
+    if store is not None:
+        parse_fields = _store_fields(store, station_number, year, fields)
+        parse_quality, parse_accepted = True, None
+    else:
+        parse_fields = fields
+        parse_quality, parse_accepted = quality, accepted_quality
+    try:
+        chunks = list(
+            iter_weather_data(
+                station_number,
+                year,
+                1000000,
+                cache=cache,
+                fields=parse_fields,
+                quality=parse_quality,
+                accepted_quality=parse_accepted,
+            )
+        )
+    except error_perm as e_mess:
+        _emit("error", station_number=station_number, year=year, error=e_mess)
+        print("Error generated from NOAA FTP site: \n", e_mess)
+        return
+
+    if not chunks:
+        chunks = [
+            _parse_isd(
+                b"",
+                station_number,
+                parse_fields,
+                parse_quality,
+                parse_accepted,
+            )
+        ]
+    observations_df = _concat_observations(chunks)
+    if store is not None:
+        store.write(station_number, year, observations_df)
+        columns = ["stn", "datetime"] + _field_columns(fields, True)
+        observations_df = _mask_quality(
+            observations_df[columns],
+            fields,
+            quality,
+            accepted_quality,
+        )
+    return _to_scaled(observations_df) if scaled else observations_df
+
+
+def _stored(store, station_number, year, columns):
+    """
+    Returns whether a station-year can be read from a store. Only past
+    years are, since the current year is still being updated.
+    """
+    return (
+        store is not None
+        and year < time.gmtime().tm_year
+        and store.has(station_number, year, columns)
+    )
+
+
+def _store_fields(store, station_number, year, fields):
+    """
+    Returns the fields to decode before writing a station-year to a store:
+    the requested ones followed by those already stored, so that loads of
+    different fields add to the stored station-year rather than replace it.
+    """
+    fields = DEFAULT_FIELDS if fields is None else list(fields)
+    return fields + [
+        col
+        for col in store.columns(station_number, year)
+        if col in ISD_FIELDS and col not in fields
+    ]
+
+
+def _mask_quality(observations_df, fields, quality, accepted_quality):
+    """
+    Replaces the values of a stored frame whose quality code is not
+    accepted by NaN, and drops the quality codes unless requested.
+    """
+    for col in DEFAULT_FIELDS if fields is None else fields:
+        if col + "_quality" not in observations_df:
+            continue
+        if accepted_quality is not None:
+            rejected = ~observations_df[col + "_quality"].isin(
+                accepted_quality
+            )
+            observations_df.loc[rejected.to_numpy(), col] = np.nan
+        if not quality:
+            del observations_df[col + "_quality"]
+    return observations_df
+
+
+def _field_columns(fields, quality):
+    """Returns the measurement columns of the requested fields."""
+    fields = DEFAULT_FIELDS if fields is None else list(fields)
+    for col in fields:
+        assert col in ISD_FIELDS, (
+            "Field can only be one of " + ", ".join(ISD_FIELDS)
+        )
+    if quality:
+        return fields + [col + "_quality" for col in fields]
+    return fields
+
+
+def _concat_observations(frames):
+    """Concatenates observation frames, merging their categories."""
+    frames = list(frames)
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals(
+                [frame[col] for frame in frames]
+            ).categories
+            frames = [
+                frame.assign(
+                    **{col: frame[col].cat.set_categories(categories)}
+                )
+                for frame in frames
+            ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def refresh_weather_data(
+    station_number, store, year=None, cache=None, fields=None, quality=False
+):
+    """
+    Brings the stored observations of a station-year that is still being
+    published up to date.
+
+    The size and modification time of the file on the NOAA FTP site are
+    compared with those recorded at the previous refresh. The file is only
+    downloaded when they changed, and only the records observed from the
+    minute of the last stored observation are parsed; those not stored yet
+    are appended to the store.
+
+    Parameters
+    ----------
+    station_number : str
+        The NOAA station number, see `get_weather_data`.
+    store : ParquetStore
+        Store holding the observations of the station-year.
+    year : int, optional
+        Year to refresh, by default the current year.
+    cache : DownloadCache, optional
+        Local cache to download the station-year file through.
+    fields : list of str, optional
+        Fields to extract, see `get_weather_data`. Fields already in the
+        store are refreshed as well.
+    quality : bool, optional
+        Whether to add the quality code columns to the returned
+        observations, see `get_weather_data`.
+    Returns
+    -------
+    pandas.DataFrame
+        The observations appended to the store.
+    Raises
+    ------
+    ftplib.error_perm
+        If the file does not exist on the FTP site.
+    Examples
+    --------
+    >>> store = ParquetStore("noaa_store")
+    >>> new_df = refresh_weather_data('911650-22536', store)
+    """
+
+    if year is None:
+        year = time.gmtime().tm_year
+    _check_station_year(station_number, year)
+    columns = _field_columns(fields, True)
+    filename = station_number + "-" + str(year) + ".gz"
+    state = store.state(station_number, year)
+    if state is not None and not store.has(station_number, year, columns):
+        state = None  # stored without some of the requested fields
+
+    with _get_transport().connect() as connection:
+        size, mtime = connection.stat(str(year) + "/" + filename)
+        if state is not None and [state["size"], state["mtime"]] == [
+            size,
+            mtime,
+        ]:
+            new_df = _parse_isd(b"", station_number, fields, True)
+            return _mask_quality(new_df, fields, quality, None)
+        compressed_data = _fetch_weather_file(
+            year, filename, cache, connection, (size, mtime)
+        )
+
+    raw_data = _gunzip(compressed_data)
+    if state is None:
+        observations_df = new_df = _parse_isd(
+            raw_data,
+            station_number,
+            _store_fields(store, station_number, year, fields),
+            True,
+        )
+    else:
+        stored_df = store.read(station_number, year)
+        stored_last_df = None
+        if state["last"] is not None:
+            # Records observed in the same minute as the last stored one
+            # may have been appended since, so that minute is parsed again
+            stored_last_df = stored_df[
+                stored_df.datetime == pd.Timestamp(state["last"])
+            ]
+            raw_data = _trim_records(raw_data, start=state["last"])
+        new_df = _parse_isd(
+            raw_data,
+            station_number,
+            [col for col in stored_df.columns if col in ISD_FIELDS],
+            True,
+        )
+        if stored_last_df is not None:
+            # Drops the records of that minute that are already stored
+            repeated = _concat_observations(
+                [stored_last_df, new_df]
+            ).duplicated()
+            new_df = new_df[
+                ~repeated.to_numpy()[len(stored_last_df.index):]
+            ].reset_index(drop=True)
+        observations_df = _concat_observations([stored_df, new_df])
+
+    last = observations_df.datetime.max()
+    store.write(
+        station_number,
+        year,
+        observations_df,
+        {
+            "size": size,
+            "mtime": mtime,
+            "last": None if pd.isna(last) else last.isoformat(),
+        },
+    )
+    return _mask_quality(
+        new_df[["stn", "datetime"] + columns], fields, quality, None
+    )
+
+
+def iter_weather_data(
+    station_number,
+    year,
+    chunksize=10000,
+    cache=None,
+    scaled=False,
+    fields=None,
+    quality=False,
+    accepted_quality=None,
+):
+    """
+    Loads and cleans weather data for a given NOAA station ID and year in
+    chunks of at most `chunksize` records.
+
+    The station-year file is decompressed while it downloads and each chunk
+    is yielded as soon as its records are received, so memory use does not
+    depend on the size of the file.
+
+    Parameters
+    ----------
+    station_number : str
+        NOAA station number, see `get_weather_data`.
+    year : int
+        Year for which weather data should be returned
+    chunksize : int, optional
+        Number of records per chunk, by default 10000.
+    cache : DownloadCache, optional
+        Local cache to serve the station-year file from, by default the file
+        is always downloaded.
+    scaled : bool, optional
+        Whether to return the measurements as nullable int16 values, see
+        `get_weather_data`.
+    fields : list of str, optional
+        Fields to extract, see `get_weather_data`.
+    quality : bool, optional
+        Whether to add the quality code columns, see `get_weather_data`.
+    accepted_quality : list of str, optional
+        ISD quality codes of the values to keep, see `get_weather_data`.
+    Yields
+    ------
+    pandas.DataFrame
+        Consecutive chunks of the time series returned by
+        `get_weather_data`.
+    Examples
+    --------
+    >>> for chunk in iter_weather_data('911650-22536', 2020, chunksize=1000):
+    ...     print(chunk.air_temp.mean())
+    """
+
+    _check_station_year(station_number, year)
+    assert (
+        type(chunksize) == int and chunksize > 0
+    ), "Chunk size must be a positive integer"
+    _field_columns(fields, quality)
+
+    # Generate filename based on selected station number and year and download
+    # data from NOAA FTP site.
+    filename = station_number + "-" + str(year) + ".gz"
+
+    # Decode the records in chunks of complete lines as they are received
+    # The raw data file format is described here:
+    # ftp://ftp.ncei.noaa.gov/pub/data/noaa/isd-format-document.pdf
+    pending, n_lines = [], 0
+    for block in _iter_decompressed(year, filename, cache):
+        pending.append(block)
+        n_lines += block.count(b"\n")
+        while n_lines >= chunksize:
+            buf = b"".join(pending)
+            newlines = np.flatnonzero(np.frombuffer(buf, np.uint8) == 10)
+            cut = newlines[chunksize - 1] + 1
+            chunk = _parse_isd(
+                buf[:cut], station_number, fields, quality, accepted_quality
+            )
+            yield _to_scaled(chunk) if scaled else chunk
+            pending, n_lines = [buf[cut:]], n_lines - chunksize
+    buf = b"".join(pending)
+    if buf.strip():
+        chunk = _parse_isd(
+            buf, station_number, fields, quality, accepted_quality
+        )
+        yield _to_scaled(chunk) if scaled else chunk
+
+
+def _load_station_years(
+    tasks,
+    max_sessions,
+    cache,
+    store,
+    fields,
+    quality,
+    accepted_quality,
+    start=None,
+    end=None,
+):
+    """
+    Loads station-years concurrently over at most `max_sessions` pooled
+    sessions of the transport.
+
+    Parameters
+    ----------
+    tasks : list of tuple
+        Station number and year of every station-year to load.
+    max_sessions : int
+        Maximum number of concurrent FTP sessions.
+    cache, store, fields, quality, accepted_quality
+        See `get_weather_data`.
+    start, end : str or datetime-like, optional
+        Only return observations from `start` (inclusive) to `end`
+        (exclusive). Records outside the range are skipped before they are
+        decoded.
+    Returns
+    -------
+    list
+        The observations dataframe of every station-year, or the exception
+        raised while loading it.
+    """
+    columns = _field_columns(fields, quality or accepted_quality is not None)
+    connection = _get_transport().connect()
+
+    def load(station_number, year):
+        filename = station_number + "-" + str(year) + ".gz"
+        try:
+            if _stored(store, station_number, year, columns):
+                return _mask_quality(
+                    store.read(station_number, year, columns, start, end),
+                    fields,
+                    quality,
+                    accepted_quality,
+                )
+            compressed_data = _fetch_weather_file(
+                year, filename, cache, connection
+            )
+            raw_data = _gunzip(compressed_data)
+            if store is None:
+                if start is not None or end is not None:
+                    raw_data = _trim_records(raw_data, start, end)
+                return _parse_isd(
+                    raw_data, station_number, fields, quality, accepted_quality
+                )
+
+            # The store keeps complete station-years
+            observations_df = _parse_isd(
+                raw_data,
+                station_number,
+                _store_fields(store, station_number, year, fields),
+                True,
+            )
+            store.write(station_number, year, observations_df)
+            observations_df = observations_df[
+                ["stn", "datetime"] + _field_columns(fields, True)
+            ]
+            in_range = np.ones(len(observations_df.index), dtype=bool)
+            if start is not None:
+                in_range &= observations_df.datetime >= pd.Timestamp(start)
+            if end is not None:
+                in_range &= observations_df.datetime < pd.Timestamp(end)
+            return _mask_quality(
+                observations_df[in_range].reset_index(drop=True),
+                fields,
+                quality,
+                accepted_quality,
+            )
+        except Exception as e_mess:
+            _emit(
+                "error",
+                station_number=station_number,
+                year=year,
+                error=e_mess,
+            )
+            return e_mess
+
+    try:
+        _list_years(tasks, connection, cache, store, columns)
+        with ThreadPoolExecutor(max_workers=max_sessions) as executor:
+            return list(executor.map(lambda task: load(*task), tasks))
+    finally:
+        connection.close()
+
+
+def get_weather_data_bulk(
+    stations,
+    years,
+    max_sessions=4,
+    cache=None,
+    store=None,
+    scaled=False,
+    fields=None,
+    quality=False,
+    accepted_quality=None,
+):
+    """
+    Loads and cleans weather data for several NOAA station IDs and years.
+
+    The station-year files are downloaded concurrently over at most
+    `max_sessions` FTP sessions which are kept logged in and reused for all
+    downloads. Files that cannot be retrieved or decoded are reported in the
+    returned errors instead of interrupting the other downloads.
+
+    Parameters
+    ----------
+    stations : list of str
+        NOAA station numbers, see `get_weather_data`.
+    years : list of int
+        Years for which weather data should be returned.
+    max_sessions : int, optional
+        Maximum number of concurrent FTP sessions, by default 4.
+    cache : DownloadCache, optional
+        Local cache to serve the station-year files from, by default the
+        files are always downloaded.
+    store : ParquetStore, optional
+        Local store of parsed observations, see `get_weather_data`.
+    scaled : bool, optional
+        Whether to return the measurements as nullable int16 values, see
+        `get_weather_data`.
+    fields : list of str, optional
+        Fields to extract, see `get_weather_data`.
+    quality : bool, optional
+        Whether to add the quality code columns, see `get_weather_data`.
+    accepted_quality : list of str, optional
+        ISD quality codes of the values to keep, see `get_weather_data`.
+    Returns
+    -------
+    observations_df : pandas.DataFrame
+        A dataframe that contains the time series of weather station
+        observations of all station-years that were loaded.
+    errors_df : pandas.DataFrame
+        A dataframe with the station number (`stn`), `year` and `error`
+        message of every station-year that could not be loaded.
+    Examples
+    --------
+    >>> weather_df, errors_df = get_weather_data_bulk(
+    ...     ['911650-22536', '010015-99999'], [2019, 2020]
+    ... )
+    """
+
+    tasks = _station_year_tasks(stations, years, max_sessions)
+    results = [
+        res
+        if isinstance(res, pd.DataFrame)
+        else (stn, year, str(res) or repr(res))
+        for (stn, year), res in zip(
+            tasks,
+            _load_station_years(
+                tasks,
+                max_sessions,
+                cache,
+                store,
+                fields,
+                quality,
+                accepted_quality,
+            ),
+        )
+    ]
+
+    # Share the station categories so that concatenation keeps them
+    categories = list(dict.fromkeys(stations))
+    frames = [
+        res.assign(stn=res.stn.cat.set_categories(categories))
+        for res in results
+        if isinstance(res, pd.DataFrame)
+    ]
+    errors = [res for res in results if not isinstance(res, pd.DataFrame)]
+    observations_df = (
+        pd.concat(frames, ignore_index=True)
+        if frames
+        else _parse_isd(b"", "", fields, quality).assign(
+            stn=pd.Categorical([], categories=categories)
+        )
+    )
+    if scaled:
+        observations_df = _to_scaled(observations_df)
+    errors_df = pd.DataFrame(errors, columns=["stn", "year", "error"])
+    return observations_df, errors_df
+
+
+def get_weather_range(
+    station_number,
+    start,
+    end,
+    max_sessions=4,
+    cache=None,
+    store=None,
+    scaled=False,
+    fields=None,
+    quality=False,
+    accepted_quality=None,
+):
+    """
+    Loads and cleans the weather data of a NOAA station ID over a date
+    range spanning any number of years.
+
+    The station-year files covering the range are downloaded concurrently,
+    and records outside the range are skipped before they are decoded.
+    Years without a file on the FTP site are left out.
+
+    Parameters
+    ----------
+    station_number : str
+        The NOAA station number, see `get_weather_data`.
+    start, end : str or datetime-like
+        Return the observations from `start` (inclusive) to `end`
+        (exclusive).
+    max_sessions : int, optional
+        Maximum number of concurrent FTP sessions, by default 4.
+    cache : DownloadCache, optional
+        Local cache to serve the station-year files from.
+    store : ParquetStore, optional
+        Local store of parsed observations, see `get_weather_data`.
+    scaled, fields, quality, accepted_quality
+        Selection of the returned columns and values, see
+        `get_weather_data`.
+    Returns
+    -------
+    pandas.DataFrame
+        A dataframe that contains the time series of weather station
+        observations over the range, sorted by time and without duplicate
+        records.
+    Examples
+    --------
+    >>> get_weather_range('911650-22536', '2015-03-01', '2021-07-01')
+    """
+
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    assert start < end, "Start of the range must be before its end"
+    _check_max_sessions(max_sessions)
+    years = range(start.year, (end - pd.Timedelta(1)).year + 1)
+    for year in years:
+        _check_station_year(station_number, year)
+
+    results = _load_station_years(
+        [(station_number, year) for year in years],
+        max_sessions,
+        cache,
+        store,
+        fields,
+        quality,
+        accepted_quality,
+        start,
+        end,
+    )
+    frames = []
+    for res in results:
+        if isinstance(res, pd.DataFrame):
+            frames.append(res)
+        elif not isinstance(res, error_perm):
+            raise res
+
+    if frames:
+        observations_df = _concat_observations(frames)
+    else:
+        observations_df = _parse_isd(b"", station_number, fields, quality)
+    observations_df = (
+        observations_df.drop_duplicates()
+        .sort_values("datetime", kind="stable")
+        .reset_index(drop=True)
+    )
+    return _to_scaled(observations_df) if scaled else observations_df
+
+
+class _AsyncFTP:
+    """
+    Minimal asyncio client of the FTP commands used to download files from
+    the NOAA FTP site.
+
+    Replies are checked like ftplib does: 4xx replies raise error_temp, 5xx
+    replies error_perm and other unexpected replies error_reply.
+    """
+
+    def __init__(self, reader, writer, timeout):
+        self._reader = reader
+        self._writer = writer
+        self._timeout = timeout
+
+    @classmethod
+    async def connect(cls, address, ftp_dir, timeout=60):
+        """Opens an anonymous session on (host, port) in `ftp_dir`."""
+        with _timed("connect"):
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(*address), timeout
+            )
+            session = cls(reader, writer, timeout)
+            try:
+                await session._response()
+                if (await session.command("USER anonymous"))[0] == "3":
+                    await session.command("PASS anonymous@")
+            except BaseException:
+                session.close()
+                raise
+        try:
+            await session.command("CWD " + ftp_dir)
+        except BaseException:
+            session.close()
+            raise
+        return session
+
+    async def _response(self):
+        lines = []
+        while True:
+            line = await asyncio.wait_for(
+                self._reader.readline(), self._timeout
+            )
+            if not line:
+                raise EOFError("Connection closed by the FTP server")
+            lines.append(line.decode("latin-1").rstrip("\r\n"))
+            # Multi-line replies end with the reply code followed by a space
+            if lines[-1][3:4] != "-" and lines[-1][:3] == lines[0][:3]:
+                break
+        response = "\n".join(lines)
+        if response[0] == "4":
+            raise error_temp(response)
+        if response[0] == "5":
+            raise error_perm(response)
+        if response[0] not in "123":
+            raise error_reply(response)
+        return response
+
+    async def command(self, cmd):
+        """Sends a command and returns its reply."""
+        self._writer.write((cmd + "\r\n").encode("latin-1"))
+        await self._writer.drain()
+        return await self._response()
+
+    async def cwd(self, ftp_dir):
+        """Changes the working directory."""
+        await self.command("CWD " + ftp_dir)
+
+    async def stat(self, filename):
+        """Returns the size and modification time of a file."""
+        await self.command("TYPE I")
+        size = int((await self.command("SIZE " + filename))[3:].strip())
+        modified = (await self.command("MDTM " + filename)).split()[-1]
+        mtime = calendar.timegm(time.strptime(modified[:14], "%Y%m%d%H%M%S"))
+        return size, mtime
+
+    async def retrieve(self, filename, data):
+        """
+        Downloads a file from the working directory, appending it to the
+        bytearray `data`. Bytes already in `data` are not downloaded again.
+        """
+        tic = time.perf_counter()
+        offset = len(data)
+        await self.command("TYPE I")
+        # Like ftplib, connect to the host of the control connection rather
+        # than the address in the PASV reply
+        _, port = parse227(await self.command("PASV"))
+        host = self._writer.get_extra_info("peername")[0]
+        data_reader, data_writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), self._timeout
+        )
+        try:
+            if offset:
+                await self.command("REST %d" % offset)
+            response = await self.command("RETR " + filename)
+            if response[0] != "1":
+                raise error_reply(response)
+            while True:
+                block = await asyncio.wait_for(
+                    data_reader.read(2 ** 16), self._timeout
+                )
+                if not block:
+                    break
+                data += block
+        finally:
+            data_writer.close()
+        response = await self._response()
+        if response[0] != "2":
+            raise error_reply(response)
+        _emit(
+            "transfer",
+            seconds=time.perf_counter() - tic,
+            bytes=len(data) - offset,
+            filename=filename,
+        )
+
+    async def quit(self):
+        """Logs out and closes the session."""
+        try:
+            await self.command("QUIT")
+        finally:
+            self.close()
+
+    def close(self):
+        """Closes the session without logging out."""
+        self._writer.close()
+
+
+class _AsyncSessionPool:
     """
-    Downloads and cleans the data of all stations available at
-    ftp://ftp.ncei.noaa.gov/pub/data/noaa/.
+    Idle asynchronous sessions on the FTP server of the transport grouped by
+    year directory, see `_Connection`, with at most `max_sessions` sessions
+    open at the same time.
+
+    Transports other than FTP have no asyncio client, their transfers run
+    in threads on the blocking `connection`.
+    """
+
+    def __init__(self, max_sessions, timeout=60):
+        self._slots = asyncio.Semaphore(max_sessions)
+        self._timeout = timeout
+        self._idle = {}
+        self._transport = _get_transport()
+        self.connection = None
+        if not isinstance(self._transport, FTPTransport):
+            self.connection = self._transport.connect()
+
+    @contextlib.asynccontextmanager
+    async def session(self, year):
+        """Yields a session in the directory of `year`."""
+        async with self._slots:
+            session, cwd = None, None
+            for idle_cwd in [year] + list(self._idle):
+                if self._idle.get(idle_cwd):
+                    session, cwd = self._idle[idle_cwd].pop(), idle_cwd
+                    break
+            try:
+                if session is None:
+                    session = await _AsyncFTP.connect(
+                        self._transport._address(),
+                        self._transport._path(str(year)),
+                        self._timeout,
+                    )
+                    cwd = year
+                elif cwd != year:
+                    await session.cwd(self._transport._path(str(year)))
+                    cwd = year
+                yield session
+            except error_perm:
+                # Missing files and directories leave the session usable
+                if session is not None:
+                    self._idle.setdefault(cwd, []).append(session)
+                raise
+            except BaseException:
+                if session is not None:
+                    session.close()
+                raise
+            else:
+                self._idle.setdefault(cwd, []).append(session)
+
+    async def close(self):
+        """Logs out of all idle sessions."""
+        if self.connection is not None:
+            self.connection.close()
+        sessions = [ftp for idle in self._idle.values() for ftp in idle]
+        self._idle.clear()
+        for session in sessions:
+            try:
+                await session.quit()
+            except Exception:
+                pass
+
+
+async def _afetch_weather_file(year, filename, pool, cache, retries, backoff):
+    """
+    Returns a station-year file from the cache or the FTP site, retrying
+    transient errors with jittered exponential backoff and resuming
+    interrupted transfers.
+    """
+    loop = asyncio.get_running_loop()
+    if cache is not None and cache.cached(year, filename):
+        return await loop.run_in_executor(None, cache.fetch, year, filename)
+    _check_available(year, filename)
+    if pool.connection is not None:
+        return await loop.run_in_executor(
+            None, _fetch_weather_file, year, filename, cache, pool.connection
+        )
+
+    data = bytearray()
+    for attempt in range(retries + 1):
+        try:
+            async with pool.session(year) as session:
+                mtime = None
+                if cache is not None and year >= time.gmtime().tm_year:
+                    size, mtime = await session.stat(filename)
+                    path = cache.path(year, filename)
+                    if cache._is_current(path, size, mtime):
+                        return await loop.run_in_executor(
+                            None, cache._read, path
+                        )
+                await session.retrieve(filename, data)
+            break
+        except _TRANSIENT_ERRORS:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(_retry_delay(backoff, attempt))
+    compressed_data = bytes(data)
+
+    if cache is not None:
+
+        def save():
+            cache._write(cache.path(year, filename), compressed_data, mtime)
+            cache._evict_if_full()
+
+        await loop.run_in_executor(None, save)
+    return compressed_data
+
+
+def _parse_compressed(
+    compressed_data, station_number, fields, quality, accepted_quality, scaled
+):
+    """Decompresses and parses a station-year file in a worker process."""
+    observations_df = _parse_isd(
+        _gunzip(compressed_data),
+        station_number,
+        fields,
+        quality,
+        accepted_quality,
+    )
+    return _to_scaled(observations_df) if scaled else observations_df
+
+
+async def _aload(
+    station_number, year, pool, executor, cache, retries, backoff, parse_args
+):
+    """Downloads and parses a station-year file."""
+    filename = station_number + "-" + str(year) + ".gz"
+    compressed_data = await _afetch_weather_file(
+        year, filename, pool, cache, retries, backoff
+    )
+    return await asyncio.get_running_loop().run_in_executor(
+        executor,
+        _parse_compressed,
+        compressed_data,
+        station_number,
+        *parse_args,
+    )
+
+
+async def fetch_weather_data(
+    station_number,
+    year,
+    cache=None,
+    scaled=False,
+    fields=None,
+    quality=False,
+    accepted_quality=None,
+    retries=3,
+    backoff=1.0,
+    timeout=60,
+    executor=None,
+):
+    """
+    Loads and cleans weather data for a given NOAA station ID and year
+    without blocking the event loop.
+
+    The file is downloaded with asyncio and decompressed and parsed in
+    `executor`.
 
     Parameters
     ----------
-    country : str, optional
-        Filters station information by country location that is represented by
-        two character country code("US") or "all" for every country, by default
-        "all".
+    station_number : str
+        The NOAA station number, see `get_weather_data`.
+    year : int
+        Year for which weather data should be returned.
+    cache : DownloadCache, optional
+        Local cache to serve the station-year file from.
+    scaled, fields, quality, accepted_quality
+        Selection of the returned columns and values, see
+        `get_weather_data`.
+    retries : int, optional
+        Number of times a download is attempted again after a network error
+        or a temporary FTP error, by default 3. Interrupted downloads resume
+        from the last byte received.
+    backoff : float, optional
+        Maximum delay in seconds before the first retry, doubled after every
+        attempt, by default 1.0. The delays are random.
+    timeout : float, optional
+        Timeout in seconds of the network operations, by default 60.
+    executor : concurrent.futures.Executor, optional
+        Executor to parse the file in, by default the default executor of
+        the event loop.
     Returns
     -------
     pandas.DataFrame
-        Data frame containing information of all stations.
+        A dataframe that contains a time series of weather station
+        observations, see `get_weather_data`.
+    Raises
+    ------
+    ftplib.error_perm
+        If the file does not exist on the FTP site.
     Examples
     --------
-    >>> get_stations_info(country="US")
+    >>> weather_df = await fetch_weather_data('911650-22536', 2020)
     """
 
-    if not isinstance(country, str):
-        raise Exception(
-            "Invalid country parameter. parameter should be a string"
-        )
-    elif country != "all" and len(country) != 2:
-        raise Exception(
-            "Invalid country parameter. parameter should be length 2"
+    _check_station_year(station_number, year)
+    pool = _AsyncSessionPool(1, timeout)
+    try:
+        return await _aload(
+            station_number,
+            year,
+            pool,
+            executor,
+            cache,
+            retries,
+            backoff,
+            (fields, quality, accepted_quality, scaled),
         )
+    finally:
+        await pool.close()
+
+
+async def aiter_weather_data(
+    stations,
+    years,
+    max_concurrency=16,
+    max_sessions=4,
+    cache=None,
+    scaled=False,
+    fields=None,
+    quality=False,
+    accepted_quality=None,
+    retries=3,
+    backoff=1.0,
+    timeout=60,
+    executor=None,
+):
+    """
+    Loads and cleans weather data for several NOAA station IDs and years
+    concurrently, yielding every station-year as soon as it is loaded.
+
+    At most `max_concurrency` station-years are in flight at the same time,
+    downloaded over at most `max_sessions` FTP sessions which are kept
+    logged in and reused. The CPU bound decompression and parsing runs in a
+    process pool so that it neither blocks the event loop nor the other
+    downloads.
+
+    Parameters
+    ----------
+    stations : list of str
+        NOAA station numbers, see `get_weather_data`.
+    years : list of int
+        Years for which weather data should be returned.
+    max_concurrency : int, optional
+        Maximum number of station-years loaded at the same time, by default
+        16.
+    max_sessions : int, optional
+        Maximum number of concurrent FTP sessions, by default 4.
+    cache : DownloadCache, optional
+        Local cache to serve the station-year files from.
+    scaled, fields, quality, accepted_quality
+        Selection of the returned columns and values, see
+        `get_weather_data`.
+    retries, backoff, timeout
+        Retries of failed downloads and network timeout, see
+        `fetch_weather_data`.
+    executor : concurrent.futures.Executor, optional
+        Executor to parse the files in, by default a process pool with one
+        process per CPU which is shut down with the iterator.
+    Yields
+    ------
+    tuple
+        The station number, the year and either the observations dataframe
+        or the exception raised while loading the station-year, in order of
+        completion.
+    Examples
+    --------
+    >>> async for stn, year, weather_df in aiter_weather_data(
+    ...     ['911650-22536', '010015-99999'], [2019, 2020]
+    ... ):
+    ...     if not isinstance(weather_df, Exception):
+    ...         process(weather_df)
+    """
 
-    # Get station info file from the ftp site
-    ftp_address = "ftp.ncei.noaa.gov"
-    ftp_dir = "pub/data/noaa/"
-    stn_history_file = "isd-history.txt"  # station information/history file.
-    columns = [
-        "usaf",
-        "wban",
-        "station_name",
-        "country",
-        "state",
-        "call",
-        "latitude",
-        "longitude",
-        "elevation",
-        "start",
-        "end",
+    assert type(max_concurrency) == int and max_concurrency > 0, (
+        "Maximum concurrency must be a positive integer"
+    )
+    tasks = _station_year_tasks(stations, years, max_sessions)
+    pending = iter(tasks)
+    results = asyncio.Queue(max_concurrency)
+    await asyncio.get_running_loop().run_in_executor(
+        None, _list_years, tasks, None, cache
+    )
+    pool = _AsyncSessionPool(max_sessions, timeout)
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor()
+    parse_args = (fields, quality, accepted_quality, scaled)
+
+    async def work():
+        for station_number, year in pending:
+            try:
+                result = await _aload(
+                    station_number,
+                    year,
+                    pool,
+                    executor,
+                    cache,
+                    retries,
+                    backoff,
+                    parse_args,
+                )
+            except Exception as e_mess:
+                result = e_mess
+            await results.put((station_number, year, result))
+
+    workers = [
+        asyncio.ensure_future(work())
+        for _ in range(min(max_concurrency, len(tasks)))
     ]
-    col_index = [0, 7, 13, 43, 48, 51, 57, 65, 74, 82, 91, 101]
-    skip_lines = 21
-
-    # connect, login and change working directory to /pub/data/noaa/
-    noaa_ftp = FTP(ftp_address)
-    noaa_ftp.login()
-    noaa_ftp.cwd(ftp_dir)
-
-    # save file and quit
-    with open(stn_history_file, "wb+") as stn_hist:
-        noaa_ftp.retrbinary("RETR " + stn_history_file, stn_hist.write)
-    noaa_ftp.quit()
-
-    # create data_dic from the file
-    data = [[] for i in range(len(col_index) - 1)]
-    with open(stn_history_file, mode="rt") as stn_hist:
-        for i, line in enumerate(stn_hist):
-            if i <= skip_lines:
-                continue
-            for i in range(len(col_index) - 1):
-                val = line[col_index[i]: col_index[i + 1]].strip()
-                if len(val) > 0:
-                    data[i].append(
-                        line[col_index[i]: col_index[i + 1]].strip()
-                    )
-                else:
-                    data[i].append(None)
+    try:
+        for _ in tasks:
+            yield await results.get()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await pool.close()
+        if own_executor:
+            executor.shutdown(wait=False)
 
-    os.remove("isd-history.txt")
-    data_dic = {columns[i]: data[i] for i in range(len(data))}
-    data_df = pd.DataFrame(data_dic)
 
-    # datatype conversion of the datetime column
-    data_df.start = pd.to_datetime(data_df.start)
-    data_df.end = pd.to_datetime(data_df.end)
+BackfillProgress = collections.namedtuple(
+    "BackfillProgress",
+    [
+        "done",
+        "total",
+        "errors",
+        "records",
+        "bytes",
+        "elapsed",
+        "stn",
+        "year",
+        "error",
+    ],
+)
+BackfillProgress.__doc__ = """
+Progress of a `backfill`, reported after every station-year.
 
-    # filter if the country parameter is valid
-    if country != "all":
-        data_df = data_df[data_df["country"] == country]
+Attributes
+----------
+done : int
+    Station-years processed so far, including failed ones.
+total : int
+    Station-years to process.
+errors : int
+    Station-years that could not be loaded.
+records : int
+    Observations written to the store.
+bytes : int
+    Compressed bytes parsed.
+elapsed : float
+    Seconds since the start of the backfill.
+stn, year : str, int
+    Station number and year of the station-year just processed.
+error : str
+    Error message of the station-year just processed, None if it was
+    loaded.
+"""
 
-    return data_df
 
+def _ingest(source, station_number, year, store, fields):
+    """
+    Decompresses and parses a station-year file and writes it to the store
+    in a worker process.
 
-def get_weather_data(station_number, year):
+    `source` is either the contents of the file or its path, in which case
+    it is read by the worker. Returns the number of observations and the
+    size of the file.
     """
-    Loads and cleans weather data for a given NOAA station ID and year.
-    Returns a dataframe containing a time series of air temperature (degrees
-    Celsius), atmospheric pressure (hectopascals), wind speed (m/s), and wind
-    direction (angular degrees). The raw data file is downloaded from the NOAA
-    FTP server at ftp://ftp.ncei.noaa.gov/pub/data/noaa/.
+    fields = _store_fields(store, station_number, year, fields)
+    with _raw_buffer(source) as raw_data:
+        observations_df = _parse_isd(raw_data, station_number, fields, True)
+    store.write(station_number, year, observations_df)
+    n_bytes = (
+        os.path.getsize(source) if isinstance(source, str) else len(source)
+    )
+    return len(observations_df.index), n_bytes
+
+
+def backfill(
+    stations,
+    years,
+    store,
+    source=None,
+    cache=None,
+    max_sessions=4,
+    workers=None,
+    fields=None,
+    progress=None,
+    skip=None,
+):
+    """
+    Loads many station-years into a local store using all CPU cores.
+
+    The stages run concurrently: up to `max_sessions` threads download the
+    station-year files while a pool of `workers` processes decompresses and
+    parses them and writes the observations to the store. Station-years
+    already in the store are skipped, so an interrupted backfill can be
+    resumed by running it again.
 
     Parameters
     ----------
-    station_number : str
-        NOAA station number.
-    year : int
-        Year for which weather data should be returned
-    Notes
-    -----
-        `station_number` is a combination of the USAF station ID and the NCDC
-        WBAN number in the form '<USAF ID>-<WBAN ID>'.  If a WBAN ID does not
-        exist, a value of '99999' should be used in its place.
-        Example with WBAN ID - '911650-22536'
-        Example without WBAN ID - '010015-99999'
-        Station numbers can be found in the dataframe returned by
-        `get_stations_info()` or through the NOAA's graphical tool at
-        https://gis.ncdc.noaa.gov/maps/ncei/cdo/hourly
+    stations : list of str
+        NOAA station numbers, see `get_weather_data`.
+    years : list of int
+        Years to load.
+    store : ParquetStore
+        Store to write the observations to, with the quality codes of every
+        field.
+    source : str, optional
+        Local directory with the station-year files laid out as on the FTP
+        site (`<year>/<station number>-<year>.gz`), by default the files are
+        downloaded from the NOAA FTP site.
+    cache : DownloadCache, optional
+        Local cache to serve the downloaded files from.
+    max_sessions : int, optional
+        Maximum number of concurrent FTP sessions, by default 4.
+    workers : int, optional
+        Number of parsing processes, by default the number of CPUs.
+    fields : list of str, optional
+        Fields to extract, see `get_weather_data`.
+    progress : callable, optional
+        Called with a `BackfillProgress` after every station-year.
+    skip : set of tuple, optional
+        (station number, year) of station-years not to load, e.g. those
+        loaded by a previous run or outside the period of a station.
     Returns
     -------
-    observations_df : pandas.DataFrame
+    pandas.DataFrame
+        A dataframe with the station number (`stn`), `year` and `error`
+        message of every station-year that could not be loaded.
+    Examples
+    --------
+    >>> store = ParquetStore("noaa_store")
+    >>> errors_df = backfill(
+    ...     ['911650-22536', '010015-99999'], range(2000, 2021), store,
+    ...     progress=lambda p: print(f"{p.done}/{p.total}", end="\\r"),
+    ... )
+    """
+
+    assert workers is None or (type(workers) == int and workers > 0), (
+        "Number of workers must be a positive integer"
+    )
+    columns = _field_columns(fields, True)
+    skip = set() if skip is None else skip
+    tasks = [
+        (stn, year)
+        for stn, year in _station_year_tasks(stations, years, max_sessions)
+        if (stn, year) not in skip
+        and not _stored(store, stn, year, columns)
+    ]
+    start = time.perf_counter()
+    errors = []
+    done, records, n_bytes = 0, 0, 0
+    connection = _get_transport().connect()
+    workers = workers or os.cpu_count() or 1
+    # Limit the downloaded files waiting to be parsed to a few per worker so
+    # that memory stays bounded when parsing is the bottleneck
+    waiting = threading.BoundedSemaphore(2 * workers)
+    with ProcessPoolExecutor(workers) as parsers:
+
+        def submit(station_number, year):
+            filename = station_number + "-" + str(year) + ".gz"
+            if source is not None:
+                compressed_data = os.path.join(source, str(year), filename)
+            else:
+                waiting.acquire()
+                try:
+                    compressed_data = _fetch_weather_file(
+                        year, filename, cache, connection
+                    )
+                except BaseException:
+                    waiting.release()
+                    raise
+            future = parsers.submit(
+                _ingest, compressed_data, station_number, year, store, fields
+            )
+            if source is None:
+                future.add_done_callback(lambda _: waiting.release())
+            return future
+
+        try:
+            if source is None:
+                _list_years(tasks, connection, cache)
+            with ThreadPoolExecutor(max_workers=max_sessions) as downloads:
+                futures = {
+                    downloads.submit(submit, *task): task for task in tasks
+                }
+                pending = set(futures)
+                while pending:
+                    finished, pending = wait(
+                        pending, return_when=FIRST_COMPLETED
+                    )
+                    for future in finished:
+                        task = futures.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e_mess:
+                            result = e_mess
+                        if isinstance(result, Future):
+                            # Downloaded, now wait for the parsing
+                            futures[result] = task
+                            pending.add(result)
+                            continue
+                        done += 1
+                        error = None
+                        if isinstance(result, Exception):
+                            error = str(result) or repr(result)
+                            errors.append((*task, error))
+                        else:
+                            records += result[0]
+                            n_bytes += result[1]
+                        if progress is not None:
+                            progress(
+                                BackfillProgress(
+                                    done,
+                                    len(tasks),
+                                    len(errors),
+                                    records,
+                                    n_bytes,
+                                    time.perf_counter() - start,
+                                    *task,
+                                    error,
+                                )
+                            )
+        finally:
+            connection.close()
+    return pd.DataFrame(errors, columns=["stn", "year", "error"])
+
+
+WeatherAggregates = collections.namedtuple(
+    "WeatherAggregates", ["daily", "monthly"]
+)
+WeatherAggregates.__doc__ = """
+Daily and monthly rollups of weather observations, returned by
+`aggregate_weather_data`.
+
+Attributes
+----------
+daily, monthly : pandas.DataFrame
+    One row per station (`stn`, when the observations have one) and day or
+    month (`datetime`, the start of the period), with the `<field>_mean`,
+    `<field>_min`, `<field>_max` and `<field>_count` of every field.
+"""
+
+
+def _rollup(grouped, fields):
+    """Flattens grouped sums, minima, maxima and counts into rollups."""
+    rollups = {}
+    for col in fields:
+        count = grouped[(col, "count")]
+        rollups[col + "_mean"] = (
+            grouped[(col, "sum")] / count.where(count > 0)
+        ).astype(np.float32)
+        rollups[col + "_min"] = grouped[(col, "min")].astype(np.float32)
+        rollups[col + "_max"] = grouped[(col, "max")].astype(np.float32)
+        rollups[col + "_count"] = count.astype(np.int32)
+    return pd.DataFrame(rollups, index=grouped.index).reset_index()
+
+
+def aggregate_weather_data(obs_df):
+    """
+    Computes the daily and monthly mean, minimum, maximum and number of
+    observations of every field of the weather observations.
+
+    All fields are aggregated by day in a single grouped pass, and the
+    monthly rollups are derived from the daily ones. The result can be
+    passed to `plot_weather_data` and `plot_weather_series` instead of the
+    observations, so that charts of several variables and time bases of
+    the same observations aggregate them only once.
+
+    Parameters
+    ----------
+    obs_df : pandas.DataFrame
         A dataframe that contains a time series of weather station
-        observations.
+        observations, as returned by `get_weather_data`.
+    Returns
+    -------
+    WeatherAggregates
+        The daily and monthly rollups.
     Examples
     --------
-    >>> get_weather_data('911650-22536', 2020)
+    >>> aggregates = aggregate_weather_data(obs_df)
+    >>> aggregates.monthly[["datetime", "air_temp_mean", "air_temp_max"]]
     """
 
-    assert type(year) == int, "Year must be entered as an integer"
-    assert (
-        type(station_number) == str
-    ), "Station number must be entered as a string"
-    assert re.match(
-        "^[A-z|0-9][0-9]{5}[-][0-9]{5}$", station_number
-    ), 'Station number must be entered in form "911650-22536".'
+    fields = [col for col in obs_df.columns if col in ISD_FIELDS]
+    keys = [obs_df.stn] if "stn" in obs_df else []
+    stats = ["sum", "min", "max", "count"]
+    daily = (
+        obs_df[fields]
+        .astype(np.float64)
+        .groupby(
+            keys + [obs_df.datetime.dt.floor("D")], observed=True, sort=True
+        )
+        .agg(stats)
+    )
+    months = daily.index.get_level_values("datetime").to_period("M")
+    levels = ["stn"] if keys else []
+    monthly = daily.groupby(
+        [daily.index.get_level_values(level) for level in levels]
+        + [months.to_timestamp().rename("datetime")],
+        observed=True,
+        sort=True,
+    ).agg(
+        {
+            (col, stat): "sum" if stat == "count" else stat
+            for col in fields
+            for stat in stats
+        }
+    )
+    return WeatherAggregates(_rollup(daily, fields), _rollup(monthly, fields))
 
-    # Generate filename based on selected station number and year and download
-    # data from NOAA FTP site.
-    filename = station_number + "-" + str(year) + ".gz"
 
-    compressed_data = io.BytesIO()
+# Steps of the panel grids, in nanoseconds, and their pandas frequency.
+_PANEL_STEPS = {
+    "hourly": (3600 * 10 ** 9, "h"),
+    "daily": (86400 * 10 ** 9, "D"),
+}
 
-    try:
-        noaa_ftp = FTP("ftp.ncei.noaa.gov")
-        noaa_ftp.login()  # Log in (no user name or password required)
-        noaa_ftp.cwd("pub/data/noaa/" + str(year) + "/")
-        noaa_ftp.retrbinary("RETR " + filename, compressed_data.write)
-    except error_perm as e_mess:
-        print("Error generated from NOAA FTP site: \n", e_mess)
-        noaa_ftp.quit()
-        return
 
-    noaa_ftp.quit()
+def build_weather_panel(
+    frames, stations, col_name, start, end, time_basis="hourly", path=None
+):
+    """
+    Aligns a variable of many stations on a common time grid.
+
+    The panel is preallocated as a float32 array with one column per
+    station, optionally memory-mapped to a file, and filled one frame at a
+    time: the observation times are snapped to the grid by integer division
+    and the observations falling in the same period are averaged. The
+    number of observations of every period is kept alongside, so that
+    frames sharing periods of a station update its means. Frames can
+    therefore be loaded lazily, e.g. by a generator or in chunks, without
+    holding the observations of all stations in memory.
 
-    # Unzip and process data line by line and extract variables of interest
-    # The raw data file format is described here:
-    # ftp://ftp.ncei.noaa.gov/pub/data/noaa/isd-format-document.pdf
-    compressed_data.seek(0)
-    stn_year_df = pd.DataFrame(
-        columns=[
-            "stn",
-            "datetime",
-            "air_temp",
-            "atm_press",
-            "wind_spd",
-            "wind_dir",
-        ]
+    Parameters
+    ----------
+    frames : iterable of pandas.DataFrame
+        Observations as returned by `get_weather_data` (not scaled), of one
+        or several of the `stations`. Frames of the same station, e.g. of
+        different years, are merged.
+    stations : list of str
+        NOAA station numbers of the panel columns.
+    col_name : str
+        Field to align, e.g. "air_temp".
+    start, end : str or datetime-like
+        First period (inclusive) and end (exclusive) of the grid.
+    time_basis : str, optional
+        Periods of the grid, "hourly" or "daily", by default "hourly".
+    path : str, optional
+        .npy file to memory-map the panel to, by default the panel is kept
+        in memory. The file can be reopened with `numpy.load`, its columns
+        are the `stations`.
+    Returns
+    -------
+    pandas.DataFrame
+        The mean of the variable per period (rows, `datetime` index) and
+        station (columns, `stn` index), NaN where a station has no valid
+        observation. The frame wraps the panel array without copying it.
+    Examples
+    --------
+    >>> stations = ['911650-22536', '722950-23174']
+    >>> build_weather_panel(
+    ...     (get_weather_data(stn, 2020) for stn in stations),
+    ...     stations, "air_temp", "2020-01-01", "2021-01-01",
+    ... )
+    """
+
+    assert time_basis in _PANEL_STEPS, (
+        "Time basis can only be hourly or daily"
     )
-    with gzip.open(compressed_data, mode="rt") as stn_data:
-        for i, line in enumerate(stn_data):
-            stn_year_df.loc[i, "datetime"] = pd.to_datetime(line[15:27])
-            stn_year_df.loc[i, "air_temp"] = float(line[87:92]) / 10
-            stn_year_df.loc[i, "atm_press"] = float(line[99:104]) / 10
-            stn_year_df.loc[i, "wind_spd"] = float(line[65:69]) / 10
-            stn_year_df.loc[i, "wind_dir"] = float(line[60:63])
+    assert col_name in ISD_FIELDS, "Unknown field " + str(col_name)
+    assert len(set(stations)) == len(stations), "Stations must be unique"
+    step, freq = _PANEL_STEPS[time_basis]
+    start = pd.Timestamp(start).floor(freq)
+    assert pd.Timestamp(end) > start, "End must be after the start"
+    n_periods = -((start.value - pd.Timestamp(end).value) // step)
+    columns = {stn: i for i, stn in enumerate(stations)}
+
+    # One contiguous column per station, which is also the layout of the
+    # dataframe blocks
+    shape = (n_periods, len(stations))
+    if path is None:
+        panel = np.empty(shape, dtype=np.float32, order="F")
+    else:
+        panel = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.float32, shape=shape, fortran_order=True
+        )
+    panel.fill(np.nan)
+    n_obs = np.zeros(shape, dtype=np.int32, order="F")
+
+    for obs_df in frames:
+        periods = (
+            obs_df.datetime.to_numpy("datetime64[ns]").view(np.int64)
+            - start.value
+        ) // step
+        values = obs_df[col_name].to_numpy(np.float32)
+        valid = (periods >= 0) & (periods < n_periods) & ~np.isnan(values)
+        codes, frame_stations = pd.factorize(obs_df.stn)
+        for code, stn in enumerate(frame_stations):
+            assert stn in columns, "Station " + stn + " is not in the panel"
+            rows = valid if len(frame_stations) == 1 else valid & (
+                codes == code
+            )
+            if not rows.any():
+                continue
+            first = periods[rows].min()
+            sums = np.bincount(periods[rows] - first, weights=values[rows])
+            counts = np.bincount(periods[rows] - first)
+            filled = np.flatnonzero(counts)
+            cells = (first + filled, columns[stn])
+            # Merge with the means of earlier frames of the station
+            previous = n_obs[cells]
+            total = previous + counts[filled]
+            earlier = np.where(
+                previous > 0, panel[cells].astype(np.float64) * previous, 0
+            )
+            panel[cells] = (earlier + sums[filled]) / total
+            n_obs[cells] = total
 
-    # Replace missing value indicators with NaNs
-    stn_year_df = stn_year_df.replace(
-        [999, 999.9, 9999.9], [np.nan, np.nan, np.nan]
+    if path is not None:
+        panel.flush()
+    return pd.DataFrame(
+        panel,
+        index=pd.date_range(
+            start, periods=n_periods, freq=freq, name="datetime"
+        ),
+        columns=pd.Index(stations, name="stn"),
+        copy=False,
     )
 
-    stn_year_df.loc[:, "stn"] = station_number
-    return stn_year_df
+
+# Axis and chart titles of the plotted variables.
+_VARIABLE_TITLES = {
+    "air_temp": "Air Temperature",
+    "atm_press": "Atmospheric Pressure",
+    "wind_spd": "Wind Speed",
+    "wind_dir": "Wind Direction",
+}
 
 
 def plot_weather_data(obs_df, col_name, time_basis):
@@ -196,9 +4073,11 @@ def plot_weather_data(obs_df, col_name, time_basis):
 
     Parameters
     ----------
-    obs_df : pandas.DataFrame
+    obs_df : pandas.DataFrame or WeatherAggregates
         A dataframe that contains a time series of weather station
-        observations.
+        observations, or its rollups returned by `aggregate_weather_data`
+        to plot several charts of the same observations without
+        aggregating them again.
     col_name : str
         Variables that users would like to plot on a timely basis,
         including 'air_temp', 'atm_press', 'wind_spd', 'wind_dir'
@@ -216,9 +4095,10 @@ def plot_weather_data(obs_df, col_name, time_basis):
     """
 
     # Test input types
-    assert (
-        type(obs_df) == pd.core.frame.DataFrame
-    ), "Weather data should be a Pandas DataFrame."
+    assert type(obs_df) in [
+        pd.core.frame.DataFrame,
+        WeatherAggregates,
+    ], "Weather data should be a Pandas DataFrame."
     assert type(col_name) == str, "Variable name must be entered as a string"
     assert type(time_basis) == str, "Time basis must be entered as a string"
     # Test edge cases
@@ -233,161 +4113,42 @@ def plot_weather_data(obs_df, col_name, time_basis):
         "daily",
     ], "Time basis can only be monthly or daily"
 
-    df = obs_df.dropna()
+    # Altair takes longer to import than the rest of the package, which
+    # only imports it when plotting
+    import altair as alt
+
+    if type(obs_df) == WeatherAggregates:
+        aggregates = obs_df
+    else:
+        aggregates = aggregate_weather_data(obs_df)
+    rollups = getattr(aggregates, time_basis)
+    assert (
+        rollups[col_name + "_count"].sum() > 2
+    ), "Dataset is not sufficient to visualize"  # Test edge cases
+    df = rollups.loc[
+        rollups[col_name + "_count"] > 0, ["datetime", col_name + "_mean"]
+    ].rename(columns={col_name + "_mean": col_name})
     assert (
         len(df.index) > 2
     ), "Dataset is not sufficient to visualize"  # Test edge cases
-    year = df.datetime.dt.year[0]
+    year = df.datetime.dt.year.iloc[0]
 
     if time_basis == "monthly":
-        df = df.set_index("datetime").resample("M").mean().reset_index()
-        assert (
-            len(df.index) > 2
-        ), "Dataset is not sufficient to visualize"  # Test edge cases
-
-        if col_name == "air_temp":
-            line = (
-                alt.Chart(df, title="Air Temperature for " + str(year))
-                .mark_line(color="orange")
-                .encode(
-                    alt.X(
-                        "month(datetime)",
-                        title="Month",
-                        axis=alt.Axis(labelAngle=-30),
-                    ),
-                    alt.Y(
-                        "air_temp",
-                        title="Air Temperature",
-                        scale=alt.Scale(zero=False),
-                    ),
-                    alt.Tooltip(col_name),
-                )
-            )
-        elif col_name == "atm_press":
-            line = (
-                alt.Chart(df, title="Atmospheric Pressure for " + str(year))
-                .mark_line(color="orange")
-                .encode(
-                    alt.X(
-                        "month(datetime)",
-                        title="Month",
-                        axis=alt.Axis(labelAngle=-30),
-                    ),
-                    alt.Y(
-                        "atm_press",
-                        title="Atmospheric Pressure",
-                        scale=alt.Scale(zero=False),
-                    ),
-                    alt.Tooltip(col_name),
-                )
-            )
-        elif col_name == "wind_spd":
-            line = (
-                alt.Chart(df, title="Wind Speed for " + str(year))
-                .mark_line(color="orange")
-                .encode(
-                    alt.X(
-                        "month(datetime)",
-                        title="Month",
-                        axis=alt.Axis(labelAngle=-30),
-                    ),
-                    alt.Y(
-                        "wind_spd",
-                        title="Wind Speed",
-                        scale=alt.Scale(zero=False),
-                    ),
-                    alt.Tooltip(col_name),
-                )
-            )
-        else:
-            line = (
-                alt.Chart(df, title="Wind Direction for " + str(year))
-                .mark_line(color="orange")
-                .encode(
-                    alt.X(
-                        "month(datetime)",
-                        title="Month",
-                        axis=alt.Axis(labelAngle=-30),
-                    ),
-                    alt.Y(
-                        "wind_dir",
-                        title="Wind Direction",
-                        scale=alt.Scale(zero=False),
-                    ),
-                    alt.Tooltip(col_name),
-                )
-            )
-
+        x = alt.X(
+            "month(datetime)", title="Month", axis=alt.Axis(labelAngle=-30)
+        )
     else:
-        df = df.set_index("datetime").resample("D").mean().reset_index()
-        assert (
-            len(df.index) > 2
-        ), "Dataset is not sufficient to visualize"  # Test edge cases
-
-        if col_name == "air_temp":
-            line = (
-                alt.Chart(df, title="Air Temperature for " + str(year))
-                .mark_line(color="orange")
-                .encode(
-                    alt.X(
-                        "datetime", title="Date", axis=alt.Axis(labelAngle=-30)
-                    ),
-                    alt.Y(
-                        "air_temp",
-                        title="Air Temperature",
-                        scale=alt.Scale(zero=False),
-                    ),
-                    alt.Tooltip(col_name),
-                )
-            )
-        elif col_name == "atm_press":
-            line = (
-                alt.Chart(df, title="Atmospheric Pressure for " + str(year))
-                .mark_line(color="orange")
-                .encode(
-                    alt.X(
-                        "datetime", title="Date", axis=alt.Axis(labelAngle=-30)
-                    ),
-                    alt.Y(
-                        "atm_press",
-                        title="Atmospheric Pressure",
-                        scale=alt.Scale(zero=False),
-                    ),
-                    alt.Tooltip(col_name),
-                )
-            )
-        elif col_name == "wind_spd":
-            line = (
-                alt.Chart(df, title="Wind Speed for " + str(year))
-                .mark_line(color="orange")
-                .encode(
-                    alt.X(
-                        "datetime", title="Date", axis=alt.Axis(labelAngle=-30)
-                    ),
-                    alt.Y(
-                        "wind_spd",
-                        title="Wind Speed",
-                        scale=alt.Scale(zero=False),
-                    ),
-                    alt.Tooltip(col_name),
-                )
-            )
-        else:
-            line = (
-                alt.Chart(df, title="Wind Direction for " + str(year))
-                .mark_line(color="orange")
-                .encode(
-                    alt.X(
-                        "datetime", title="Date", axis=alt.Axis(labelAngle=-30)
-                    ),
-                    alt.Y(
-                        "wind_dir",
-                        title="Wind Direction",
-                        scale=alt.Scale(zero=False),
-                    ),
-                    alt.Tooltip(col_name),
-                )
-            )
+        x = alt.X("datetime", title="Date", axis=alt.Axis(labelAngle=-30))
+    title = _VARIABLE_TITLES[col_name]
+    line = (
+        alt.Chart(df, title=title + " for " + str(year))
+        .mark_line(color="orange")
+        .encode(
+            x,
+            alt.Y(col_name, title=title, scale=alt.Scale(zero=False)),
+            alt.Tooltip(col_name),
+        )
+    )
 
     chart = (
         line.properties(width=500, height=350)
@@ -396,3 +4157,234 @@ def plot_weather_data(obs_df, col_name, time_basis):
     )
 
     return chart
+
+
+def _lttb(x, y, n_out):
+    """
+    Selects `n_out` points of a series with the Largest-Triangle-Three-
+    Buckets algorithm, which keeps the visual shape of a line chart.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        Coordinates of the points, sorted by `x`.
+    n_out : int
+        Number of points to keep.
+    Returns
+    -------
+    numpy.ndarray
+        Sorted indices of the kept points.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # The first and last points are always kept and the others are split in
+    # n_out - 2 buckets, each contributing the point forming the largest
+    # triangle with the previously kept point and the mean of the next
+    # bucket
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    for i in range(n_out - 2):
+        first, last = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[last:edges[i + 2]].mean()
+            next_y = y[last:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        prev_x, prev_y = x[kept[i]], y[kept[i]]
+        areas = np.abs(
+            (prev_x - next_x) * (y[first:last] - prev_y)
+            - (prev_x - x[first:last]) * (next_y - prev_y)
+        )
+        kept[i + 1] = first + np.argmax(areas)
+    return kept
+
+
+def _minmax(y, n_out):
+    """
+    Selects at most `n_out` points of a series by keeping the minimum and
+    maximum of `n_out // 2` buckets of consecutive points.
+
+    Parameters
+    ----------
+    y : numpy.ndarray
+        Values of the series.
+    n_out : int
+        Maximum number of points to keep.
+    Returns
+    -------
+    numpy.ndarray
+        Sorted indices of the kept points.
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    n_buckets = max(n_out // 2, 1)
+    buckets = np.arange(n) * n_buckets // n
+    order = np.lexsort((y, buckets))
+    firsts = np.searchsorted(buckets[order], np.arange(n_buckets))
+    lasts = np.r_[firsts[1:], n] - 1
+    return np.unique(np.r_[order[firsts], order[lasts]])
+
+
+def plot_weather_series(
+    obs_df,
+    variables=None,
+    time_basis=None,
+    max_points=1000,
+    downsample="lttb",
+    layout="facet",
+    data_url=None,
+):
+    """
+    Visualizes several weather variables of several stations over time.
+
+    Every series (station and variable) is downsampled to at most
+    `max_points` points before it is embedded in the chart, so that charts
+    of long periods and many stations stay small and quick to render.
+
+    Parameters
+    ----------
+    obs_df : pandas.DataFrame or WeatherAggregates
+        A dataframe that contains a time series of weather station
+        observations of one or more stations, or its rollups returned by
+        `aggregate_weather_data`.
+    variables : list of str, optional
+        Variables to plot, by default all the fields of `obs_df`.
+    time_basis : str, optional
+        Plot the 'daily' or 'monthly' means rather than the observations,
+        by default the observations are plotted.
+    max_points : int, optional
+        Maximum number of points of every series, by default 1000.
+    downsample : str, optional
+        Downsampling method, 'lttb' (Largest-Triangle-Three-Buckets, keeps
+        the shape of the series) or 'minmax' (keeps the extremes of equal
+        buckets of points), by default 'lttb'. None disables downsampling.
+    layout : str, optional
+        'facet' to plot every variable in its own row, with the stations in
+        different colors, or 'layer' to plot all series in one chart, by
+        default 'facet'.
+    data_url : str, optional
+        Path of a JSON file to write the chart data to. The chart then
+        references the data by this path instead of embedding it, and
+        should be rendered from the same location.
+    Returns
+    -------
+    altair.vegalite.v4.api.FacetChart or altair.vegalite.v4.api.Chart
+        The chart.
+    Examples
+    --------
+    >>> weather_df, _ = get_weather_data_bulk(
+    ...     ['911650-22536', '722950-23174'], [2019, 2020]
+    ... )
+    >>> plot_weather_series(weather_df, ["air_temp", "wind_spd"])
+    """
+
+    assert type(obs_df) in [
+        pd.core.frame.DataFrame,
+        WeatherAggregates,
+    ], "Weather data should be a Pandas DataFrame."
+    assert time_basis in [
+        None,
+        "monthly",
+        "daily",
+    ], "Time basis can only be monthly or daily"
+    assert downsample in [
+        None,
+        "lttb",
+        "minmax",
+    ], "Downsampling method can only be lttb or minmax"
+    assert layout in ["facet", "layer"], "Layout can only be facet or layer"
+    assert (
+        type(max_points) == int and max_points > 2
+    ), "Maximum number of points must be an integer larger than 2"
+
+    if time_basis is not None or type(obs_df) == WeatherAggregates:
+        if type(obs_df) != WeatherAggregates:
+            obs_df = aggregate_weather_data(obs_df)
+        rollups = getattr(obs_df, time_basis or "daily")
+        obs_df = rollups.rename(
+            columns={
+                col: col[: -len("_mean")]
+                for col in rollups.columns
+                if col.endswith("_mean")
+            }
+        )
+    if variables is None:
+        variables = [col for col in obs_df.columns if col in ISD_FIELDS]
+    missing = set(variables) - set(obs_df.columns)
+    assert not missing, "Variables not in the data: " + ", ".join(missing)
+
+    series = []
+    groups = (
+        obs_df.groupby("stn", observed=True, sort=False)
+        if "stn" in obs_df
+        else [("", obs_df)]
+    )
+    for stn, stn_df in groups:
+        stn_df = stn_df.sort_values("datetime", kind="stable")
+        times = stn_df.datetime.to_numpy()
+        for col in variables:
+            values = stn_df[col].to_numpy(np.float64)
+            valid = np.flatnonzero(~np.isnan(values))
+            if downsample == "lttb":
+                kept = valid[
+                    _lttb(
+                        (times[valid] - times[0]) / np.timedelta64(1, "s"),
+                        values[valid],
+                        max_points,
+                    )
+                ]
+            elif downsample == "minmax":
+                kept = valid[_minmax(values[valid], max_points)]
+            else:
+                kept = valid
+            series.append(
+                pd.DataFrame(
+                    {
+                        "stn": stn,
+                        "datetime": times[kept],
+                        "variable": col,
+                        "value": values[kept].astype(np.float32),
+                    }
+                )
+            )
+    long_df = pd.concat(series, ignore_index=True)
+
+    import altair as alt
+
+    if data_url is None:
+        data = long_df
+    else:
+        long_df.to_json(data_url, orient="records", date_format="iso")
+        data = alt.UrlData(
+            url=data_url,
+            format=alt.DataFormat(type="json", parse={"datetime": "date"}),
+        )
+
+    x = alt.X("datetime:T", title="Date", axis=alt.Axis(labelAngle=-30))
+    y = alt.Y("value:Q", title=None, scale=alt.Scale(zero=False))
+    tooltip = ["stn:N", "variable:N", "datetime:T", "value:Q"]
+    if layout == "facet":
+        return (
+            alt.Chart(data)
+            .mark_line()
+            .encode(x, y, alt.Color("stn:N", title="Station"), tooltip=tooltip)
+            .properties(width=500, height=150)
+            .facet(row=alt.Row("variable:N", title=None))
+            .resolve_scale(y="independent")
+        )
+    return (
+        alt.Chart(data)
+        .mark_line()
+        .encode(
+            x,
+            y,
+            alt.Color("variable:N", title="Variable"),
+            alt.StrokeDash("stn:N", title="Station"),
+            detail=["stn:N", "variable:N"],
+            tooltip=tooltip,
+        )
+        .properties(width=500, height=350)
+    )
@@ -0,0 +1,43 @@
+import functools
+import http.server
+import threading
+
+import pytest
+from noaastn import noaastn
+
+from .ftp_server import FakeFTPServer
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    """
+    Keeps the station snapshot and the inventories out of the user's cache
+    directory.
+    """
+    monkeypatch.setattr(noaastn, "_SNAPSHOT_DIR", str(tmp_path / "snapshot"))
+    monkeypatch.setattr(noaastn, "_inventories", {})
+    return tmp_path / "snapshot"
+
+
+@pytest.fixture
+def ftp_server(tmp_path, monkeypatch):
+    """Local FTP server standing in for ftp.ncei.noaa.gov."""
+    with FakeFTPServer(tmp_path / "ftp") as server:
+        monkeypatch.setattr(noaastn, "_FTP_ADDRESS", "127.0.0.1")
+        monkeypatch.setattr(noaastn, "_FTP_PORT", server.port)
+        noaastn._station_table.cache_clear()
+        yield server
+        noaastn._station_table.cache_clear()
+
+
+@pytest.fixture
+def http_server(ftp_server):
+    """Local HTTP server serving the files of the FTP server."""
+    handler = functools.partial(
+        http.server.SimpleHTTPRequestHandler, directory=ftp_server.root
+    )
+    handler.func.log_message = lambda *args: None
+    with http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler) as server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield server
+        server.shutdown()
@@ -0,0 +1,192 @@
+"""Minimal local stand-in for the NOAA FTP server used by offline tests."""
+import os
+import socket
+import socketserver
+import threading
+import time
+
+
+class _FTPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.cwd = "/"
+        self.rest = 0
+        self.data_sock = None
+        self.server.sessions += 1
+        self.reply("220 noaastn test server")
+        for line in self.rfile:
+            cmd, _, arg = line.decode().rstrip("\r\n").partition(" ")
+            cmd = cmd.upper()
+            self.server.commands.append((cmd, arg))
+            method = getattr(self, "ftp_" + cmd.lower(), None)
+            if method is None:
+                self.reply("502 Command not implemented")
+            elif method(arg) is False:
+                break
+
+    def reply(self, message):
+        self.wfile.write((message + "\r\n").encode())
+
+    def resolve(self, arg):
+        path = os.path.normpath(os.path.join(self.cwd, arg)).lstrip("/")
+        return os.path.join(self.server.root, path)
+
+    def transfer(self, data):
+        self.reply("150 Opening BINARY mode data connection")
+        conn, _ = self.data_sock.accept()
+        self.data_sock.close()
+        self.data_sock = None
+        with conn:
+            conn.sendall(data)
+        self.reply("226 Transfer complete")
+
+    def ftp_user(self, arg):
+        self.reply("230 Login successful")
+
+    def ftp_pass(self, arg):
+        self.reply("230 Login successful")
+
+    def ftp_type(self, arg):
+        self.reply("200 Type set")
+
+    def ftp_noop(self, arg):
+        self.reply("200 NOOP ok")
+
+    def ftp_quit(self, arg):
+        self.reply("221 Goodbye")
+        return False
+
+    def ftp_cwd(self, arg):
+        if os.path.isdir(self.resolve(arg)):
+            self.cwd = os.path.normpath(os.path.join(self.cwd, arg))
+            self.reply("250 Directory changed")
+        else:
+            self.reply("550 Failed to change directory")
+
+    def ftp_pasv(self, arg):
+        self.data_sock = socket.socket()
+        self.data_sock.bind(("127.0.0.1", 0))
+        self.data_sock.listen(1)
+        port = self.data_sock.getsockname()[1]
+        self.reply(
+            "227 Entering Passive Mode (127,0,0,1,%d,%d)"
+            % (port // 256, port % 256)
+        )
+
+    def ftp_rest(self, arg):
+        self.rest = int(arg)
+        self.reply("350 Restart position accepted")
+
+    def ftp_size(self, arg):
+        path = self.resolve(arg)
+        if os.path.isfile(path):
+            self.reply("213 %d" % os.path.getsize(path))
+        else:
+            self.reply("550 Could not get file size")
+
+    def ftp_mdtm(self, arg):
+        path = self.resolve(arg)
+        if os.path.isfile(path):
+            mtime = time.gmtime(os.path.getmtime(path))
+            self.reply(time.strftime("213 %Y%m%d%H%M%S", mtime))
+        else:
+            self.reply("550 Could not get file modification time")
+
+    def ftp_retr(self, arg):
+        path = self.resolve(arg)
+        if not os.path.isfile(path):
+            self.reply("550 Failed to open file")
+            return
+        if self.server.drop_transfers:
+            # Simulate a dropped connection
+            self.server.drop_transfers -= 1
+            return False
+        with open(path, "rb") as f:
+            f.seek(self.rest)
+            data = f.read()
+        self.rest = 0
+        if self.server.truncate_transfers:
+            # Simulate a connection dropped in the middle of the transfer
+            self.server.truncate_transfers -= 1
+            self.reply("150 Opening BINARY mode data connection")
+            conn, _ = self.data_sock.accept()
+            self.data_sock.close()
+            self.data_sock = None
+            with conn:
+                conn.sendall(data[: len(data) // 2])
+            return False
+        self.server.retrieved.append(arg)
+        self.transfer(data)
+
+    def ftp_nlst(self, arg):
+        path = self.resolve(arg)
+        names = sorted(os.listdir(path)) if os.path.isdir(path) else []
+        self.transfer("".join(name + "\r\n" for name in names).encode())
+
+    def ftp_list(self, arg):
+        path = self.resolve(arg)
+        if not os.path.isdir(path):
+            self.reply("550 No such directory")
+            return
+        lines = []
+        for name in sorted(os.listdir(path)):
+            full_path = os.path.join(path, name)
+            stat = os.stat(full_path)
+            if self.server.dos_listing:
+                when = time.strftime(
+                    "%m-%d-%y  %I:%M%p", time.gmtime(stat.st_mtime)
+                )
+                size = "<DIR>" if os.path.isdir(full_path) else stat.st_size
+                lines.append("%s %20s %s\r\n" % (when, size, name))
+                continue
+            mode = "drwxr-xr-x" if os.path.isdir(full_path) else "-rw-r--r--"
+            when = time.strftime("%b %d %H:%M", time.gmtime(stat.st_mtime))
+            lines.append(
+                "%s 1 ftp ftp %12d %s %s\r\n"
+                % (mode, stat.st_size, when, name)
+            )
+        self.transfer("".join(lines).encode())
+
+
+class FakeFTPServer(socketserver.ThreadingTCPServer):
+    """
+    FTP server serving the files below `root` on a local port.
+
+    The commands received and the files retrieved are recorded in
+    `commands` and `retrieved`, and `sessions` counts the connections. The
+    next `drop_transfers` retrievals close the connection without a reply,
+    and the next `truncate_transfers` ones after sending half of the file.
+    Directories are listed in the DOS format of IIS when `dos_listing` is
+    set.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, root):
+        super().__init__(("127.0.0.1", 0), _FTPHandler)
+        self.root = str(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.commands = []
+        self.retrieved = []
+        self.sessions = 0
+        self.drop_transfers = 0
+        self.truncate_transfers = 0
+        self.dos_listing = False
+        self.port = self.server_address[1]
+
+    def add_file(self, path, data, mtime=None):
+        """Writes `data` to `path` below the server root."""
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(full_path, (mtime, mtime))
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
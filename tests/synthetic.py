@@ -0,0 +1,154 @@
+"""Synthetic ISD records used by the offline tests and the benchmarks."""
+import datetime
+import gzip
+
+import numpy as np
+
+
+def make_isd_record(
+    usaf="911803",
+    wban="99999",
+    when=datetime.datetime(2015, 1, 1),
+    wind_dir=180,
+    wind_spd=52,
+    ceiling=22000,
+    visibility=16093,
+    air_temp=123,
+    dew_point=45,
+    atm_press=10132,
+    additional="",
+):
+    """
+    Builds a single ISD record with the given (unscaled) field values.
+
+    Parameters
+    ----------
+    usaf, wban : str
+        Station identifiers.
+    when : datetime.datetime
+        Observation date and time.
+    wind_dir, wind_spd, ceiling, visibility, air_temp, dew_point, atm_press
+        : int
+        Raw field values in ISD units, e.g. tenths of degrees Celsius.
+    additional : str, optional
+        Additional data section without the leading "ADD" tag.
+    Returns
+    -------
+    str
+        The record without its trailing newline.
+    """
+    mandatory = (
+        f"{usaf}{wban}{when:%Y%m%d%H%M}4"
+        f"{49250:+06d}{-123100:+07d}FM-15{70:+05d}99999V020"
+        f"{wind_dir:03d}1N{wind_spd:04d}1"
+        f"{ceiling:05d}1CN{visibility:06d}1N9"
+        f"{air_temp:+05d}1{dew_point:+05d}1{atm_press:05d}1"
+    )
+    variable = "ADD" + additional if additional else ""
+    return f"{len(variable):04d}" + mandatory + variable
+
+
+def make_isd_file(
+    n_lines, year=2015, usaf="911803", wban="99999", seed=0, compress=True
+):
+    """
+    Builds an ISD file of hourly records with random field values.
+
+    Parameters
+    ----------
+    n_lines : int
+        Number of records.
+    year : int, optional
+        Year of the first record, by default 2015.
+    usaf, wban : str, optional
+        Station identifiers.
+    seed : int, optional
+        Seed of the random field values, by default 0.
+    compress : bool, optional
+        Whether to gzip the file contents, by default True.
+    Returns
+    -------
+    bytes
+        Contents of the file.
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime(year, 1, 1)
+    lines = []
+    for i in range(n_lines):
+        lines.append(
+            make_isd_record(
+                usaf=usaf,
+                wban=wban,
+                when=start + datetime.timedelta(hours=i),
+                wind_dir=int(rng.choice([rng.integers(0, 361), 999])),
+                wind_spd=int(rng.choice([rng.integers(0, 300), 9999])),
+                air_temp=int(rng.choice([rng.integers(-400, 400), 9999])),
+                atm_press=int(
+                    rng.choice([rng.integers(9500, 10500), 99999])
+                ),
+                additional="AA101000123",
+            )
+        )
+    raw_data = ("\n".join(lines) + "\n").encode()
+    return gzip.compress(raw_data) if compress else raw_data
+
+
+def make_station_history(stations):
+    """
+    Builds a station information/history file (isd-history.txt).
+
+    Parameters
+    ----------
+    stations : list of tuple
+        (usaf, wban, station_name, country, state, call, latitude, longitude,
+        elevation, begin, end) of every station, with numbers as floats and
+        dates as "YYYYMMDD" strings. Blank values are given as "".
+    Returns
+    -------
+    bytes
+        Contents of the file.
+    """
+    lines = ["Integrated Surface Database Station History"] + [""] * 19
+    lines.append(
+        "USAF   WBAN  STATION NAME                  CTRY ST CALL  LAT     "
+        "LON      ELEV(M) BEGIN    END"
+    )
+    lines.append("")
+    for stn in stations:
+        usaf, wban, name, ctry, st, call, lat, lon, elev, begin, end = stn
+        lines.append(
+            "%-6s %-5s %-29.29s %-2s   %-2s %-5s %7s %8s %7s %-8s %-8s"
+            % (
+                usaf,
+                wban,
+                name,
+                ctry,
+                st,
+                call,
+                "" if lat == "" else "%+07.3f" % lat,
+                "" if lon == "" else "%+08.3f" % lon,
+                "" if elev == "" else "%+07.1f" % elev,
+                begin,
+                end,
+            )
+        )
+    return ("\n".join(lines) + "\n").encode()
+
+
+# A few stations of the station history file.
+STATIONS = [
+    ("007018", "99999", "WXPOD 7018", "", "", "", 0.0, 0.0, 7018.0,
+     "20110309", "20130730"),
+    ("010015", "99999", "BRINGELAND", "NO", "", "ENBL", 61.383, 5.867,
+     327.0, "19870117", "20081231"),
+    ("722020", "12839", "MIAMI INTERNATIONAL AIRPORT", "US", "FL", "KMIA",
+     25.791, -80.316, 8.8, "19730101", "20210316"),
+    ("722950", "23174", "LOS ANGELES INTERNATIONAL AIRPORT", "US", "CA",
+     "KLAX", 33.938, -118.389, 29.6, "19440101", "20210316"),
+    ("724940", "23234", "SAN FRANCISCO INTERNATIONAL AIRPORT", "US", "CA",
+     "KSFO", 37.620, -122.365, 2.4, "19450101", "20210316"),
+    ("911650", "22536", "LIHUE AIRPORT", "US", "HI", "PHLI", 21.984,
+     -159.341, 30.5, "19500101", "20210316"),
+    ("A00001", "00115", "GUADALUPE MOUNTAINS", "US", "TX", "", "", "",
+     "", "20060101", "20061231"),
+]
@@ -0,0 +1,65 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+station_number = "911803-99999"
+
+
+def make_weather_df(n_lines=24 * 70):
+    return noaastn._parse_isd(
+        gzip.decompress(make_isd_file(n_lines)), station_number
+    )
+
+
+def test_aggregate_weather_data():
+    weather_df = make_weather_df()
+    aggregates = noaastn.aggregate_weather_data(weather_df)
+
+    for rollups, freq in [(aggregates.daily, "D"), (aggregates.monthly, "MS")]:
+        assert (rollups.stn == station_number).all()
+        for col in noaastn.DEFAULT_FIELDS:
+            expected = (
+                weather_df.set_index("datetime")[col]
+                .astype(np.float64)
+                .resample(freq)
+                .agg(["mean", "min", "max", "count"])
+            )
+            expected = expected[expected["count"] > 0]
+            np.testing.assert_array_equal(rollups.datetime, expected.index)
+            np.testing.assert_allclose(
+                rollups[[col + "_" + stat for stat in expected.columns]],
+                expected,
+                rtol=1e-6,
+            )
+    assert len(aggregates.monthly.index) == 3
+    assert aggregates.monthly.air_temp_mean.dtype == np.float32
+    assert (
+        aggregates.monthly.air_temp_count.sum() == weather_df.air_temp.count()
+    )
+
+
+def test_plot_reflects_modified_frame():
+    weather_df = make_weather_df()
+    chart = noaastn.plot_weather_data(weather_df, "air_temp", "monthly")
+    weather_df["air_temp"] = weather_df.air_temp * 1.8 + 32
+    converted = noaastn.plot_weather_data(weather_df, "air_temp", "monthly")
+    np.testing.assert_allclose(
+        converted.data.air_temp, chart.data.air_temp * 1.8 + 32, rtol=1e-5
+    )
+
+
+def test_plot_precomputed_aggregates():
+    weather_df = make_weather_df()
+    aggregates = noaastn.aggregate_weather_data(weather_df)
+    for time_basis in ["monthly", "daily"]:
+        chart = noaastn.plot_weather_data(aggregates, "air_temp", time_basis)
+        assert chart.encoding.y.shorthand == "air_temp"
+        pd.testing.assert_frame_equal(
+            chart.data,
+            noaastn.plot_weather_data(weather_df, "air_temp", time_basis).data,
+        )
+    assert len(chart.data.index) == len(aggregates.daily.index)
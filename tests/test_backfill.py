@@ -0,0 +1,94 @@
+import os
+
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+pytest.importorskip("pyarrow.parquet")
+
+stations = ["911803-99999", "911650-22536"]
+years = [2014, 2015]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return noaastn.ParquetStore(str(tmp_path / "store"))
+
+
+def station_year_files():
+    return {
+        "%d/%s-%d.gz" % (year, stn, year): make_isd_file(
+            10 + i, year=year, usaf=stn[:6], wban=stn[7:], seed=year
+        )
+        for year in years
+        for i, stn in enumerate(stations)
+    }
+
+
+def test_backfill_downloads(ftp_server, store):
+    for path, data in station_year_files().items():
+        ftp_server.add_file("pub/data/noaa/" + path, data)
+    reports = []
+    errors_df = noaastn.backfill(
+        stations + ["722020-12839"],
+        years,
+        store,
+        max_sessions=2,
+        workers=2,
+        progress=reports.append,
+    )
+
+    assert sorted(errors_df.stn.unique()) == ["722020-12839"]
+    assert [report.done for report in reports] == list(range(1, 7))
+    assert reports[-1].total == 6
+    assert reports[-1].errors == 2
+    assert reports[-1].records == 2 * (10 + 11)
+    assert reports[-1].bytes == sum(map(len, station_year_files().values()))
+    for year in years:
+        for i, stn in enumerate(stations):
+            stored_df = store.read(stn, year)
+            assert len(stored_df.index) == 10 + i
+            assert "air_temp_quality" in stored_df
+    assert ftp_server.sessions <= 2, "Sessions should be reused"
+
+    # Stored station-years are skipped
+    retrieved = len(ftp_server.retrieved)
+    errors_df = noaastn.backfill(stations, years, store, workers=1)
+    assert errors_df.empty
+    assert len(ftp_server.retrieved) == retrieved
+
+
+def test_backfill_local_source(tmp_path, store):
+    source = tmp_path / "source"
+    for path, data in station_year_files().items():
+        os.makedirs(os.path.dirname(source / path), exist_ok=True)
+        (source / path).write_bytes(data)
+    (source / "2015" / "722020-12839-2015.gz").write_bytes(
+        make_isd_file(10)[:20]
+    )
+
+    errors_df = noaastn.backfill(
+        stations + ["722020-12839"],
+        [2015],
+        store,
+        source=str(source),
+        fields=["precip_depth"],
+    )
+    assert errors_df[["stn", "year"]].values.tolist() == [
+        ["722020-12839", 2015]
+    ]
+    stored_df = store.read(stations[1], 2015)
+    assert list(stored_df.columns) == [
+        "stn",
+        "datetime",
+        "precip_depth",
+        "precip_depth_quality",
+    ]
+    pd.testing.assert_frame_equal(
+        noaastn.get_weather_data(
+            stations[1], 2015, store=store, fields=["precip_depth"]
+        ),
+        stored_df[["stn", "datetime", "precip_depth"]],
+    )
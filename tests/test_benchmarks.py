@@ -0,0 +1,21 @@
+from benchmarks import suite
+
+
+def test_benchmark_suite_runs():
+    results = suite.run([240], repeat=1)
+    assert set(results) <= {"%s[240]" % name for name in suite.SCENARIOS}
+    assert "get_weather_data[240]" in results
+    for result in results.values():
+        assert result["seconds"] > 0
+        assert result["peak_bytes"] > 0
+
+
+def test_compare():
+    baseline = {"parse_isd[10]": {"seconds": 1.0, "peak_bytes": 100}}
+    results = {
+        "parse_isd[10]": {"seconds": 1.1, "peak_bytes": 200},
+        "new[10]": {"seconds": 5.0, "peak_bytes": 100},
+    }
+    assert suite.compare(results, baseline, 0.25) == [
+        ("parse_isd[10]", "peak_bytes", 2.0)
+    ]
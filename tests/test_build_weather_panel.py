@@ -0,0 +1,103 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+stations = ["911803-99999", "911650-22536", "722950-23174"]
+
+
+def station_frames(n_lines=60):
+    # Half-hourly observations of the first two stations
+    frames = []
+    for i, stn in enumerate(stations[:2]):
+        raw_data = gzip.decompress(
+            make_isd_file(n_lines, usaf=stn[:6], wban=stn[7:], seed=i)
+        )
+        obs_df = noaastn._parse_isd(raw_data, stn)
+        obs_df["datetime"] = obs_df.datetime[0] + (
+            obs_df.datetime - obs_df.datetime[0]
+        ) / 2 + pd.Timedelta(minutes=5)
+        frames.append(obs_df)
+    return frames
+
+
+def pivot(frames, freq):
+    # The concat and pivot that the panel replaces
+    obs_df = pd.concat(frames)
+    obs_df["datetime"] = obs_df.datetime.dt.floor(freq)
+    return obs_df.pivot_table(
+        index="datetime", columns="stn", values="air_temp", observed=True
+    )
+
+
+@pytest.mark.parametrize("time_basis,freq", [("hourly", "h"), ("daily", "D")])
+def test_build_weather_panel(time_basis, freq):
+    frames = station_frames()
+    panel_df = noaastn.build_weather_panel(
+        iter(frames),
+        stations,
+        "air_temp",
+        "2015-01-01",
+        "2015-01-03",
+        time_basis,
+    )
+
+    assert panel_df.dtypes.eq(np.float32).all()
+    assert panel_df.columns.tolist() == stations
+    assert panel_df.index[0] == pd.Timestamp("2015-01-01")
+    assert len(panel_df.index) == (48 if time_basis == "hourly" else 2)
+    assert panel_df[stations[2]].isna().all()
+    expected = pivot(frames, freq).reindex(panel_df.index)
+    np.testing.assert_allclose(
+        panel_df[stations[:2]].to_numpy(),
+        expected[stations[:2]].to_numpy(),
+        rtol=1e-6,
+    )
+
+
+def test_build_weather_panel_memmap(tmp_path):
+    frames = station_frames()
+    # A frame of several stations, partly outside the grid
+    panel_df = noaastn.build_weather_panel(
+        [pd.concat(frames, ignore_index=True)],
+        stations,
+        "air_temp",
+        "2015-01-01 10:00",
+        "2015-01-02",
+        path=str(tmp_path / "panel.npy"),
+    )
+    assert len(panel_df.index) == 14
+
+    panel = np.load(tmp_path / "panel.npy", mmap_mode="r")
+    np.testing.assert_array_equal(panel, panel_df.to_numpy())
+    assert np.shares_memory(panel_df.to_numpy(), panel_df[stations[0]])
+
+    with pytest.raises(AssertionError):
+        noaastn.build_weather_panel(
+            frames, stations[1:], "air_temp", "2015-01-01", "2015-01-02"
+        )
+
+
+@pytest.mark.parametrize("time_basis,freq", [("hourly", "h"), ("daily", "D")])
+def test_build_weather_panel_chunks(time_basis, freq):
+    # Chunks of a station-year sharing periods, as from iter_weather_data
+    obs_df = station_frames(24 * 5)[0]
+    chunks = [obs_df.iloc[i: i + 7] for i in range(0, len(obs_df.index), 7)]
+    panel_df = noaastn.build_weather_panel(
+        iter(chunks),
+        stations,
+        "air_temp",
+        "2015-01-01",
+        "2015-01-04",
+        time_basis,
+    )
+    expected = pivot([obs_df], freq).reindex(panel_df.index)
+    np.testing.assert_allclose(
+        panel_df[stations[0]].to_numpy(),
+        expected[stations[0]].to_numpy(),
+        rtol=1e-5,
+    )
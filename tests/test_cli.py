@@ -0,0 +1,81 @@
+import json
+
+import pytest
+from noaastn import cli, noaastn
+
+from .synthetic import STATIONS, make_isd_file, make_station_history
+
+pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.fixture
+def ftp_files(ftp_server):
+    ftp_server.add_file(
+        "pub/data/noaa/isd-history.txt", make_station_history(STATIONS)
+    )
+    # Stations of California, LAX without its 2011 file
+    for usaf, wban, year in [
+        ("724940", "23234", 2010),
+        ("724940", "23234", 2011),
+        ("722950", "23174", 2010),
+    ]:
+        ftp_server.add_file(
+            "pub/data/noaa/%d/%s-%s-%d.gz" % (year, usaf, wban, year),
+            make_isd_file(5, year=year, usaf=usaf, wban=wban),
+        )
+    return ftp_server
+
+
+def read_entries(path):
+    entries = []
+    with open(path) as manifest_file:
+        for line in manifest_file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                pass
+    return entries
+
+
+def test_cli_resumes(ftp_files, tmp_path, capsys):
+    store_dir = str(tmp_path / "store")
+    argv = ["--state", "CA", "--years", "2010", "2011", "--store", store_dir]
+    assert cli.main(argv + ["--workers", "1"]) == 1
+    manifest = read_entries(tmp_path / "store" / "manifest.jsonl")
+    assert sorted(
+        (entry["stn"], entry["year"], entry["error"] is None)
+        for entry in manifest
+    ) == [
+        ("722950-23174", 2010, True),
+        ("722950-23174", 2011, False),
+        ("724940-23234", 2010, True),
+        ("724940-23234", 2011, True),
+    ]
+    store = noaastn.ParquetStore(store_dir)
+    assert len(store.read("724940-23234", 2011).index) == 5
+    assert "4/4 station-years, 1 errors" in capsys.readouterr().err
+
+    # Only the failed station-year is tried again
+    retrieved = len(ftp_files.retrieved)
+    with open(tmp_path / "store" / "manifest.jsonl", "a") as manifest_file:
+        manifest_file.write('{"stn": "7229')
+    assert cli.main(argv + ["--workers", "1", "--quiet"]) == 1
+    assert len(ftp_files.retrieved) == retrieved
+    manifest = read_entries(tmp_path / "store" / "manifest.jsonl")[4:]
+    assert [(entry["stn"], entry["year"]) for entry in manifest] == [
+        ("722950-23174", 2011)
+    ]
+
+
+def test_select_stations(ftp_files):
+    stations_df = cli.select_stations(bbox=(20, -130, 35, -100))
+    assert stations_df.call.tolist() == ["KLAX"]
+
+    # Lihue reports from 1950 and the Guadalupe Mountains only in 2006
+    inactive = cli.inactive_station_years(
+        noaastn.get_stations_info(), [1949, 1950]
+    )
+    assert ("911650-22536", 1949) in inactive
+    assert ("911650-22536", 1950) not in inactive
+    assert ("722950-23174", 1949) not in inactive
+    assert ("A00001-00115", 1950) in inactive
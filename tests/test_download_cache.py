@@ -0,0 +1,111 @@
+import os
+import time
+
+import pytest
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+station_number = "911803-99999"
+
+
+def test_past_year_served_from_cache(ftp_server, tmp_path):
+    ftp_server.add_file(
+        "pub/data/noaa/2015/911803-99999-2015.gz", make_isd_file(24)
+    )
+    cache = noaastn.DownloadCache(tmp_path / "cache")
+
+    first = noaastn.get_weather_data(station_number, 2015, cache=cache)
+    sessions = ftp_server.sessions
+    second = noaastn.get_weather_data(station_number, 2015, cache=cache)
+
+    assert first.equals(second)
+    assert len(first.index) == 24
+    assert ftp_server.sessions == sessions == 1, "Cache hit should not connect"
+    assert os.path.exists(cache.path(2015, "911803-99999-2015.gz"))
+
+
+def test_current_year_revalidated(ftp_server, tmp_path):
+    year = time.gmtime().tm_year
+    filename = "%s-%d.gz" % (station_number, year)
+    ftp_server.add_file(
+        "pub/data/noaa/%d/%s" % (year, filename),
+        make_isd_file(5, year=year),
+        mtime=1600000000,
+    )
+    cache = noaastn.DownloadCache(tmp_path / "cache")
+
+    weather_df = noaastn.get_weather_data(station_number, year, cache=cache)
+    assert len(weather_df.index) == 5
+    noaastn.get_weather_data(station_number, year, cache=cache)
+    assert ftp_server.retrieved == [filename], "Unchanged file is not fetched"
+    assert ("MDTM", filename) in ftp_server.commands
+
+    ftp_server.add_file(
+        "pub/data/noaa/%d/%s" % (year, filename),
+        make_isd_file(8, year=year),
+        mtime=1600003600,
+    )
+    weather_df = noaastn.get_weather_data(station_number, year, cache=cache)
+    assert len(weather_df.index) == 8
+    assert ftp_server.retrieved == [filename, filename]
+
+
+def test_cache_eviction(ftp_server, tmp_path):
+    for year in [2013, 2014, 2015]:
+        ftp_server.add_file(
+            "pub/data/noaa/%d/%s-%d.gz" % (year, station_number, year),
+            make_isd_file(2000, year=year, seed=year),
+        )
+    cache = noaastn.DownloadCache(tmp_path / "cache")
+    size = len(cache.fetch(2013, station_number + "-2013.gz"))
+    cache.max_bytes = int(size * 2.5)
+
+    cache.fetch(2014, station_number + "-2014.gz")
+    os.utime(cache.path(2013, station_number + "-2013.gz"), (0, 0))
+    cache.fetch(2015, station_number + "-2015.gz")
+
+    assert not os.path.exists(cache.path(2013, station_number + "-2013.gz"))
+    assert os.path.exists(cache.path(2014, station_number + "-2014.gz"))
+    assert os.path.exists(cache.path(2015, station_number + "-2015.gz"))
+
+
+def test_missing_file_not_cached(ftp_server, tmp_path, capsys):
+    cache = noaastn.DownloadCache(tmp_path / "cache")
+    assert noaastn.get_weather_data("999999-99999", 1750, cache=cache) is None
+    assert "Error generated from NOAA FTP site" in capsys.readouterr().out
+    assert not os.path.exists(cache.path(1750, "999999-99999-1750.gz"))
+
+
+def test_cache_scanned_once(ftp_server, tmp_path, monkeypatch):
+    for year in range(2000, 2010):
+        ftp_server.add_file(
+            "pub/data/noaa/%d/%s-%d.gz" % (year, station_number, year),
+            make_isd_file(24, year=year),
+        )
+    scans = []
+    walk = os.walk
+    monkeypatch.setattr(
+        os, "walk", lambda top: scans.append(top) or walk(top)
+    )
+    cache = noaastn.DownloadCache(tmp_path / "cache")
+    for year in range(2000, 2010):
+        cache.fetch(year, "%s-%d.gz" % (station_number, year))
+    assert len(scans) == 1
+    assert cache._total == sum(
+        os.path.getsize(cache.path(year, "%s-%d.gz" % (station_number, year)))
+        for year in range(2000, 2010)
+    )
+
+
+def test_failed_write_leaves_no_temporary_file(tmp_path, monkeypatch):
+    cache = noaastn.DownloadCache(tmp_path / "cache")
+    path = cache.path(2015, station_number + "-2015.gz")
+
+    def fail(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        cache._write(path, b"data")
+    assert os.listdir(os.path.dirname(path)) == []
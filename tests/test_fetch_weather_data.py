@@ -0,0 +1,136 @@
+import asyncio
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from ftplib import error_perm
+
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+stations = ["911803-99999", "911650-22536"]
+years = [2014, 2015]
+
+
+def add_station_years(ftp_server):
+    for year in years:
+        for i, stn in enumerate(stations):
+            ftp_server.add_file(
+                "pub/data/noaa/%d/%s-%d.gz" % (year, stn, year),
+                make_isd_file(
+                    10 + i, year=year, usaf=stn[:6], wban=stn[7:], seed=year
+                ),
+            )
+
+
+def test_fetch_weather_data(ftp_server):
+    add_station_years(ftp_server)
+    weather_df = asyncio.run(noaastn.fetch_weather_data(stations[0], 2015))
+
+    expected_df = noaastn._parse_isd(
+        gzip.decompress(make_isd_file(10, year=2015, seed=2015)), stations[0]
+    )
+    pd.testing.assert_frame_equal(weather_df, expected_df)
+    assert ftp_server.commands.count(("QUIT", "")) == ftp_server.sessions
+
+    with pytest.raises(error_perm):
+        asyncio.run(noaastn.fetch_weather_data(stations[0], 2013))
+
+
+def test_fetch_weather_data_retries(ftp_server):
+    add_station_years(ftp_server)
+    ftp_server.drop_transfers = 2
+    weather_df = asyncio.run(
+        noaastn.fetch_weather_data(stations[0], 2015, backoff=0.01)
+    )
+    assert len(weather_df.index) == 10
+    assert ftp_server.sessions == 3
+
+    ftp_server.drop_transfers = 2
+    with pytest.raises(EOFError):
+        asyncio.run(
+            noaastn.fetch_weather_data(
+                stations[0], 2015, retries=1, backoff=0.01
+            )
+        )
+
+
+def test_fetch_weather_data_cache(ftp_server, tmp_path):
+    add_station_years(ftp_server)
+    cache = noaastn.DownloadCache(str(tmp_path / "cache"))
+    weather_df = asyncio.run(
+        noaastn.fetch_weather_data(stations[1], 2014, cache=cache)
+    )
+    assert cache.cached(2014, stations[1] + "-2014.gz")
+    sessions = ftp_server.sessions
+
+    cached_df = asyncio.run(
+        noaastn.fetch_weather_data(stations[1], 2014, cache=cache)
+    )
+    assert ftp_server.sessions == sessions
+    pd.testing.assert_frame_equal(cached_df, weather_df)
+
+
+async def collect(*args, **kwargs):
+    return [res async for res in noaastn.aiter_weather_data(*args, **kwargs)]
+
+
+def test_aiter_weather_data(ftp_server):
+    add_station_years(ftp_server)
+    results = asyncio.run(
+        collect(stations + ["722020-12839"], years, max_sessions=2)
+    )
+
+    assert len(results) == 6
+    loaded = {
+        (stn, year): len(res.index)
+        for stn, year, res in results
+        if isinstance(res, pd.DataFrame)
+    }
+    assert loaded == {
+        (stn, year): 10 + i for year in years for i, stn in enumerate(stations)
+    }
+    errors = [
+        (stn, year)
+        for stn, year, res in results
+        if isinstance(res, error_perm)
+    ]
+    assert sorted(errors) == [("722020-12839", 2014), ("722020-12839", 2015)]
+    assert ftp_server.sessions <= 2, "Sessions should be reused"
+    assert ftp_server.commands.count(("QUIT", "")) == ftp_server.sessions
+
+
+def test_aiter_weather_data_executor(ftp_server):
+    add_station_years(ftp_server)
+    with ThreadPoolExecutor(2) as executor:
+        results = asyncio.run(
+            collect(
+                stations,
+                years,
+                max_concurrency=1,
+                executor=executor,
+                fields=["precip_depth"],
+                scaled=True,
+            )
+        )
+    assert [(stn, year) for stn, year, _ in results] == [
+        (stn, year) for year in years for stn in stations
+    ]
+    for _, _, weather_df in results:
+        assert list(weather_df.columns) == ["stn", "datetime", "precip_depth"]
+        assert (weather_df.precip_depth == 1).all()
+
+
+def test_aiter_weather_data_close(ftp_server):
+    add_station_years(ftp_server)
+
+    async def first():
+        results = noaastn.aiter_weather_data(stations, years)
+        try:
+            return await results.__anext__()
+        finally:
+            await results.aclose()
+
+    stn, year, weather_df = asyncio.run(first())
+    assert isinstance(weather_df, pd.DataFrame)
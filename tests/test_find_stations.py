@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from noaastn import noaastn
+
+from .synthetic import STATIONS, make_station_history
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * 6371.0088 * np.arcsin(np.sqrt(a))
+
+
+@pytest.fixture
+def stations(ftp_server):
+    ftp_server.add_file(
+        "pub/data/noaa/isd-history.txt", make_station_history(STATIONS)
+    )
+
+
+def test_find_stations_nearest(stations):
+    near_sfo = noaastn.find_stations(37.7, -122.4, k=2)
+    assert near_sfo.call.tolist() == ["KSFO", "KLAX"]
+    assert near_sfo.distance_km.is_monotonic_increasing
+    assert near_sfo.distance_km.iloc[0] == pytest.approx(
+        haversine_km(37.7, -122.4, 37.620, -122.365), rel=1e-4
+    )
+    assert "query" not in near_sfo.columns
+
+    within = noaastn.find_stations(37.7, -122.4, radius_km=600)
+    assert within.call.tolist() == ["KSFO", "KLAX"]
+    assert noaastn.find_stations(37.7, -122.4, radius_km=1).empty
+
+    active = noaastn.find_stations(0, 0, radius_km=1000, active_in=2012)
+    assert active.usaf.tolist() == ["007018"]
+    active = noaastn.find_stations(61.4, 5.9, k=1, active_in=2015)
+    assert active.usaf.tolist() != ["010015"], "010015 closed in 2008"
+
+
+def test_find_stations_batch(stations):
+    found = noaastn.find_stations([61.0, 21.9], [5.0, -159.0], k=1)
+    assert found["query"].tolist() == [0, 1]
+    assert found.call.tolist() == ["ENBL", "PHLI"]
+
+
+def test_find_stations_exceptions(stations):
+    with pytest.raises(AssertionError):
+        noaastn.find_stations(37.7, -122.4)
+    with pytest.raises(AssertionError):
+        noaastn.find_stations(91, -122.4, k=1)
+    with pytest.raises(AssertionError):
+        noaastn.find_stations([1, 2], [1], k=1)
+
+
+@pytest.mark.parametrize("k, radius_km", [(7, None), (None, 800), (3, 300)])
+def test_spatial_index_matches_brute_force(k, radius_km):
+    rng = np.random.default_rng(1)
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, 3000)))
+    lon = rng.uniform(-180, 180, 3000)
+    lat[:5] = np.nan
+    index = noaastn._SpatialIndex(lat, lon)
+    mask = rng.uniform(size=3000) < 0.8
+
+    q_lat = np.r_[rng.uniform(-90, 90, 200), 89.9, -90, 0]
+    q_lon = np.r_[rng.uniform(-180, 180, 200), 179.9, 0, -180]
+    query_nums, rows, distances = index.query(q_lat, q_lon, k, radius_km, mask)
+
+    for i in range(len(q_lat)):
+        dist = haversine_km(q_lat[i], q_lon[i], lat, lon)
+        dist[~mask | np.isnan(dist)] = np.inf
+        expected = np.argsort(dist, kind="stable")
+        if radius_km is not None:
+            expected = expected[dist[expected] <= radius_km]
+        if k is not None:
+            expected = expected[:k]
+        np.testing.assert_array_equal(rows[query_nums == i], expected)
+        np.testing.assert_allclose(
+            distances[query_nums == i], dist[expected], rtol=1e-6
+        )
@@ -1,8 +1,11 @@
+import numpy as np
 import pandas as pd
 import pytest
 from noaastn import noaastn
 from pandas.api.types import is_datetime64_any_dtype as is_datetime
 
+from .synthetic import STATIONS, make_station_history
+
 get_stations_info_params = [("all", [29561, 253]), ("US", [7158, 1])]
 invalid_params = ["XXX", 12]
 num_column = 11
@@ -12,9 +15,17 @@ col_len = {
     "state": 2,
     "usaf": 6,
     "wban": 5,
-    "latitude": 7,
-    "longitude": 8,
-    "elevation": 7,
+}
+col_types = {
+    "usaf": "category",
+    "wban": "category",
+    "station_name": object,
+    "country": "category",
+    "state": "category",
+    "call": "category",
+    "latitude": np.float32,
+    "longitude": np.float32,
+    "elevation": np.float32,
 }
 
 
@@ -27,10 +38,10 @@ def test_get_stations_info(param, expected_output):
     assert data_all.shape[1] == num_column
 
     # check type of the columns
-    for i in range(9):
-        assert data_all.dtypes[i] == object
-    is_datetime(data_all["start"])
-    is_datetime(data_all["end"])
+    for col, col_type in col_types.items():
+        assert data_all[col].dtype == col_type
+    assert is_datetime(data_all["start"])
+    assert is_datetime(data_all["end"])
 
     # match and check each col value pattern by comparing length
     row_df = data_all.sample(1)
@@ -56,3 +67,46 @@ def test_get_stations_info_exception():
         str(ex_info.value)
         == "Invalid country parameter. parameter should be length 2"
     )
+
+    with pytest.raises(Exception) as ex_info:
+        assert noaastn.get_stations_info(state="CAL")
+    assert (
+        str(ex_info.value)
+        == "Invalid state parameter. parameter should be a string of length 2"
+    )
+
+
+def test_get_stations_info_offline(ftp_server):
+    ftp_server.add_file(
+        "pub/data/noaa/isd-history.txt", make_station_history(STATIONS)
+    )
+
+    data_all = noaastn.get_stations_info()
+    assert data_all.shape == (len(STATIONS), num_column)
+    for col, col_type in col_types.items():
+        assert data_all[col].dtype == col_type
+    assert data_all.start[2] == pd.Timestamp("1973-01-01")
+    assert data_all.latitude[2] == np.float32(25.791)
+    assert data_all.station_name[3] == "LOS ANGELES INTERNATIONAL AIR"
+    assert data_all.usaf[6] == "A00001"
+    assert pd.isna(data_all.country[0]) and pd.isna(data_all.state[1])
+    assert pd.isna(data_all.latitude[6]) and pd.isna(data_all.call[6])
+
+    data_us = noaastn.get_stations_info(country="US")
+    assert data_us.index.tolist() == [2, 3, 4, 5, 6]
+    data_ca = noaastn.get_stations_info(country="US", state="CA")
+    assert data_ca.call.tolist() == ["KLAX", "KSFO"]
+    assert noaastn.get_stations_info(country="XX").empty
+    assert not ftp_server.retrieved[1:], "Stations should be cached"
+
+    # Refreshing downloads the file again only when it has changed
+    noaastn.get_stations_info(refresh=True)
+    assert ftp_server.retrieved == ["isd-history.txt"]
+    ftp_server.add_file(
+        "pub/data/noaa/isd-history.txt",
+        make_station_history(STATIONS),
+        mtime=2e9,
+    )
+    noaastn.get_stations_info(refresh=True)
+    assert ftp_server.retrieved == ["isd-history.txt"] * 2
+    assert noaastn._station_table().by_station["911650-22536"] == 5
@@ -24,20 +24,23 @@ def test_column_datatypes():
         weather_df.datetime.dtype == "<M8[ns]"
     ), "Data type of datetime column is incorrect (should be'<M8[ns]')."
     assert (
-        weather_df.air_temp.dtype == "float64"
-    ), "Data type of air_temp column is incorrect (should be 'float64')."
+        weather_df.air_temp.dtype == "float32"
+    ), "Data type of air_temp column is incorrect (should be 'float32')."
     assert (
-        weather_df.atm_press.dtype == "float64"
-    ), "Data type of atm_press column is incorrect (should be 'float64')."
+        weather_df.atm_press.dtype == "float32"
+    ), "Data type of atm_press column is incorrect (should be 'float32')."
     assert (
-        weather_df.wind_spd.dtype == "float64"
-    ), "Data type of wind_spd column is incorrect (should be 'float64')."
+        weather_df.wind_spd.dtype == "float32"
+    ), "Data type of wind_spd column is incorrect (should be 'float32')."
     assert (
-        weather_df.wind_dir.dtype == "float64"
-    ), "Data type of wind_dir column is incorrect (should be 'float64')."
+        weather_df.wind_dir.dtype == "float32"
+    ), "Data type of wind_dir column is incorrect (should be 'float32')."
 
 
 def test_station_number_coding():
+    assert (
+        weather_df.stn.dtype == "category"
+    ), "Data type of stn column is incorrect (should be 'category')."
     assert (
         weather_df.stn.unique().shape[0] == 1
     ), "There should only be one station number in the data table"
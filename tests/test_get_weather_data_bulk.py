@@ -0,0 +1,72 @@
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+stations = ["911803-99999", "911650-22536"]
+years = [2014, 2015]
+
+
+def add_station_years(ftp_server):
+    for year in years:
+        for i, stn in enumerate(stations):
+            ftp_server.add_file(
+                "pub/data/noaa/%d/%s-%d.gz" % (year, stn, year),
+                make_isd_file(
+                    10 + i, year=year, usaf=stn[:6], wban=stn[7:], seed=year
+                ),
+            )
+
+
+def test_bulk_concatenates_station_years(ftp_server):
+    add_station_years(ftp_server)
+    weather_df, errors_df = noaastn.get_weather_data_bulk(
+        stations, years, max_sessions=2
+    )
+
+    assert len(weather_df.index) == 2 * (10 + 11)
+    assert list(weather_df.columns) == [
+        "stn",
+        "datetime",
+        "air_temp",
+        "atm_press",
+        "wind_spd",
+        "wind_dir",
+    ]
+    assert weather_df.groupby("stn", observed=True).size().to_dict() == {
+        "911803-99999": 20,
+        "911650-22536": 22,
+    }
+    assert weather_df.datetime.dt.year.unique().tolist() == years
+    assert errors_df.empty
+    assert ftp_server.sessions <= 2, "Sessions should be reused"
+    assert ftp_server.commands.count(("QUIT", "")) == ftp_server.sessions
+
+
+def test_bulk_reports_errors(ftp_server):
+    add_station_years(ftp_server)
+    ftp_server.add_file("pub/data/noaa/2015/722020-12839-2015.gz", b"no gz")
+    weather_df, errors_df = noaastn.get_weather_data_bulk(
+        stations + ["722020-12839"], years + [1750], max_sessions=1
+    )
+
+    assert len(weather_df.index) == 2 * (10 + 11)
+    assert ftp_server.sessions == 1, "Missing files should not drop sessions"
+    assert sorted(zip(errors_df.stn, errors_df.year)) == [
+        ("722020-12839", 1750),
+        ("722020-12839", 2014),
+        ("722020-12839", 2015),
+        ("911650-22536", 1750),
+        ("911803-99999", 1750),
+    ]
+    assert errors_df.error.str.len().gt(0).all()
+
+
+def test_bulk_uses_cache(ftp_server, tmp_path):
+    add_station_years(ftp_server)
+    cache = noaastn.DownloadCache(tmp_path / "cache")
+    first_df, _ = noaastn.get_weather_data_bulk(stations, years, cache=cache)
+    sessions = ftp_server.sessions
+    second_df, _ = noaastn.get_weather_data_bulk(stations, years, cache=cache)
+
+    assert first_df.equals(second_df)
+    assert ftp_server.sessions == sessions, "Cached files should not connect"
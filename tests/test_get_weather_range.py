@@ -0,0 +1,80 @@
+import gzip
+
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+station_number = "911803-99999"
+
+
+def add_station_years(ftp_server):
+    frames = []
+    for year in [2014, 2015]:
+        raw_data = gzip.decompress(make_isd_file(24 * 60, year=year))
+        if year == 2015:
+            # Repeat a record
+            lines = raw_data.splitlines(keepends=True)
+            raw_data = b"".join(lines[:3] + lines[2:])
+        ftp_server.add_file(
+            "pub/data/noaa/%d/%s-%d.gz" % (year, station_number, year),
+            gzip.compress(raw_data),
+        )
+        frames.append(noaastn._parse_isd(raw_data, station_number))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_get_weather_range(ftp_server):
+    weather_df = add_station_years(ftp_server)
+    range_df = noaastn.get_weather_range(
+        station_number, "2014-01-10", "2015-01-05"
+    )
+
+    expected_df = (
+        weather_df[
+            (weather_df.datetime >= "2014-01-10")
+            & (weather_df.datetime < "2015-01-05")
+        ]
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+    assert len(expected_df.index) == 24 * 51 + 24 * 4
+    pd.testing.assert_frame_equal(range_df, expected_df)
+    assert range_df.datetime.is_monotonic_increasing
+
+
+def test_get_weather_range_missing_years(ftp_server):
+    add_station_years(ftp_server)
+    range_df = noaastn.get_weather_range(
+        station_number, "2013-12-31", "2016-06-01", scaled=True
+    )
+    assert range_df.datetime.dt.year.unique().tolist() == [2014, 2015]
+    assert range_df.air_temp.dtype == "Int16"
+
+    range_df = noaastn.get_weather_range(
+        station_number, "2013-01-01", "2014-01-01"
+    )
+    assert range_df.empty
+
+
+def test_get_weather_range_store(ftp_server, tmp_path):
+    pytest.importorskip("pyarrow.parquet")
+    add_station_years(ftp_server)
+    store = noaastn.ParquetStore(str(tmp_path / "store"))
+    range_df = noaastn.get_weather_range(
+        station_number, "2014-02-01", "2015-01-02 12:00", store=store
+    )
+    assert store.has(station_number, 2014) and store.has(station_number, 2015)
+    assert len(store.read(station_number, 2014).index) == 24 * 60
+
+    stored_df = noaastn.get_weather_range(
+        station_number, "2014-02-01", "2015-01-02 12:00", store=store
+    )
+    pd.testing.assert_frame_equal(stored_df, range_df)
+    pd.testing.assert_frame_equal(
+        stored_df,
+        noaastn.get_weather_range(
+            station_number, "2014-02-01", "2015-01-02 12:00"
+        ),
+    )
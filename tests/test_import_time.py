@@ -0,0 +1,41 @@
+import re
+import subprocess
+import sys
+
+# Import time of noaastn.noaastn besides numpy and pandas, in seconds
+IMPORT_BUDGET = 0.25
+
+
+def import_times(module):
+    """
+    Returns the cumulative import time in seconds and the indentation level
+    of every module imported by `module`, as reported by -X importtime.
+    """
+    # The first run writes the bytecode caches
+    for _ in range(2):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import " + module],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    times = {}
+    for line in completed.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match:
+            cumulative, indent, name = match.groups()
+            times[name] = int(cumulative) / 1e6, len(indent) // 2
+    return times
+
+
+def test_import_time():
+    times = import_times("noaastn.noaastn")
+    assert "altair" not in times, "Plotting dependencies should be lazy"
+
+    dependencies = sum(
+        seconds
+        for name, (seconds, level) in times.items()
+        if name in ["numpy", "pandas"] and level == 1
+    )
+    own = times["noaastn.noaastn"][0] - dependencies
+    assert own < IMPORT_BUDGET, f"noaastn takes {own:.3f} s to import"
@@ -0,0 +1,62 @@
+import logging
+
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+station_number = "911803-99999"
+
+
+def test_collect_stats(ftp_server, tmp_path):
+    compressed_data = make_isd_file(48)
+    ftp_server.add_file(
+        "pub/data/noaa/2015/911803-99999-2015.gz", compressed_data
+    )
+    cache = noaastn.DownloadCache(tmp_path / "cache")
+
+    with noaastn.collect_stats() as stats:
+        noaastn.get_weather_data_bulk([station_number], [2015], cache=cache)
+        noaastn.get_weather_data_bulk([station_number], [2015], cache=cache)
+        noaastn.get_weather_data_bulk(["000000-99999"], [2015])
+    assert not noaastn._hooks
+
+    summary = stats.summary()
+    assert summary.loc["transfer", "count"] == 1
+    assert summary.loc["transfer", "bytes"] == len(compressed_data)
+    assert summary.loc["decompress", "count"] == 2
+    assert summary.loc["decode", "records"] == 96
+    assert summary.loc["frame", "records"] == 96
+    assert (summary.seconds >= 0).all()
+    assert (stats.cache_hits, stats.cache_misses) == (1, 1)
+    assert stats.errors == 1
+
+
+def test_hooks_and_logging(ftp_server, caplog):
+    ftp_server.add_file(
+        "pub/data/noaa/2015/911803-99999-2015.gz", make_isd_file(24)
+    )
+    events = []
+
+    def hook(event, data):
+        events.append((event, data))
+
+    noaastn.add_hook(hook)
+    try:
+        noaastn.get_weather_data(station_number, 2015)
+    finally:
+        noaastn.remove_hook(hook)
+    names = [event for event, _ in events]
+    assert names[0] == "connect"
+    assert {"transfer", "decode", "frame"} <= set(names)
+    transfer = dict(events)["transfer"]
+    assert transfer["filename"] == "911803-99999-2015.gz"
+    assert transfer["bytes"] > 0
+
+    # Without hooks, the events are logged at the DEBUG level only
+    noaastn.get_weather_data(station_number, 2015)
+    assert not caplog.records
+    with caplog.at_level(logging.DEBUG, logger="noaastn"):
+        noaastn.get_weather_data(station_number, 2015)
+    assert any(
+        record.getMessage().startswith("decode ") for record in caplog.records
+    )
@@ -0,0 +1,182 @@
+import os
+import shutil
+import time
+from ftplib import error_perm
+
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import STATIONS, make_isd_file, make_station_history
+
+year_dir = "pub/data/noaa/2015/"
+
+
+@pytest.fixture
+def weather_files(ftp_server, monkeypatch):
+    monkeypatch.setattr(noaastn, "_TRANSPORT", None)
+    ftp_server.add_file(
+        "pub/data/noaa/isd-history.txt", make_station_history(STATIONS)
+    )
+    files = {
+        "722020-12839-2015.gz": make_isd_file(50, usaf="722020", wban="12839"),
+        "911803-99999-2015.gz": make_isd_file(20),
+    }
+    for filename, compressed_data in files.items():
+        ftp_server.add_file(year_dir + filename, compressed_data)
+    return files
+
+
+def test_get_inventory(ftp_server, weather_files):
+    inventory_df = noaastn.get_inventory([2015, 2016])
+    assert list(inventory_df.columns) == [
+        "stn",
+        "year",
+        "size",
+        "start",
+        "end",
+    ]
+    assert inventory_df.stn.tolist() == ["722020-12839", "911803-99999"]
+    assert (inventory_df.year == 2015).all()
+    assert inventory_df["size"].tolist() == [
+        len(weather_files["722020-12839-2015.gz"]),
+        len(weather_files["911803-99999-2015.gz"]),
+    ]
+    assert inventory_df.start[0] == pd.Timestamp("1973-01-01")
+    assert inventory_df.end[0] == pd.Timestamp("2021-03-16")
+    # Station missing from the station information
+    assert pd.isna(inventory_df.start[1])
+
+    # Another process loads the snapshot without listing the directories
+    noaastn._inventories.clear()
+    sessions = ftp_server.sessions
+    pd.testing.assert_frame_equal(
+        noaastn.get_inventory([2015, 2016]), inventory_df
+    )
+    assert ftp_server.sessions == sessions
+    assert [cmd for cmd, _ in ftp_server.commands].count("LIST") == 1
+
+    # Expired snapshots are listed again
+    noaastn._inventories.clear()
+    old = time.time() - noaastn._INVENTORY_MAX_AGE
+    location = noaastn._get_transport()._location()
+    os.utime(noaastn._inventory_path(2015, location), (old, old))
+    noaastn.get_inventory([2015])
+    assert [cmd for cmd, _ in ftp_server.commands].count("LIST") == 2
+
+
+def test_missing_files_rejected_locally(ftp_server, weather_files):
+    # Not listed yet, the FTP site is asked
+    assert noaastn.get_weather_data("000000-99999", 2015) is None
+    assert ("RETR", "000000-99999-2015.gz") in ftp_server.commands
+
+    noaastn.get_inventory([2015])
+    sessions, n_commands = ftp_server.sessions, len(ftp_server.commands)
+    assert noaastn.get_weather_data("000001-99999", 2015) is None
+    with pytest.raises(error_perm, match="inventory"):
+        noaastn._fetch_weather_file(2015, "000001-99999-2015.gz")
+    assert (ftp_server.sessions, len(ftp_server.commands)) == (
+        sessions,
+        n_commands,
+    )
+
+    weather_df = noaastn.get_weather_data("911803-99999", 2015)
+    assert len(weather_df.index) == 20
+
+
+def test_batch_loaders_list_years(ftp_server, weather_files, monkeypatch):
+    monkeypatch.setattr(noaastn, "_INVENTORY_MIN_FILES", 3)
+    stations = ["722020-12839", "911803-99999", "000000-99999"]
+    weather_df, errors_df = noaastn.get_weather_data_bulk(stations, [2015])
+    assert len(weather_df.index) == 70
+    assert errors_df.stn.tolist() == ["000000-99999"]
+    assert "inventory" in errors_df.error[0]
+    assert "000000-99999-2015.gz" not in [
+        arg for cmd, arg in ftp_server.commands if cmd == "RETR"
+    ]
+
+    # Fewer station-years of a year than the threshold do not list it
+    noaastn.get_weather_data_bulk(stations[:2], [2014])
+    assert [cmd for cmd, _ in ftp_server.commands].count("LIST") == 1
+
+
+def test_cached_loads_not_listed(
+    ftp_server, weather_files, snapshot_dir, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(noaastn, "_INVENTORY_MIN_FILES", 2)
+    cache = noaastn.DownloadCache(str(tmp_path / "cache"))
+    stations = ["722020-12839", "911803-99999"]
+    weather_df, _ = noaastn.get_weather_data_bulk(
+        stations, [2015], cache=cache
+    )
+    assert len(weather_df.index) == 70
+
+    # A load served by the cache neither lists the year nor connects
+    noaastn._inventories.clear()
+    shutil.rmtree(snapshot_dir / "inventory.v1")
+    sessions = ftp_server.sessions
+    cached_df, errors_df = noaastn.get_weather_data_bulk(
+        stations, [2015], cache=cache
+    )
+    pd.testing.assert_frame_equal(cached_df, weather_df)
+    assert errors_df.empty
+    assert ftp_server.sessions == sessions
+    assert noaastn._known_inventory(2015) is None
+
+
+def test_transport_listings(ftp_server, http_server, weather_files):
+    with noaastn.LocalTransport(
+        os.path.join(ftp_server.root, "pub/data/noaa")
+    ).connect() as connection:
+        assert connection.listdir("2015") == {
+            filename: len(compressed_data)
+            for filename, compressed_data in weather_files.items()
+        }
+        with pytest.raises(error_perm):
+            connection.listdir("2016")
+
+    noaastn.set_transport(
+        noaastn.HTTPSTransport(
+            "http://127.0.0.1:%d/pub/data/noaa" % http_server.server_port
+        )
+    )
+    inventory_df = noaastn.get_inventory([2015])
+    assert inventory_df.stn.tolist() == ["722020-12839", "911803-99999"]
+    assert inventory_df["size"].isna().all()
+
+
+def test_unparsed_listings(ftp_server, weather_files):
+    # Listings in another format fall back to the file names
+    ftp_server.dos_listing = True
+    inventory_df = noaastn.get_inventory([2015])
+    assert inventory_df.stn.tolist() == ["722020-12839", "911803-99999"]
+    assert inventory_df["size"].isna().all()
+    assert ("NLST", "") in ftp_server.commands
+    weather_df = noaastn.get_weather_data("911803-99999", 2015)
+    assert len(weather_df.index) == 20
+
+
+def test_inventories_kept_per_site(ftp_server, weather_files, tmp_path):
+    # A partial mirror lacking one of the files of the FTP site
+    mirror = tmp_path / "mirror"
+    (mirror / "2015").mkdir(parents=True)
+    (mirror / "2015" / "722020-12839-2015.gz").write_bytes(
+        weather_files["722020-12839-2015.gz"]
+    )
+    (mirror / "isd-history.txt").write_bytes(make_station_history(STATIONS))
+    noaastn.set_transport(noaastn.LocalTransport(str(mirror)))
+    assert noaastn.get_inventory([2015]).stn.tolist() == ["722020-12839"]
+    assert noaastn.get_weather_data("911803-99999", 2015) is None
+
+    # The listing of the mirror does not apply to the FTP site, in this
+    # process or in another one
+    noaastn.set_transport(noaastn.FTPTransport())
+    weather_df = noaastn.get_weather_data("911803-99999", 2015)
+    assert len(weather_df.index) == 20
+    noaastn._inventories.clear()
+    weather_df = noaastn.get_weather_data("911803-99999", 2015)
+    assert len(weather_df.index) == 20
+    assert noaastn.get_inventory([2015]).stn.tolist() == [
+        "722020-12839",
+        "911803-99999",
+    ]
@@ -0,0 +1,81 @@
+import gzip
+
+import pandas as pd
+import pytest
+from ftplib import error_perm
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+station_number = "911803-99999"
+path = "pub/data/noaa/2015/911803-99999-2015.gz"
+
+
+def test_chunks_match_full_frame(ftp_server):
+    ftp_server.add_file(path, make_isd_file(50))
+    chunks = list(noaastn.iter_weather_data(station_number, 2015, 7))
+
+    assert [len(chunk.index) for chunk in chunks] == [7] * 7 + [1]
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks, ignore_index=True),
+        noaastn.get_weather_data(station_number, 2015),
+    )
+
+
+def test_chunks_from_cache(ftp_server, tmp_path):
+    ftp_server.add_file(path, make_isd_file(3000))
+    cache = noaastn.DownloadCache(tmp_path / "cache")
+    chunks = list(
+        noaastn.iter_weather_data(station_number, 2015, 1000, cache=cache)
+    )
+
+    assert [len(chunk.index) for chunk in chunks] == [1000] * 3
+    assert pd.concat(chunks).datetime.is_monotonic_increasing
+
+
+def test_multi_member_gzip(ftp_server):
+    raw_data = gzip.decompress(make_isd_file(20))
+    ftp_server.add_file(
+        path, gzip.compress(raw_data[:1500]) + gzip.compress(raw_data[1500:])
+    )
+    weather_df = noaastn.get_weather_data(station_number, 2015)
+
+    assert len(weather_df.index) == 20
+
+
+def test_stop_early_closes_download(ftp_server):
+    ftp_server.add_file(path, make_isd_file(20000))
+    chunks = noaastn.iter_weather_data(station_number, 2015, 100)
+    assert len(next(chunks).index) == 100
+    chunks.close()
+
+    assert ftp_server.retrieved == ["911803-99999-2015.gz"]
+
+
+def test_errors_raised_from_iterator(ftp_server):
+    with pytest.raises(error_perm):
+        next(noaastn.iter_weather_data("999999-99999", 1750))
+
+    ftp_server.add_file(path, make_isd_file(200)[:-100])
+    with pytest.raises(EOFError):
+        list(noaastn.iter_weather_data(station_number, 2015))
+
+
+def test_get_weather_data_keeps_compact_dtypes(ftp_server, monkeypatch):
+    raw_data = bytearray(gzip.decompress(make_isd_file(50)))
+    # Flag the air temperature of the first record as suspect, so that the
+    # chunks have different quality codes
+    raw_data[92] = ord("2")
+    ftp_server.add_file(path, gzip.compress(bytes(raw_data)))
+    iter_weather_data = noaastn.iter_weather_data
+    monkeypatch.setattr(
+        noaastn,
+        "iter_weather_data",
+        lambda *args, **kwargs: iter_weather_data(*args[:2], 7, **kwargs),
+    )
+
+    weather_df = noaastn.get_weather_data(station_number, 2015, quality=True)
+    assert len(weather_df.index) == 50
+    assert weather_df.stn.dtype == "category"
+    assert weather_df.air_temp_quality.dtype == "category"
+    assert weather_df.air_temp_quality[:2].tolist() == ["2", "1"]
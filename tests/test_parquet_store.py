@@ -0,0 +1,140 @@
+import gzip
+
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+station_number = "911803-99999"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return noaastn.ParquetStore(str(tmp_path / "store"))
+
+
+def test_get_weather_data_reads_store(ftp_server, store):
+    ftp_server.add_file(
+        "pub/data/noaa/2015/911803-99999-2015.gz", make_isd_file(2000)
+    )
+    weather_df = noaastn.get_weather_data(station_number, 2015, store=store)
+    assert store.has(station_number, 2015)
+    sessions = ftp_server.sessions
+
+    stored_df = noaastn.get_weather_data(station_number, 2015, store=store)
+    assert ftp_server.sessions == sessions, "Stored years should not connect"
+    pd.testing.assert_frame_equal(stored_df, weather_df)
+
+    bulk_df, _ = noaastn.get_weather_data_bulk(
+        [station_number], [2015], store=store
+    )
+    assert ftp_server.sessions == sessions
+    pd.testing.assert_frame_equal(bulk_df, weather_df)
+
+
+def test_store_pushdown(store):
+    weather_df = noaastn._parse_isd(
+        gzip.decompress(make_isd_file(24 * 365)), station_number
+    )
+    store.write(station_number, 2015, weather_df)
+
+    metadata = pq.ParquetFile(store.path(station_number, 2015)).metadata
+    assert metadata.num_row_groups == 12, "One row group per month"
+
+    march_df = store.read(
+        station_number,
+        2015,
+        columns=["air_temp"],
+        start="2015-03-01",
+        end="2015-04-01",
+    )
+    assert list(march_df.columns) == ["stn", "datetime", "air_temp"]
+    expected = weather_df[weather_df.datetime.dt.month == 3]
+    pd.testing.assert_frame_equal(
+        march_df,
+        expected[["stn", "datetime", "air_temp"]].reset_index(drop=True),
+    )
+
+
+def test_store_fields(ftp_server, store):
+    ftp_server.add_file(
+        "pub/data/noaa/2015/911803-99999-2015.gz", make_isd_file(100)
+    )
+    noaastn.get_weather_data(station_number, 2015, store=store)
+    sessions = ftp_server.sessions
+
+    weather_df = noaastn.get_weather_data(
+        station_number, 2015, store=store, fields=["precip_depth"]
+    )
+    assert ftp_server.sessions == sessions + 1, "Missing fields are fetched"
+    assert list(weather_df.columns) == ["stn", "datetime", "precip_depth"]
+    assert (weather_df.precip_depth == 0.1).all()
+
+    stored_df = noaastn.get_weather_data(
+        station_number, 2015, store=store, fields=["precip_depth"]
+    )
+    assert ftp_server.sessions == sessions + 1
+    pd.testing.assert_frame_equal(stored_df, weather_df)
+
+
+def test_store_keeps_fields_of_earlier_loads(ftp_server, store):
+    ftp_server.add_file(
+        "pub/data/noaa/2015/911803-99999-2015.gz", make_isd_file(100)
+    )
+    default_df = noaastn.get_weather_data(station_number, 2015, store=store)
+    dew_point_df = noaastn.get_weather_data(
+        station_number, 2015, store=store, fields=["dew_point"]
+    )
+    assert list(dew_point_df.columns) == ["stn", "datetime", "dew_point"]
+    bulk_df, _ = noaastn.get_weather_data_bulk(
+        [station_number], [2015], store=store, fields=["sky_cover"]
+    )
+    assert list(bulk_df.columns) == ["stn", "datetime", "sky_cover"]
+    assert ftp_server.retrieved == [station_number + "-2015.gz"] * 3
+
+    # Every field loaded so far is served from the store
+    for fields, expected_df in [
+        (None, default_df),
+        (["dew_point"], dew_point_df),
+        (["sky_cover"], bulk_df),
+    ]:
+        stored_df = noaastn.get_weather_data(
+            station_number, 2015, store=store, fields=fields
+        )
+        pd.testing.assert_frame_equal(stored_df, expected_df)
+    assert len(ftp_server.retrieved) == 3
+
+    noaastn.backfill(
+        [station_number], [2015], store, fields=["visibility"], workers=1
+    )
+    assert set(store.columns(station_number, 2015)) >= {
+        "air_temp",
+        "dew_point",
+        "sky_cover",
+        "visibility",
+    }
+
+
+def test_store_accepted_quality(ftp_server, store):
+    raw_data = bytearray(gzip.decompress(make_isd_file(10)))
+    # Flag the air temperature of the first record as erroneous
+    raw_data[92] = ord("3")
+    ftp_server.add_file(
+        "pub/data/noaa/2015/911803-99999-2015.gz",
+        gzip.compress(bytes(raw_data)),
+    )
+    weather_df = noaastn.get_weather_data(
+        station_number, 2015, store=store, accepted_quality=["1"]
+    )
+    assert list(weather_df.columns)[2:] == noaastn.DEFAULT_FIELDS
+    assert pd.isna(weather_df.air_temp[0])
+
+    stored_df = noaastn.get_weather_data(station_number, 2015, store=store)
+    assert stored_df.air_temp[0] == pytest.approx(-15.4), "Store keeps all"
+    masked_df = noaastn.get_weather_data(
+        station_number, 2015, store=store, accepted_quality=["1"]
+    )
+    pd.testing.assert_frame_equal(masked_df, weather_df)
@@ -0,0 +1,205 @@
+import datetime
+import gzip
+
+import numpy as np
+import pandas as pd
+from noaastn import noaastn
+
+from .synthetic import make_isd_file, make_isd_record
+
+station_number = "911803-99999"
+
+
+def test_parse_isd_values():
+    raw_data = (
+        make_isd_record(
+            when=datetime.datetime(2015, 3, 4, 5, 56),
+            wind_dir=270,
+            wind_spd=15,
+            air_temp=-56,
+            atm_press=10132,
+        )
+        + "\n"
+        + make_isd_record(
+            wind_dir=999, wind_spd=9999, air_temp=9999, atm_press=99999
+        )
+        + "\n"
+    ).encode()
+    weather_df = noaastn._parse_isd(raw_data, station_number)
+
+    assert list(weather_df.columns) == [
+        "stn",
+        "datetime",
+        "air_temp",
+        "atm_press",
+        "wind_spd",
+        "wind_dir",
+    ]
+    assert weather_df.datetime[0] == pd.Timestamp("2015-03-04 05:56")
+    assert weather_df.air_temp[0] == np.float32(-5.6)
+    assert weather_df.atm_press[0] == np.float32(1013.2)
+    assert weather_df.wind_spd[0] == np.float32(1.5)
+    assert weather_df.wind_dir[0] == 270
+    assert weather_df.iloc[1, 2:].isna().all(), "Missing codes should be NaN"
+    assert (weather_df.stn == station_number).all()
+
+
+def test_parse_isd_matches_row_parser():
+    raw_data = gzip.decompress(make_isd_file(500))
+    weather_df = noaastn._parse_isd(raw_data, station_number)
+
+    lines = raw_data.decode().splitlines()
+    assert len(weather_df.index) == len(lines)
+    for i in [0, 17, 499]:
+        line = lines[i]
+        assert weather_df.datetime[i] == pd.to_datetime(line[15:27])
+        expected = [
+            float(line[87:92]) / 10,
+            float(line[99:104]) / 10,
+            float(line[65:69]) / 10,
+            float(line[60:63]),
+        ]
+        missing = [
+            line[87:92] == "+9999",
+            line[99:104] == "99999",
+            line[65:69] == "9999",
+            line[60:63] == "999",
+        ]
+        np.testing.assert_array_equal(
+            weather_df.iloc[i, 2:].astype(float),
+            np.where(missing, np.nan, expected).astype(np.float32),
+        )
+
+
+def test_parse_isd_empty_and_unterminated():
+    weather_df = noaastn._parse_isd(b"", station_number)
+    assert weather_df.shape == (0, 6)
+
+    weather_df = noaastn._parse_isd(
+        make_isd_record().encode(), station_number
+    )
+    assert weather_df.shape == (1, 6)
+    assert weather_df.datetime.dtype == "<M8[ns]"
+    assert weather_df.air_temp.dtype == "float32"
+    assert weather_df.stn.dtype == "category"
+
+
+def test_memory_footprint():
+    # The frames built row by row used about 150 bytes per row, mostly for
+    # the repeated station number strings. The compact schema needs 8 bytes
+    # for the datetime, 4 per float32 measurement and 1 for the categorical
+    # station code, and the scaled schema 2 bytes plus a 1 byte mask per
+    # measurement.
+    raw_data = gzip.decompress(make_isd_file(24 * 365))
+    weather_df = noaastn._parse_isd(raw_data, station_number)
+    bytes_per_row = weather_df.memory_usage(deep=True).sum() / 8760
+    assert bytes_per_row < 26
+
+    scaled_df = noaastn._to_scaled(weather_df)
+    assert (scaled_df.dtypes[2:] == "Int16").all()
+    assert scaled_df.memory_usage(deep=True).sum() / 8760 < 22
+    np.testing.assert_array_equal(
+        scaled_df.air_temp.to_numpy(np.float64, na_value=np.nan) / 10,
+        weather_df.air_temp.to_numpy(np.float64).round(1),
+    )
+
+
+def test_parse_isd_fields():
+    raw_data = (
+        "\n".join(
+            [
+                make_isd_record(
+                    dew_point=-12,
+                    visibility=16093,
+                    ceiling=99999,
+                    additional="AA106002531GF10899199999999999999999",
+                ),
+                make_isd_record(additional="GF19999999999999999999999999"),
+                make_isd_record(additional="MA1101601999999REMSYN AA1060025"),
+                make_isd_record(dew_point=9999, visibility=999999),
+            ]
+        )
+        + "\n"
+    ).encode()
+    fields = [
+        "dew_point",
+        "visibility",
+        "ceiling_height",
+        "precip_period",
+        "precip_depth",
+        "sky_cover",
+    ]
+    weather_df = noaastn._parse_isd(
+        raw_data, station_number, fields, quality=True
+    )
+
+    assert list(weather_df.columns[2:8]) == fields
+    assert list(weather_df.columns[8:]) == [
+        col + "_quality" for col in fields
+    ]
+    np.testing.assert_array_equal(
+        weather_df.dew_point, np.float32([-1.2, 4.5, 4.5, np.nan])
+    )
+    np.testing.assert_array_equal(
+        weather_df.visibility, [16093, 16093, 16093, np.nan]
+    )
+    np.testing.assert_array_equal(
+        weather_df.ceiling_height, [np.nan, 22000, 22000, 22000]
+    )
+    np.testing.assert_array_equal(
+        weather_df.precip_period, [6, np.nan, np.nan, np.nan]
+    )
+    np.testing.assert_array_equal(
+        weather_df.precip_depth, np.float32([2.5, np.nan, np.nan, np.nan])
+    )
+    np.testing.assert_array_equal(
+        weather_df.sky_cover, [8, np.nan, np.nan, np.nan]
+    )
+    assert weather_df.precip_depth_quality.tolist()[:2] == ["1", np.nan]
+    assert weather_df.sky_cover_quality[1] == "9"
+    assert weather_df.dew_point_quality.unique().tolist() == ["1"]
+
+
+def test_parse_isd_accepted_quality():
+    raw_data = (
+        "\n".join(
+            [
+                make_isd_record(atm_press=9999, air_temp=999),
+                make_isd_record(),
+            ]
+        )
+        + "\n"
+    ).encode()
+    # Flag the air temperature of the second record as erroneous
+    raw_data = raw_data[:-14] + b"3" + raw_data[-13:]
+    weather_df = noaastn._parse_isd(raw_data, station_number)
+    assert weather_df.atm_press[0] == np.float32(999.9)
+    assert weather_df.air_temp[0] == np.float32(99.9)
+    assert weather_df.air_temp[1] == np.float32(12.3)
+
+    weather_df = noaastn._parse_isd(
+        raw_data,
+        station_number,
+        accepted_quality=noaastn.GOOD_QUALITY_CODES,
+    )
+    assert np.isnan(weather_df.air_temp[1])
+    assert weather_df.atm_press.notna().all()
+    assert weather_df.air_temp[0] == np.float32(99.9)
+
+
+def test_trim_records():
+    raw_data = gzip.decompress(make_isd_file(48))
+    weather_df = noaastn._parse_isd(raw_data, station_number)
+
+    trimmed = noaastn._trim_records(raw_data, "2015-01-01 10:00", "2015-01-02")
+    pd.testing.assert_frame_equal(
+        noaastn._parse_isd(trimmed, station_number),
+        weather_df.iloc[10:24].reset_index(drop=True),
+    )
+    assert noaastn._trim_records(raw_data, start="2016-01-01") == b""
+
+    # Unsorted records
+    lines = raw_data.splitlines(keepends=True)
+    shuffled = b"".join(lines[24:] + lines[:24])
+    trimmed = noaastn._trim_records(shuffled, end="2015-01-02 02:00")
+    assert trimmed == b"".join(lines[24:26] + lines[:24])
@@ -0,0 +1,73 @@
+import gzip
+import io
+
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import STATIONS, make_isd_file, make_station_history
+
+station_number = "911803-99999"
+
+
+@pytest.fixture
+def expected_df():
+    return noaastn._parse_isd(
+        gzip.decompress(make_isd_file(100)), station_number
+    )
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_parse_weather_data_path(tmp_path, expected_df, compress):
+    path = tmp_path / "911803-99999-2015"
+    path.write_bytes(make_isd_file(100, compress=compress))
+
+    pd.testing.assert_frame_equal(
+        noaastn.parse_weather_data(path), expected_df
+    )
+    pd.testing.assert_frame_equal(
+        noaastn.parse_weather_data(str(path), station_number), expected_df
+    )
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_parse_weather_data_bytes_and_file(expected_df, compress):
+    raw_data = make_isd_file(100, compress=compress)
+    pd.testing.assert_frame_equal(
+        noaastn.parse_weather_data(raw_data), expected_df
+    )
+    pd.testing.assert_frame_equal(
+        noaastn.parse_weather_data(io.BytesIO(raw_data)), expected_df
+    )
+
+
+def test_parse_weather_data_options(tmp_path):
+    path = tmp_path / "empty"
+    path.write_bytes(b"")
+    assert noaastn.parse_weather_data(path).shape == (0, 6)
+
+    weather_df = noaastn.parse_weather_data(
+        make_isd_file(10, usaf="722020", wban="12839"),
+        scaled=True,
+        fields=["precip_depth"],
+        quality=True,
+    )
+    assert weather_df.stn.unique().tolist() == ["722020-12839"]
+    assert list(weather_df.columns[2:]) == [
+        "precip_depth",
+        "precip_depth_quality",
+    ]
+    assert (weather_df.precip_depth == 1).all()
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_parse_stations_info(tmp_path, compress):
+    raw_data = make_station_history(STATIONS)
+    expected_df = noaastn._parse_station_history(raw_data)
+    path = tmp_path / "isd-history.txt"
+    path.write_bytes(gzip.compress(raw_data) if compress else raw_data)
+
+    for source in [path, path.read_bytes(), io.BytesIO(path.read_bytes())]:
+        pd.testing.assert_frame_equal(
+            noaastn.parse_stations_info(source), expected_df
+        )
@@ -0,0 +1,88 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+
+@pytest.fixture(scope="module")
+def weather_df():
+    return pd.concat(
+        [
+            noaastn._parse_isd(
+                gzip.decompress(
+                    make_isd_file(24 * 90, usaf=stn[:6], wban=stn[7:], seed=i)
+                ),
+                stn,
+            )
+            for i, stn in enumerate(["911803-99999", "911650-22536"])
+        ],
+        ignore_index=True,
+    )
+
+
+def test_lttb():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[500] = 10
+    kept = noaastn._lttb(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert (np.diff(kept) > 0).all()
+    assert 500 in kept, "Spikes should be kept"
+    np.testing.assert_array_equal(noaastn._lttb(x[:40], y[:40], 50), x[:40])
+
+
+def test_minmax():
+    y = np.random.default_rng(0).normal(size=1001)
+    kept = noaastn._minmax(y, 100)
+    assert len(kept) <= 100
+    assert y.argmin() in kept and y.argmax() in kept
+    assert (np.diff(kept) > 0).all()
+
+
+@pytest.mark.parametrize("downsample", ["lttb", "minmax", None])
+def test_plot_weather_series(weather_df, downsample):
+    chart = noaastn.plot_weather_series(
+        weather_df,
+        ["air_temp", "wind_spd"],
+        max_points=200,
+        downsample=downsample,
+    )
+    sizes = chart.data.groupby(["stn", "variable"]).size()
+    assert len(sizes) == 4
+    if downsample is None:
+        assert sizes.max() > 200
+    else:
+        assert sizes.max() <= 200
+    assert chart.facet.row.shorthand == "variable:N"
+    assert chart.spec.encoding.color.shorthand == "stn:N"
+
+
+def test_plot_weather_series_aggregates(weather_df):
+    chart = noaastn.plot_weather_series(
+        weather_df, time_basis="monthly", layout="layer"
+    )
+    assert chart.encoding.color.shorthand == "variable:N"
+    assert len(chart.data.index) == 2 * 3 * len(noaastn.DEFAULT_FIELDS)
+    monthly = noaastn.aggregate_weather_data(weather_df).monthly
+    np.testing.assert_allclose(
+        chart.data.query("variable == 'air_temp'").value,
+        monthly.air_temp_mean,
+    )
+
+
+def test_plot_weather_series_data_url(weather_df, tmp_path):
+    data_url = str(tmp_path / "data.json")
+    chart = noaastn.plot_weather_series(
+        weather_df, ["air_temp"], max_points=100, data_url=data_url
+    )
+    spec = chart.to_dict()
+    assert spec["data"]["url"] == data_url
+    assert "datasets" not in spec
+    with open(data_url) as data_file:
+        assert len(json.load(data_file)) == 2 * 100
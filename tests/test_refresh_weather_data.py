@@ -0,0 +1,102 @@
+import gzip
+import time
+
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+pytest.importorskip("pyarrow.parquet")
+
+station_number = "911803-99999"
+year = time.gmtime().tm_year
+ftp_path = "pub/data/noaa/%d/%s-%d.gz" % (year, station_number, year)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return noaastn.ParquetStore(str(tmp_path / "store"))
+
+
+def test_refresh_appends_new_records(ftp_server, store):
+    ftp_server.add_file(ftp_path, make_isd_file(10, year=year), mtime=1e9)
+    new_df = noaastn.refresh_weather_data(station_number, store)
+    assert len(new_df.index) == 10
+    assert list(new_df.columns[2:]) == noaastn.DEFAULT_FIELDS
+    assert store.state(station_number, year)["last"] == (
+        new_df.datetime.max().isoformat()
+    )
+
+    # Unchanged files are not downloaded again
+    retrieved = len(ftp_server.retrieved)
+    new_df = noaastn.refresh_weather_data(station_number, store)
+    assert new_df.empty
+    assert len(ftp_server.retrieved) == retrieved
+
+    compressed_data = make_isd_file(15, year=year)
+    ftp_server.add_file(ftp_path, compressed_data, mtime=1e9 + 3600)
+    new_df = noaastn.refresh_weather_data(
+        station_number, store, quality=True
+    )
+    expected_df = noaastn._parse_isd(
+        gzip.decompress(compressed_data), station_number, quality=True
+    )
+    pd.testing.assert_frame_equal(
+        new_df, expected_df.iloc[10:].reset_index(drop=True)
+    )
+    pd.testing.assert_frame_equal(
+        store.read(station_number, year), expected_df
+    )
+
+
+def test_refresh_new_fields(ftp_server, store):
+    ftp_server.add_file(ftp_path, make_isd_file(10, year=year), mtime=1e9)
+    noaastn.refresh_weather_data(station_number, store)
+
+    # Fields missing from the store trigger a full parse
+    new_df = noaastn.refresh_weather_data(
+        station_number, store, fields=["precip_depth"]
+    )
+    assert list(new_df.columns) == ["stn", "datetime", "precip_depth"]
+    assert len(new_df.index) == 10
+    # The fields stored before are kept
+    fields = ["precip_depth"] + noaastn.DEFAULT_FIELDS
+    assert list(store.read(station_number, year).columns[2:]) == fields + [
+        col + "_quality" for col in fields
+    ]
+
+
+def test_refresh_same_minute_records(ftp_server, store):
+    raw_data = make_isd_file(10, year=year, compress=False)
+    ftp_server.add_file(ftp_path, gzip.compress(raw_data), mtime=1e9)
+    noaastn.refresh_weather_data(station_number, store)
+
+    # A record of the last stored minute appended after the refresh
+    late_record = make_isd_file(10, year=year, seed=1, compress=False)
+    late_record = late_record.splitlines(keepends=True)[-1]
+    ftp_server.add_file(
+        ftp_path, gzip.compress(raw_data + late_record), mtime=1e9 + 3600
+    )
+    new_df = noaastn.refresh_weather_data(station_number, store)
+    expected_df = noaastn._parse_isd(
+        raw_data + late_record, station_number, quality=True
+    )
+    pd.testing.assert_frame_equal(
+        new_df,
+        expected_df.iloc[10:][new_df.columns].reset_index(drop=True),
+    )
+    pd.testing.assert_frame_equal(
+        store.read(station_number, year), expected_df
+    )
+
+
+def test_refresh_through_cache(ftp_server, store, tmp_path):
+    cache = noaastn.DownloadCache(str(tmp_path / "cache"))
+    ftp_server.add_file(ftp_path, make_isd_file(10, year=year), mtime=1e9)
+    new_df = noaastn.refresh_weather_data(station_number, store, cache=cache)
+    assert len(new_df.index) == 10
+    assert cache.fetch(year, station_number + "-%d.gz" % year)
+    # The size and modification time are requested once per refresh
+    commands = [cmd for cmd, _ in ftp_server.commands]
+    assert (commands.count("SIZE"), commands.count("MDTM")) == (2, 2)
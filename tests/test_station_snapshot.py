@@ -0,0 +1,98 @@
+import logging
+import os
+
+import pandas as pd
+import pytest
+from noaastn import noaastn
+
+from .synthetic import STATIONS, make_station_history
+
+history_path = "pub/data/noaa/isd-history.txt"
+
+
+def test_snapshot_round_trip(tmp_path):
+    stations_df = noaastn._parse_station_history(
+        make_station_history(STATIONS)
+    )
+    path = str(tmp_path / "isd-history.npz")
+    location = "ftp://ftp.ncei.noaa.gov:21/pub/data/noaa/"
+    noaastn._write_station_snapshot(path, stations_df, 123, 456, location)
+
+    snapshot_df, size, mtime = noaastn._read_station_snapshot(path, location)
+    pd.testing.assert_frame_equal(snapshot_df, stations_df)
+    assert (size, mtime) == (123, 456)
+    assert os.listdir(tmp_path) == ["isd-history.npz"]
+    # Snapshots of another site are ignored
+    assert noaastn._read_station_snapshot(path, "file:///mirror") is None
+
+    with open(path, "wb") as snapshot_file:
+        snapshot_file.write(b"PK\x03\x04 truncated")
+    assert noaastn._read_station_snapshot(path, location) is None
+    assert (
+        noaastn._read_station_snapshot(str(tmp_path / "none"), location)
+        is None
+    )
+
+
+def test_snapshot_shared_and_refreshed(ftp_server, snapshot_dir):
+    ftp_server.add_file(
+        history_path, make_station_history(STATIONS), mtime=1e9
+    )
+    stations_df = noaastn.get_stations_info()
+    assert len(stations_df.index) == len(STATIONS)
+    path = noaastn._snapshot_path(noaastn._get_transport()._location())
+    assert os.path.exists(path)
+
+    # Another process loads the snapshot without contacting the FTP site
+    noaastn._station_table.cache_clear()
+    sessions = ftp_server.sessions
+    pd.testing.assert_frame_equal(noaastn.get_stations_info(), stations_df)
+    assert ftp_server.sessions == sessions
+
+    # Unchanged files are not downloaded again when checked
+    retrieved = len(ftp_server.retrieved)
+    noaastn.get_stations_info(refresh=True)
+    assert ftp_server.sessions == sessions + 1
+    assert len(ftp_server.retrieved) == retrieved
+
+    # Expired snapshots are checked against the FTP site and replaced
+    ftp_server.add_file(
+        history_path, make_station_history(STATIONS[:3]), mtime=2e9
+    )
+    os.utime(path, (0, 0))
+    noaastn._station_table.cache_clear()
+    assert len(noaastn.get_stations_info().index) == 3
+    assert len(ftp_server.retrieved) == retrieved + 1
+    location = noaastn._get_transport()._location()
+    assert noaastn._read_station_snapshot(path, location)[1:] == (
+        len(make_station_history(STATIONS[:3])),
+        2000000000,
+    )
+    assert os.listdir(snapshot_dir) == ["isd-history.v1"]
+
+
+def test_stale_snapshot_used_offline(ftp_server, monkeypatch, caplog):
+    ftp_server.add_file(
+        history_path, make_station_history(STATIONS), mtime=1e9
+    )
+    stations_df = noaastn.get_stations_info()
+    path = noaastn._snapshot_path(noaastn._get_transport()._location())
+    os.utime(path, (0, 0))
+
+    # The expired snapshot is used when the site cannot be reached
+    ftp_server.shutdown()
+    ftp_server.server_close()
+    monkeypatch.setattr(
+        noaastn, "_TRANSPORT", noaastn.FTPTransport(retries=0)
+    )
+    noaastn._station_table.cache_clear()
+    with caplog.at_level(logging.WARNING, logger="noaastn"):
+        pd.testing.assert_frame_equal(
+            noaastn.get_stations_info(), stations_df
+        )
+    assert "unreachable" in caplog.text
+
+    # Without a snapshot the error is raised
+    os.remove(path)
+    with pytest.raises(OSError):
+        noaastn._station_history()
@@ -0,0 +1,88 @@
+import asyncio
+from ftplib import error_perm
+
+import pytest
+from noaastn import noaastn
+
+from .synthetic import make_isd_file
+
+station_number = "911803-99999"
+filename = "911803-99999-2015.gz"
+
+
+@pytest.fixture
+def weather_file(ftp_server, monkeypatch):
+    compressed_data = make_isd_file(500)
+    ftp_server.add_file("pub/data/noaa/2015/" + filename, compressed_data)
+    monkeypatch.setattr(noaastn, "_TRANSPORT", None)
+    return compressed_data
+
+
+def test_ftp_resumes_interrupted_transfers(ftp_server, weather_file):
+    noaastn.set_transport(noaastn.FTPTransport(backoff=0.01))
+    ftp_server.truncate_transfers = 2
+    weather_df = noaastn.get_weather_data(station_number, 2015)
+    assert len(weather_df.index) == 500
+
+    rests = [arg for cmd, arg in ftp_server.commands if cmd == "REST"]
+    assert rests[0] == str(len(weather_file) // 2)
+    assert ftp_server.retrieved == [filename]
+
+    ftp_server.truncate_transfers = 2
+    weather_df = asyncio.run(
+        noaastn.fetch_weather_data(station_number, 2015, backoff=0.01)
+    )
+    assert len(weather_df.index) == 500
+
+
+def test_ftp_gives_up_after_retries(ftp_server, weather_file):
+    noaastn.set_transport(noaastn.FTPTransport(retries=1, backoff=0.01))
+    ftp_server.drop_transfers = 2
+    with pytest.raises(EOFError):
+        with noaastn._get_transport().connect() as connection:
+            connection.retrieve("2015/" + filename)
+    with pytest.raises(error_perm):
+        with noaastn._get_transport().connect() as connection:
+            connection.retrieve("2015/000000-99999-2015.gz")
+
+
+def test_retry_delay():
+    delays = [noaastn._retry_delay(0.5, 2) for _ in range(100)]
+    assert 0 <= min(delays) < max(delays) <= 2
+
+
+def test_https_transport(ftp_server, http_server, weather_file):
+    transport = noaastn.HTTPSTransport(
+        "http://127.0.0.1:%d/pub/data/noaa" % http_server.server_port
+    )
+    noaastn.set_transport(transport)
+    weather_df, errors_df = noaastn.get_weather_data_bulk(
+        [station_number, "000000-99999"], [2015]
+    )
+    assert len(weather_df.index) == 500
+    assert "404" in errors_df.error[0]
+    assert not ftp_server.sessions
+
+    with transport.connect() as connection:
+        size, _ = connection.stat("2015/" + filename)
+        assert size == len(weather_file)
+        # The test server ignores ranges and sends the whole file
+        session = transport._open("2015")
+        blocks = []
+        transport._retrieve(session, "2015", filename, blocks.append, 100)
+        assert b"".join(blocks) == weather_file[100:]
+
+
+def test_local_transport(ftp_server, weather_file):
+    noaastn.set_transport(
+        noaastn.LocalTransport(ftp_server.root + "/pub/data/noaa")
+    )
+    weather_df = noaastn.get_weather_data(station_number, 2015)
+    assert len(weather_df.index) == 500
+    assert noaastn.get_weather_data("000000-99999", 2015) is None
+
+    weather_df = asyncio.run(
+        noaastn.fetch_weather_data(station_number, 2015)
+    )
+    assert len(weather_df.index) == 500
+    assert not ftp_server.sessions